@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+""" run the protomodels walkers on the local machine, without slurm.
+the database is loaded once, in the parent process, and shared with
+the walkers via fork. every walker has a checkpoint file in
+<rundir>/local/, so that walkers that are done are not run again,
+walkers that are running are not started twice, and an interrupted
+run can simply be restarted.
+"""
+
+import os, sys, time, json, socket
+from typing import Union, List, Dict
+from smodels_utils.helper.terminalcolors import *
+
+intro = f"{CYAN}[localWalkers]{RESET} "
+
+_shared = {} ## the state that is inherited by the forked walkers
+
+def checkpointFile ( rundir : os.PathLike, walkerid : int ) -> str:
+    return os.path.join ( rundir, "local", f"walker{walkerid}.json" )
+
+def readCheckpoint ( rundir : os.PathLike, walkerid : int ) -> Dict:
+    """ the checkpoint of a walker, empty dict if there is none """
+    fname = checkpointFile ( rundir, walkerid )
+    if not os.path.exists ( fname ):
+        return {}
+    try:
+        with open ( fname, "rt" ) as f:
+            return json.load ( f )
+    except (OSError,ValueError) as e:
+        return {}
+
+def writeCheckpoint ( rundir : os.PathLike, walkerid : int, **kwargs ) -> Dict:
+    """ update the checkpoint of a walker with kwargs, atomically """
+    ckpt = readCheckpoint ( rundir, walkerid )
+    ckpt.update ( kwargs )
+    ckpt["walkerid"] = walkerid
+    ckpt["updated"] = time.time()
+    fname = checkpointFile ( rundir, walkerid )
+    os.makedirs ( os.path.dirname ( fname ), exist_ok = True )
+    tmpfile = f"{fname}.{os.getpid()}.tmp"
+    with open ( tmpfile, "wt" ) as f:
+        json.dump ( ckpt, f, indent = 1 )
+    os.replace ( tmpfile, fname )
+    return ckpt
+
+def isRunning ( ckpt : Dict ) -> bool:
+    """ is the walker of this checkpoint running right now, on this host? """
+    if ckpt.get ( "status" ) != "running":
+        return False
+    if ckpt.get ( "host" ) != socket.gethostname():
+        return True ## cannot check, so we assume it is
+    try:
+        os.kill ( ckpt["pid"], 0 )
+    except (OSError,KeyError,TypeError) as e:
+        return False
+    return True
+
+def todoWalkers ( rundir : os.PathLike, walkerids : List[int],
+                  rerun : bool = False ) -> List[int]:
+    """ the walkers that still need to run: not yet done and not running
+
+    :param rerun: if true, then also rerun walkers that are done
+    """
+    ret = []
+    for walkerid in walkerids:
+        ckpt = readCheckpoint ( rundir, walkerid )
+        if isRunning ( ckpt ):
+            print ( f"{intro}walker {walkerid} is already running (pid {ckpt['pid']}), skip it" )
+            continue
+        if ckpt.get ( "status" ) == "done" and not rerun:
+            continue
+        ret.append ( walkerid )
+    return ret
+
+def shareDatabase ( dbpath : str ) -> bool:
+    """ load the database once, and make every later Database ( dbpath )
+    of this process, and of the processes forked from it, a shallow
+    copy of it. the forked processes share the memory copy-on-write.
+
+    :returns: true, if the database could be loaded
+    """
+    from smodels.experiment.databaseObj import Database
+    if dbpath in _shared.get ( "databases", {} ):
+        return True
+    t0 = time.time()
+    try:
+        db = Database ( dbpath )
+    except Exception as e:
+        print ( f"{intro}{RED}could not preload {dbpath}: {e}{RESET}" )
+        return False
+    print ( f"{intro}preloaded {dbpath} in {time.time()-t0:.1f}s" )
+    if not "databases" in _shared:
+        _shared["databases"] = {}
+        original = Database.__init__
+        def __init__ ( self, base = None, force_load = None, *args, **kwargs ):
+            preloaded = _shared["databases"].get ( base, None )
+            if preloaded is None or force_load is not None or \
+                    kwargs.get ( "combinationsmatrix", None ) is not None:
+                return original ( self, base, force_load, *args, **kwargs )
+            self.__dict__.update ( preloaded.__dict__ )
+        Database.__init__ = __init__
+    _shared["databases"][dbpath] = db
+    return True
+
+def _runWalker ( walkerid : int ) -> tuple:
+    """ run a single walker, in a forked process """
+    rundir = _shared["rundir"]
+    nvars = dict ( _shared["nvars"] )
+    nvars["nmin"] = walkerid
+    nvars["nmax"] = walkerid + 1
+    if "JOBNR" in str ( nvars.get ( "cheatcode", "" ) ):
+        nvars["cheatcode"] = f"{rundir}/Pmodels/pmodel{walkerid}.dict"
+    ckpt = readCheckpoint ( rundir, walkerid )
+    writeCheckpoint ( rundir, walkerid, status = "running", pid = os.getpid(),
+        host = socket.gethostname(), started = time.time(),
+        attempts = ckpt.get ( "attempts", 0 ) + 1, seed = nvars.get ( "seed" ) )
+    os.chdir ( rundir )
+    try:
+        from walker import factoryOfWalkers
+        factoryOfWalkers.createWalkers ( nvars )
+    except Exception as e:
+        writeCheckpoint ( rundir, walkerid, status = "failed", error = str(e),
+                          finished = time.time() )
+        return walkerid, "failed"
+    writeCheckpoint ( rundir, walkerid, status = "done", finished = time.time() )
+    return walkerid, "done"
+
+def runLocalWalkers ( nvars : Dict, walkerids : List[int], nprocesses : int,
+        rundir : os.PathLike, codedir : os.PathLike, wallpids : bool = True,
+        shareDB : bool = True, rerun : bool = False,
+        dry_run : bool = False ) -> int:
+    """ run walkers in a pool of processes on this machine
+
+    :param nvars: the arguments for factoryOfWalkers.createWalkers,
+                  nmin and nmax get set per walker
+    :param walkerids: the ids of the walkers to run
+    :param nprocesses: the number of parallel processes, 0 means one per walker
+    :param codedir: the directory with protomodels and smodels-utils
+    :param wallpids: put up mass walls for pids
+    :param shareDB: load the database once, and share it among the walkers
+    :param rerun: also rerun walkers that are done already
+    :param dry_run: only print what would be run
+    :returns: number of walkers started
+    """
+    for d in [ "smodels-utils", "protomodels" ]:
+        if not os.path.join ( codedir, d ) in sys.path:
+            sys.path.insert ( 0, os.path.join ( codedir, d ) )
+    todo = todoWalkers ( rundir, walkerids, rerun )
+    ndone = len(walkerids) - len(todo)
+    if ndone > 0:
+        print ( f"{intro}{ndone} of {len(walkerids)} walkers are done or running already" )
+    if len(todo) == 0:
+        return 0
+    if nprocesses in [ 0, None ] or nprocesses > len(todo):
+        nprocesses = len(todo)
+    print ( f"{intro}running walkers {', '.join(map(str,todo))} in {nprocesses} processes" )
+    if dry_run:
+        return 0
+    if not wallpids:
+        ## offshell run below ATLAS-SUSY-2019-09 threshold!
+        from builder.manipulator import Manipulator
+        Manipulator.walledpids[1000024]=30
+    dbpath = nvars.get ( "dbpath", None )
+    if shareDB and dbpath not in [ None, "none" ]:
+        cwd = os.getcwd()
+        os.chdir ( rundir ) ## relative dbpaths are relative to the rundir
+        shareDatabase ( dbpath )
+        os.chdir ( cwd )
+    _shared.update ( { "nvars": nvars, "rundir": rundir } )
+    import multiprocessing
+    ctx = multiprocessing.get_context ( "fork" )
+    ## one walker per process, so every walker starts from the pristine database
+    with ctx.Pool ( nprocesses, maxtasksperchild = 1 ) as pool:
+        for walkerid, status in pool.imap_unordered ( _runWalker, todo ):
+            col = GREEN if status == "done" else RED
+            print ( f"{intro}walker {walkerid}: {col}{status}{RESET}" )
+    return len(todo)
+
+def status ( rundir : os.PathLike ):
+    """ print the checkpoints of the walkers in rundir """
+    d = os.path.join ( rundir, "local" )
+    if not os.path.isdir ( d ):
+        print ( f"{intro}no local walkers in {rundir}" )
+        return
+    walkerids = []
+    for fname in os.listdir ( d ):
+        if fname.startswith ( "walker" ) and fname.endswith ( ".json" ):
+            walkerids.append ( int ( fname[6:-5] ) )
+    for walkerid in sorted ( walkerids ):
+        ckpt = readCheckpoint ( rundir, walkerid )
+        st = ckpt.get ( "status", "?" )
+        if st == "running" and not isRunning ( ckpt ):
+            st = "interrupted"
+        col = { "done": GREEN, "failed": RED, "interrupted": RED }.get ( st, YELLOW )
+        error = f": {ckpt['error']}" if st == "failed" else ""
+        print ( f"{intro}walker {walkerid:4d}: {col}{st}{RESET} ({ckpt.get('attempts',0)} attempts){error}" )
+
+if __name__ == "__main__":
+    import argparse
+    argparser = argparse.ArgumentParser(description='status of the local walkers (use slurm_walk.py --local to run them)')
+    argparser.add_argument ( '-R', '--rundir', help='the run directory [.]',
+                             type=str, default="." )
+    argparser.add_argument ( '--reset', help='remove all checkpoints',
+                             action="store_true" )
+    args = argparser.parse_args()
+    if args.reset:
+        import shutil
+        shutil.rmtree ( os.path.join ( args.rundir, "local" ), ignore_errors = True )
+    status ( args.rundir )
@@ -186,6 +186,8 @@ def runWalkers ( args ) -> int:
             print ( f"{intro} (repeat the exact same command to force execution)" )
             sys.exit()
     seed = args.seed
+    if args.local:
+        return runLocally ( rvars )
 
     mkdir ( f"{rvars['rundir']}/jobs/", chdir=False )
     jobsfile = f"{rvars['rundir']}/jobs/current"
@@ -255,6 +257,39 @@ def runWalkers ( args ) -> int:
     col = GREEN
     return totjobs
 
+def walkerArguments ( rvars : dict ) -> dict:
+    """ the arguments for factoryOfWalkers.createWalkers, i.e. rvars
+    without the options that only concern the submission """
+    import copy
+    nvars = copy.deepcopy ( rvars )
+    drops = [ "query", "query_short", "cancel", "cancel_all", 
+              "dry_run", "keep", "updater", "uploadTo", "scan",
+              "yvariable", "llhdscan", "clean", "clean_all", "allscans",
+              "rewrite", "time", "repeat", "jobnr", "pid", "local",
+              "local_rerun", "disallowN1N1Prod" ]
+    for i in drops:
+        if i in nvars:
+            nvars.pop ( i )
+    nvars["catch_exceptions"]=True
+    return nvars
+
+def runLocally ( rvars : dict ) -> int:
+    """ run the walkers nmin to nmax on this machine, without slurm,
+    sharing a single load of the database
+
+    :returns: number of walkers started
+    """
+    from localWalkers import runLocalWalkers
+    nvars = walkerArguments ( rvars )
+    dbpath = rvars["dbpath"]
+    if not "/" in dbpath and not dbpath in [ "official" ]: ## then assume its meant to be in rundir
+        dbpath = f"{rvars['rundir']}/{dbpath}"
+    nvars["dbpath"] = dbpath
+    walkerids = list ( range ( rvars["nmin"], rvars["nmax"] + 1 ) )
+    return runLocalWalkers ( nvars, walkerids, rvars["nprocesses"],
+            rvars["rundir"], codedir, wallpids = rvars["wallpids"],
+            rerun = rvars["local_rerun"], dry_run = rvars["dry_run"] )
+
 def runOneJob ( rvars: dict ):
     """ prepare everything for a single job. this is the central method!
 
@@ -329,19 +364,9 @@ def runOneJob ( rvars: dict ):
             except ValueError as e:
                 pass
         from ptools.helpers import py_dumps
-        import copy
-        nvars = copy.deepcopy ( rvars )
+        nvars = walkerArguments ( rvars )
         if "JOBNR" in nvars["cheatcode"] and "nmin" in nvars:
             nvars["cheatcode"] = f"{rvars['rundir']}/Pmodels/pmodel{nvars['nmin']}.dict"
-        drops = [ "query", "query_short", "cancel", "cancel_all", 
-                  "dry_run", "keep", "updater", "uploadTo", "scan",
-                  "yvariable", "llhdscan", "clean", "clean_all", "allscans",
-                  "rewrite", "time", "repeat", "jobnr", "pid" ]
-        for i in drops:
-            nvars.pop ( i )
-        nvars["catch_exceptions"]=True
-        if "disallowN1N1Prod" in nvars:
-            nvars.pop ( "disallowN1N1Prod" )
         ds = py_dumps ( nvars, indent=4 )
         f.write ( f"factoryOfWalkers.createWalkers ( {ds} )\n" )
     os.chmod( runner, 0o755 ) # 1877 is 0o755
@@ -911,6 +936,10 @@ def main():
             type=int, default=0 )
     argparser.add_argument ( '-f', '--continueFrom', help='continue with saved states (path to pickle file, or empty) [""]',
                         type=str, default="" )
+    argparser.add_argument ( '--local', help='run the walkers in a process pool on this machine, without slurm. walkers that are done are skipped, see localWalkers.py',
+                             action='store_true' )
+    argparser.add_argument ( '--local_rerun', help='with --local, rerun also the walkers that are done',
+                             action='store_true' )
     argparser.add_argument ( '-R', '--rundir',
                         help='override the default rundir. can use wildcards [None]',
                         type=str, default=None )
@@ -24,7 +24,7 @@ import numpy as np
 import os
 import time
 from smodels_utils.plotting import mpkitty as plt
-from covariances.cov_helpers import getSensibleMuRange, computeLlhdHisto, addJitter, withinMuRange, createLine
+from covariances.cov_helpers import getSensibleMuRange, computeLlhdHisto, addJitter, withinMuRange, createLine, getMuGrid, scanManyLikelihoods
 
 dbpath = [ "../../smodels-database/" ]
 # dbpath = [ "official" ]
@@ -824,6 +824,11 @@ def createLlhds ( tpreds, setup ):
 
     expected = setup["expected"]
     normalize = setup["normalize"]
+    nworkers = setup.get ( "nworkers", 1 )
+    if nworkers > 1:
+        ## scan all predictions in parallel, computeLlhdHisto picks them up
+        mus = getMuGrid ( xmin, xmax, nbins = 100, equidistant=False )
+        scanManyLikelihoods ( tpreds, mus, expected = expected, nworkers = nworkers )
     times, llhds, sums, uls = {}, {}, {}, {}
     for t in tpreds:
         dId = "sr combo"
@@ -1044,6 +1049,7 @@ def addDefaults ( setup ):
     default["normalize"]=True
     default["logy"]=False
     default["plotproduct"]=True
+    default["nworkers"]=1
     for k,v in default.items():
         if not k in setup:
             setup[k]=v
@@ -248,20 +248,13 @@ def computeChi2( p_values : list , bins : Union[str,None,list,int] = None,
     n_bins = len(bins) - 1
     ## the i index runs over bins
     p_i = 1/n_bins # we compare against uniform
-    counts = [0]*n_bins
-    for p in p_values:
-        for i in range(n_bins):
-            if bins[i]<p<bins[i+1]:
-                counts[i] += 1
-        if method == "fold": ## folding
-            for i in range(n_bins):
-                if bins[i]<1-p<bins[i+1]:
-                    counts[i] += 1
-    n_pvalues = sum(counts)
+    counts = binCounts ( p_values, bins )
+    if method == "fold": ## folding
+        counts = counts + binCounts ( 1. - np.asarray ( p_values, dtype=float ), bins )
+    n_pvalues = int ( counts.sum() )
     if n_pvalues == 0:
         return { "T": 0, "nbins": n_bins, "p": 0 }
-    T_i = [ ((c - n_pvalues*p_i)**2) / (n_pvalues*p_i) for c in counts ]
-    T = float ( sum ( T_i ) )
+    T = float ( np.sum ( ( counts - n_pvalues*p_i )**2 / (n_pvalues*p_i) ) )
     from scipy.stats import chi2
     p = float ( 1. - chi2.cdf ( T, df = n_bins - 1 ) )
     return { "T": T, "nbins": n_bins, "p": p }
@@ -391,3 +384,151 @@ def computeKLDivergence( p_values : list ):
     mask = counts > 0
     kl = entropy(counts[mask], q[mask])
     return { "wd": kl, "type": "KL", "T": kl }
+
+def binCounts ( p_values, bins ) -> np.ndarray:
+    """ count the p-values in the bins, strictly between the edges,
+    so values that sit exactly on an edge are not counted
+
+    :param bins: the bin edges
+    :returns: array with the counts
+    """
+    p = np.asarray ( p_values, dtype=float ).reshape(-1,1)
+    bins = np.asarray ( bins, dtype=float )
+    inside = ( bins[:-1] < p ) & ( p < bins[1:] )
+    return inside.sum ( axis=0 )
+
+def collectSRs ( data : dict, min_events : float = 3.5 ) -> dict:
+    """ collect the signal regions of the conservatism data in arrays
+
+    :param data: dictionary, e.g. { 8: { anaId: { "origN":, "expectedBG":,
+                 "bgError": } }, 13: ... }
+    :param min_events: consider only signal regions with more
+                       expected background events
+
+    :returns: dictionary with arrays of sqrts, ids, obs, bg, bgerr
+    """
+    sqrts, ids, obs, bg, bgerr = [], [], [], [], []
+    for key in data.keys():
+        for anaID,values in data[key].items():
+            if not values["expectedBG"] > min_events:
+                continue
+            sqrts.append ( key )
+            ids.append ( anaID )
+            obs.append ( values["origN"] )
+            bg.append ( values["expectedBG"] )
+            bgerr.append ( values["bgError"] )
+    return { "sqrts": np.array ( sqrts ), "id": ids,
+             "obs": np.array ( obs, dtype=float ),
+             "bg": np.array ( bg, dtype=float ),
+             "bgerr": np.array ( bgerr, dtype=float ) }
+
+class PValueEngine:
+    """ computes the p-values of all signal regions at once, for a
+    gaussian or lognormal background uncertainty, scaled by a fudge factor.
+
+    With method "exact" (the default), the poisson-gauss (or poisson-lognormal)
+    convolution is integrated numerically, which is fast and noise-free.
+    With method "toys", the background rates are drawn in chunks from a numpy
+    Generator, and the poisson probabilities are averaged exactly for every
+    toy (there is no need to also draw poisson toys). The generator is
+    re-seeded for every fudge factor, so that a scan over fudge factors uses
+    common random numbers. Toys are mostly useful as a cross-check.
+    """
+
+    def __init__ ( self, obs, bg, bgerr, typ : str = "gauss",
+            method : str = "exact", ntoys : int = 500000, seed : int = 0,
+            chunksize : int = 2**23, nnodes : int = 128,
+            tieWeight : Union[None,float] = None ):
+        """
+        :param obs: array of observed events
+        :param bg: array of expected background events
+        :param bgerr: array of errors on bg (before the fudge factor)
+        :param typ: "gauss" or "lognorm"
+        :param method: "exact" or "toys"
+        :param ntoys: number of toys per signal region
+        :param seed: the seed of the random stream
+        :param chunksize: maximum number of toys held in memory at once
+        :param nnodes: number of integration nodes for method "exact"
+        :param tieWeight: weight of fakeobs == obs in the p-values.
+                          if None, 0.5 for gauss and 0 for lognorm
+        """
+        assert typ in [ "gauss", "lognorm" ], f"unknown type {typ}"
+        assert method in [ "toys", "exact" ], f"unknown method {method}"
+        self.obs = np.asarray ( obs, dtype=float )
+        self.bg = np.asarray ( bg, dtype=float )
+        self.bgerr = np.asarray ( bgerr, dtype=float )
+        self.typ = typ
+        self.method = method
+        self.ntoys = int(ntoys)
+        self.seed = seed
+        self.chunksize = chunksize
+        self.nnodes = nnodes
+        if tieWeight is None:
+            tieWeight = 0.5 if typ == "gauss" else 0.
+        ## p = P(N>obs) + tieWeight * P(N==obs), obs need not be integer
+        self.k = np.floor ( self.obs )
+        self.tie = tieWeight * ( self.k == self.obs )
+
+    def tail ( self, lmbda : np.ndarray, rows : slice ) -> np.ndarray:
+        """ P(N>obs) + tie*P(N=obs) for poisson rates lmbda,
+        one row per signal region """
+        from scipy.special import pdtrc
+        from scipy.stats import poisson
+        k = self.k[rows,None]
+        return pdtrc ( k, lmbda ) + self.tie[rows,None] * poisson.pmf ( k, lmbda )
+
+    def rates ( self, fudge : float, t : np.ndarray, rows : slice ) -> np.ndarray:
+        """ the background rates for standard normal variates t """
+        bg = self.bg[rows,None]
+        bgerr = fudge * self.bgerr[rows,None]
+        if self.typ == "gauss":
+            return bg + bgerr * t
+        loc = bg**2 / np.sqrt ( bg**2 + bgerr**2 )
+        stderr = np.sqrt ( np.log ( 1 + bgerr**2 / bg**2 ) )
+        return loc * np.exp ( stderr * t )
+
+    def pValues ( self, fudge : float ) -> np.ndarray:
+        """ the p-values of all signal regions, for a given fudge factor """
+        if self.method == "exact":
+            return self.pValuesExact ( fudge )
+        rng = np.random.default_rng ( self.seed ) ## common random numbers
+        nsr = len(self.bg)
+        ret = np.empty ( nsr )
+        block = max ( 1, self.chunksize // self.ntoys )
+        for start in range ( 0, nsr, block ):
+            rows = slice ( start, min ( start + block, nsr ) )
+            t = rng.standard_normal ( ( rows.stop - rows.start, self.ntoys ) )
+            lmbda = self.rates ( fudge, t, rows )
+            valid = lmbda > 0. ## gaussian rates are truncated at zero
+            f = self.tail ( np.where ( valid, lmbda, 0. ), rows )
+            ret[rows] = ( f * valid ).sum ( axis=1 ) / valid.sum ( axis=1 )
+        return ret
+
+    def pValuesExact ( self, fudge : float ) -> np.ndarray:
+        """ the p-values, from numerical integration over the rates """
+        rows = slice ( 0, len(self.bg) )
+        if self.typ == "lognorm":
+            t, w = np.polynomial.hermite_e.hermegauss ( self.nnodes )
+            f = self.tail ( self.rates ( fudge, t[None,:], rows ), rows )
+            return ( f * w ).sum ( axis=1 ) / w.sum()
+        ## gauss, truncated at zero: gauss-legendre over +- 8 sigma
+        t, w = np.polynomial.legendre.leggauss ( self.nnodes )
+        sigma = fudge * self.bgerr[:,None]
+        bg = self.bg[:,None]
+        lo = np.maximum ( 0., bg - 8. * sigma )
+        hi = bg + 8. * sigma
+        lmbda = lo + ( hi - lo ) * ( t[None,:] + 1. ) / 2.
+        with np.errstate ( divide="ignore", invalid="ignore" ):
+            weights = w[None,:] * np.exp ( -.5 * ( ( lmbda - bg ) / sigma )**2 )
+            ret = ( self.tail ( lmbda, rows ) * weights ).sum ( axis=1 ) / weights.sum ( axis=1 )
+        nosigma = sigma[:,0] == 0.
+        if nosigma.any():
+            ret[nosigma] = self.tail ( bg, rows )[nosigma,0]
+        return ret
+
+    def scan ( self, fudges ) -> np.ndarray:
+        """ p-values for many fudge factors
+
+        :returns: array of shape ( len(fudges), number of signal regions )
+        """
+        return np.array ( [ self.pValues ( fudge ) for fudge in fudges ] )
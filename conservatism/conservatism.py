@@ -12,7 +12,7 @@ matplotlib.use('Agg')
 dictfile = "../../protomodels/historic_database_stats/310.dict"
 dropThese = [ "CMS-EXO-20-004", "ATLAS-EXOT-2018-06", "CMS-SUS-20-004", "ATLAS-SUSY-2018-16-hino", "ATLAS-SUSY-2018-16" ]
 plot_prefix="./plots/"
-ntoys = 500000 # 25000
+ntoys = 500000 # 25000, only used with calc_p(...,method="toys")
 
 # In[2]:
 
@@ -123,63 +123,42 @@ for key in data.keys():
 # In[10]:
 
 
-def calc_p(data,fudge,typ):
+from chelpers import PValueEngine, collectSRs, binCounts
+
+engines = {} # the p-value engines, per data set, type and method
+
+def calc_p(data,fudge,typ,method="exact"):
+    """ p-values of all signal regions with more than 3.5 expected events.
+    method is "exact" (numerical convolution) or "toys" (ntoys per region),
+    see chelpers.PValueEngine. the engine is kept, so that with toys
+    a scan over fudge factors reuses the same random numbers """
+    key = ( id(data), typ, method )
+    if not key in engines:
+        srs = collectSRs ( data, min_events = 3.5 )
+        engine = PValueEngine ( srs["obs"], srs["bg"], srs["bgerr"], typ=typ,
+                                method=method, ntoys=ntoys )
+        engines[key] = ( srs, engine )
+    srs, engine = engines[key]
     p = {8:{"id":[],"p":[]}, 13:{"id":[],"p":[]}}
-    min_events = 3.5
-    if typ == "gauss":
-        for key in data.keys():
-            for anaID in data[key].keys():
-                obs = data[key][anaID]["origN"]
-                bg = data[key][anaID]["expectedBG"]
-                bgerr = fudge*data[key][anaID]["bgError"]
-                if bg > min_events:
-                    central = bg
-                    lmbda = scipy.stats.norm.rvs ( loc=[central]*ntoys, scale=[bgerr]*ntoys )
-                    lmbda = lmbda[lmbda>0.]
-                    fakeobs = scipy.stats.poisson.rvs ( lmbda )
-                    p[key]["id"].append(anaID)
-                    #p[key]["p"].append(sum(fakeobs>obs) / len(fakeobs))
-                    p[key]["p"].append((sum(fakeobs>obs) + .5*sum(fakeobs==obs)) / len(fakeobs))
-
-    if typ == "lognorm":
-        for key in data.keys():
-            for anaID in data[key].keys():
-                obs = data[key][anaID]["origN"]
-                bg = data[key][anaID]["expectedBG"]
-                bgerr = fudge*data[key][anaID]["bgError"]
-                if bg > min_events:
-                    central = bg
-                    loc = central**2 / np.sqrt ( central**2 + bgerr**2 )
-                    stderr = np.sqrt ( np.log ( 1 + bgerr**2 / central**2 ) )
-                    lmbda = scipy.stats.lognorm.rvs ( s=[stderr]*ntoys, scale=[loc]*ntoys )
-                    fakeobs = scipy.stats.poisson.rvs ( lmbda )
-                    p[key]["id"].append(anaID)
-                    p[key]["p"].append(sum(fakeobs>obs) / len(fakeobs))
+    for sqrts,anaID,pvalue in zip ( srs["sqrts"], srs["id"], engine.pValues ( fudge ) ):
+        p[int(sqrts)]["id"].append(anaID)
+        p[int(sqrts)]["p"].append(float(pvalue))
     return p
 
 def calc_T(p,bns):
     n_bns = len(bns) - 1
     pj = 1/n_bns
     size = len(p)
-    counts = [0]*n_bns
-    for i in p:
-        for j in range(n_bns):
-            if i>bns[j] and i<bns[j+1]:
-                counts[j] += 1
-    return sum(((i - size*pj)**2) / (size*pj) for i in counts)
+    counts = binCounts ( p, bns )
+    return float ( np.sum ( ((counts - size*pj)**2) / (size*pj) ) )
 
 def calc_Tabove(p,bns):
     n_bns = int((len(bns) - 1) / 2)
     pj = 1/n_bns
     p = [i for i in p if i>0.5]
     size = len(p)
-    counts = [0]*n_bns
-    for i in p:
-        for j in range(int((len(bns)-1)/2),int(len(bns)-1)):
-            tmp = j - int((len(bns)-1)/2)
-            if i>bns[j] and i<bns[j+1]:
-                counts[tmp] += 1
-    return sum(((i - size*pj)**2) / (size*pj) for i in counts)
+    counts = binCounts ( p, bns[n_bns:] )
+    return float ( np.sum ( ((counts - size*pj)**2) / (size*pj) ) )
 
 
 # In[11]:
@@ -21,26 +21,17 @@ def getChi2 ( l, doIt = True ):
         ret = 200.
     return ret
 
-def computeLlhdHisto ( tpred, xmin, xmax, nbins = 10,
-       equidistant = True, verbose = False, normalize = True,
-       expected = False, useChi2 = False ):
-    """ compute the likelhoods for theory prediction
-    :param tpred: a theory prediction
+def getMuGrid ( xmin, xmax, nbins = 10, equidistant = True ):
+    """ the mu values of a likelihood histogram
     :param xmin: minimum mu
     :param xmax: maximum mu
     :param nbins: the number of bins
     :param equidistant: if False, allow for denser binning at center
-    :param normalize: if true, normalize histogram
-    :param useChi2: chi2 values instead of likelihoods
-    :returns dictionary of normalized likelihoods and normalization constant
+    :returns: list of mu values
     """
-    if useChi2: # they are mutually exclusive
-        normalize = False
-
     import numpy as np
     dx = ( xmax - xmin ) / nbins
-    S = 0.
-    rng = np.arange ( xmin, xmax, dx)
+    rng = list ( np.arange ( xmin, xmax, dx) )
     center = ( xmin + xmax ) / 2.
     fourth = ( xmax - xmin ) / 4.
     oned = 1+ 1e-6
@@ -58,22 +49,149 @@ def computeLlhdHisto ( tpred, xmin, xmax, nbins = 10,
         rng = list ( set ( rng ) )
         rng.sort()
         #print ( "rng", len(rng), [ round(x,3) for x in rng ] )
+    return rng
 
-    ret = {}
+## the scanned likelihoods, ( id(tpred), expected, mu grid ) -> ( tpred, llhds ).
+## we keep a reference to tpred, so that its id cannot be reused
+scanCache = {}
+
+class WarmStart:
+    """ start the nuisance fit of a simplified likelihood computer at the
+    theta_hat of the previous mu, instead of at the approximate solution """
+
+    def __init__ ( self, tpred ):
+        self.computer = None
+        self.theta = None
+        sc = getattr ( tpred, "statsComputer", None )
+        if not hasattr ( sc, "getMostSensitiveModel" ): ## e.g. "N/A"
+            return
+        ## the sub computer that StatsComputer.nll evaluates
+        model = sc.getMostSensitiveModel()
+        computer = getattr ( model, "likelihoodComputer", None )
+        if hasattr ( computer, "getThetaHat" ) and \
+                hasattr ( computer, "debug_mode" ):
+            self.computer = computer
+
+    def __enter__ ( self ):
+        if self.computer is None:
+            return self
+        import numpy as np
+        computer = self.computer
+        self.debug_mode = computer.debug_mode
+        original = computer.getThetaHat
+        def getThetaHat ( nobs, *args, **kwargs ):
+            ## the original also sets the state of the computer (e.g. mu)
+            ret = original ( nobs, *args, **kwargs )
+            if self.theta is not None and np.shape(self.theta) == np.shape(ret):
+                return self.theta
+            return ret
+        computer.getThetaHat = getThetaHat
+        computer.debug_mode = True ## so that theta_hat gets stored
+        return self
+
+    def record ( self ):
+        """ remember the theta_hat of the last fit """
+        if self.computer is None:
+            return
+        import numpy as np
+        theta = getattr ( self.computer, "theta_hat", None )
+        if theta is not None and np.all ( np.isfinite ( theta ) ):
+            self.theta = np.array ( theta, dtype=float )
+
+    def __exit__ ( self, *args ):
+        if self.computer is None:
+            return
+        del self.computer.getThetaHat ## back to the method of the class
+        self.computer.debug_mode = self.debug_mode
+
+def scanLikelihoods ( tpred, mus, expected = False, verbose = False,
+                      warmStart = True ):
+    """ the profile likelihoods of a theory prediction on a grid of mu values,
+    cached per prediction, expected and grid. the nuisances are fitted
+    with warm starts from the previous mu, if possible
+
+    :param mus: the mu values
+    :param warmStart: start each fit from the theta_hat of the previous mu
+    :returns: list of likelihoods, nan if a likelihood could not be computed
+    """
+    key = ( id(tpred), expected, tuple ( mus ) )
+    if key in scanCache:
+        return list ( scanCache[key][1] )
+    from smodels.statistics.basicStats import NllEvalType
+    evaluationType = expected
+    if not isinstance ( expected, NllEvalType ): ## True is a priori
+        evaluationType = NllEvalType.init ( expected )
+    ret = [ float("nan") ] * len(mus)
+    order = sorted ( range(len(mus)), key = lambda i: mus[i] )
+    warm = WarmStart ( tpred if warmStart else None )
     print ( ">> computing llhds:", end=" " )
-    for i,mu in enumerate(rng):
-        printIndicator ( i )
-        l = tpred.likelihood ( mu, useCached=False, expected = expected )
-        if l == None:
-            l = float("nan")
-        if tpred.dataset.getType() == "combined":
-            if verbose:
-                print ( f"[cov_helpers] {tpred.dataset.globalInfo.id} mu={mu:.3f} l={l:.3g}" )
+    with warm:
+        for ctr,i in enumerate(order):
+            printIndicator ( ctr )
+            mu = mus[i]
+            l = tpred.likelihood ( mu, evaluationType = evaluationType )
+            warm.record()
+            if l == None:
+                l = float("nan")
+            if tpred.dataset.getType() == "combined":
+                if verbose:
+                    print ( f"[cov_helpers] {tpred.dataset.globalInfo.id} mu={mu:.3f} l={l:.3g}" )
+            ret[i] = l
+    print ( "" )
+    scanCache[key] = ( tpred, ret )
+    return list ( ret )
+
+_shared = {} ## the theory predictions and grid, inherited by forked workers
+
+def _scanWorker ( i ):
+    tpred = _shared["tpreds"][i]
+    return scanLikelihoods ( tpred, _shared["mus"], _shared["expected"] )
+
+def scanManyLikelihoods ( tpreds, mus, expected = False, nworkers = 1 ):
+    """ scan the likelihoods of several independent theory predictions,
+    in nworkers forked processes. the results end up in the cache.
+
+    :returns: list of lists of likelihoods, one per theory prediction
+    """
+    todo = [ i for i,t in enumerate(tpreds) if \
+             not ( id(t), expected, tuple(mus) ) in scanCache ]
+    if nworkers > 1 and len(todo) > 1:
+        import multiprocessing
+        _shared.update ( { "tpreds": tpreds, "mus": mus, "expected": expected } )
+        ctx = multiprocessing.get_context ( "fork" )
+        with ctx.Pool ( min ( nworkers, len(todo) ) ) as pool:
+            results = pool.map ( _scanWorker, todo )
+        _shared.clear()
+        for i,llhds in zip ( todo, results ):
+            scanCache[( id(tpreds[i]), expected, tuple(mus) )] = ( tpreds[i], llhds )
+    return [ scanLikelihoods ( t, mus, expected ) for t in tpreds ]
+
+def computeLlhdHisto ( tpred, xmin, xmax, nbins = 10,
+       equidistant = True, verbose = False, normalize = True,
+       expected = False, useChi2 = False ):
+    """ compute the likelhoods for theory prediction
+    :param tpred: a theory prediction
+    :param xmin: minimum mu
+    :param xmax: maximum mu
+    :param nbins: the number of bins
+    :param equidistant: if False, allow for denser binning at center
+    :param normalize: if true, normalize histogram
+    :param useChi2: chi2 values instead of likelihoods
+    :returns dictionary of normalized likelihoods and normalization constant
+    """
+    if useChi2: # they are mutually exclusive
+        normalize = False
+
+    S = 0.
+    rng = getMuGrid ( xmin, xmax, nbins, equidistant )
+    llhds = scanLikelihoods ( tpred, rng, expected, verbose )
+
+    ret = {}
+    for mu,l in zip ( rng, llhds ):
         if l not in [ None ] and math.isfinite( l ):
             l = getChi2 ( l, useChi2 )
             S+=l
             ret[mu]=l
-    print ( "" )
     if normalize and S <= 0.:
         print ( f"[cov_helpers] would like to normalize but S={S}" )
     # print ( f"Normalizing {normalize} {S}" )
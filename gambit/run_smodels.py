@@ -7,11 +7,31 @@ depends only SModelS (pip install smodels), nothing else.
 import os
 from typing import Dict, Text
 
-def run_smodels ( slha : Text ) -> Dict:
+_state = {} ## the database and the BSM particles, loaded once per process
+
+def setup ( dbpath : Text = "official" ) -> Dict:
+    """ load the database and the BSM particles, only once per process.
+    subsequent calls with the same dbpath are free.
+
+    :param dbpath: the database, we could use something other than the
+                   official database
+    :returns: dictionary with the database and the BSM particles
+    """
+    if _state.get ( "dbpath", None ) != dbpath:
+        from smodels.particlesLoader import load
+        from smodels.experiment.databaseObj import Database
+        _state["database"] = Database(dbpath)
+        _state["BSMList"] = load()
+        _state["dbpath"] = dbpath
+    return _state
+
+def run_smodels ( slha : Text, dbpath : Text = "official" ) -> Dict:
     """ given the SLHA file content as a string, this little script runs
-    SModelS, returns the results as dictionary.
+    SModelS, returns the results as dictionary. the database is loaded
+    only at the first call.
 
     :param slha: slha file content, given as a single string
+    :param dbpath: the database
 
     :returns: dictionary with analysis Ids as keys, and (negative log) 
     likelihoods, and r-values 
@@ -25,18 +45,13 @@ def run_smodels ( slha : Text ) -> Dict:
     ## some imports
     from smodels.base.model import Model
     from smodels.share.models.SMparticles import SMList
-    from smodels.particlesLoader import load
-    from smodels.experiment.databaseObj import Database
     from smodels.base.physicsUnits import fb, GeV
     from smodels.decomposition import decomposer
     from smodels.matching.theoryPrediction import theoryPredictionsFor
 
-    ## the database, we could use something other than the official
-    ## database
-    dbpath = "official"
-    database = Database(dbpath)
-    BSMList = load()
-    model = Model(BSMparticles=BSMList, SMparticles=SMList)
+    state = setup ( dbpath )
+    database = state["database"]
+    model = Model(BSMparticles=state["BSMList"], SMparticles=SMList)
 
     ## a few minor parameters that can be adapted
     model.updateParticles(inputFile=slha,
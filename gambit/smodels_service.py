@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+""" a long-lived SModelS service for gambit/colliderbit: the database and
+the particles are loaded once, then a stream of SLHA strings is evaluated
+in a pool of forked processes. the service speaks json lines, either on
+stdin/stdout or on a unix socket. every request is a line
+{ "id": ..., "slha": "..." }, every answer a line
+{ "id": ..., "results": { ... }, "time": ... }, with the results as in
+run_smodels, and the time it took to evaluate the point, in seconds.
+depends only SModelS (pip install smodels), nothing else.
+"""
+
+import os, sys, json, time, socket, threading
+from typing import Dict, Text, List, Iterator, Union
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+from run_smodels import run_smodels, setup
+
+_pool = {} ## the pool of workers, created after the database got loaded
+
+def evaluate ( request : Dict ) -> Dict:
+    """ evaluate a single request { "id": ..., "slha": ... }
+
+    :returns: { "id": ..., "results": ..., "time": ... }, or
+              { "id": ..., "error": ..., "time": ... }
+    """
+    ret = { "id": request.get ( "id", None ) }
+    t0 = time.time()
+    if "parseError" in request:
+        ret["error"] = f"cannot parse request: {request['parseError']}"
+        ret["time"] = 0.
+        return ret
+    try:
+        ret["results"] = run_smodels ( request["slha"], _pool["dbpath"] )
+    except Exception as e:
+        ret["error"] = f"{type(e).__name__}: {e}"
+    ret["time"] = time.time() - t0
+    return ret
+
+def start ( dbpath : Text = "official", nprocesses : int = 1 ):
+    """ load the database and the particles, then fork the workers,
+    which inherit both
+
+    :param nprocesses: number of workers, 0 means one per cpu
+    """
+    t0 = time.time()
+    setup ( dbpath )
+    print ( f"[smodels_service] loaded {dbpath} in {time.time()-t0:.1f}s",
+            file=sys.stderr )
+    _pool["dbpath"] = dbpath
+    if nprocesses == 0:
+        nprocesses = os.cpu_count()
+    _pool["pool"] = None
+    if nprocesses > 1:
+        import multiprocessing
+        ctx = multiprocessing.get_context ( "fork" )
+        _pool["pool"] = ctx.Pool ( nprocesses )
+
+def stop():
+    if _pool.get ( "pool", None ) is not None:
+        _pool["pool"].close()
+        _pool["pool"].join()
+    _pool.clear()
+
+def evaluateMany ( requests : Iterator[Dict] ) -> Iterator[Dict]:
+    """ evaluate a stream of requests, in the pool if we have one.
+    the answers come in the order in which they are done. """
+    if _pool.get ( "pool", None ) is None:
+        for request in requests:
+            yield evaluate ( request )
+        return
+    for answer in _pool["pool"].imap_unordered ( evaluate, requests ):
+        yield answer
+
+def parseLines ( lines : Iterator[Text] ) -> Iterator[Dict]:
+    """ the requests of a stream of json lines, empty lines are skipped """
+    for line in lines:
+        line = line.strip()
+        if line == "":
+            continue
+        try:
+            yield json.loads ( line )
+        except json.JSONDecodeError as e:
+            yield { "slha": "", "id": None, "parseError": str(e) }
+
+def toLine ( answer : Dict ) -> Text:
+    return json.dumps ( answer, default = float ) + "\n"
+
+def serveStdio ( out = None ):
+    """ serve the requests on stdin, answer on stdout
+
+    :param out: the stream for the answers, if None then sys.stdout
+    """
+    if out is None:
+        out = sys.stdout
+    for answer in evaluateMany ( parseLines ( sys.stdin ) ):
+        out.write ( toLine ( answer ) )
+        out.flush()
+
+def serveSocket ( path : os.PathLike ):
+    """ serve the requests on a unix socket, one client after the other.
+    every client sends its requests, shuts down writing, and reads the
+    answers while it is still sending. """
+    if os.path.exists ( path ):
+        os.unlink ( path )
+    server = socket.socket ( socket.AF_UNIX, socket.SOCK_STREAM )
+    server.bind ( path )
+    server.listen ( 1 )
+    print ( f"[smodels_service] listening on {path}", file=sys.stderr )
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile ( "r" ) as rfile, conn.makefile ( "w" ) as wfile:
+                for answer in evaluateMany ( parseLines ( rfile ) ):
+                    wfile.write ( toLine ( answer ) )
+                    wfile.flush()
+    except KeyboardInterrupt as e:
+        pass
+    finally:
+        server.close()
+        os.unlink ( path )
+
+class Client:
+    """ a stub client, for testing the service, and as an example """
+
+    def __init__ ( self, path : Union[None,os.PathLike] = None,
+                   dbpath : Text = "official" ):
+        """
+        :param path: the unix socket of a running service. if None,
+                     then evaluate in this process.
+        """
+        self.path = path
+        self.dbpath = dbpath
+
+    def evaluate ( self, slhas : List[Text] ) -> List[Dict]:
+        """ evaluate SLHA strings
+
+        :returns: the answers, in the order of the slhas
+        """
+        requests = [ { "id": i, "slha": slha } for i,slha in enumerate(slhas) ]
+        if self.path is None:
+            if _pool.get ( "dbpath", None ) != self.dbpath:
+                start ( self.dbpath )
+            answers = list ( evaluateMany ( requests ) )
+        else:
+            with socket.socket ( socket.AF_UNIX, socket.SOCK_STREAM ) as s:
+                s.connect ( self.path )
+                ## the service answers while we are still sending, so we
+                ## send in a thread and read the answers right away,
+                ## else both socket buffers fill up and we deadlock
+                def send():
+                    with s.makefile ( "w" ) as wfile:
+                        for request in requests:
+                            wfile.write ( toLine ( request ) )
+                    s.shutdown ( socket.SHUT_WR )
+                writer = threading.Thread ( target = send, daemon = True )
+                writer.start()
+                with s.makefile ( "r" ) as rfile:
+                    answers = list ( parseLines ( rfile ) )
+                writer.join()
+        answers.sort ( key = lambda a: a["id"] )
+        return answers
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description=\
+            "long-lived SModelS service for gambit/colliderbit")
+    ap.add_argument('-d', '--dbpath', help='the database [official]',
+            type = str, default = "official" )
+    ap.add_argument('-p', '--nprocesses', help='number of workers, 0 is one per cpu [1]',
+            type = int, default = 1 )
+    ap.add_argument('-s', '--socket', help='serve on this unix socket, instead of stdin/stdout [None]',
+            type = str, default = None )
+    ap.add_argument('-c', '--client', nargs='+', help='be the stub client, send these slha files to the service at --socket, or evaluate them in process if no socket is given',
+            type = str, default = None )
+    args = ap.parse_args()
+    if args.client is not None:
+        slhas = []
+        for slhafile in args.client:
+            with open ( slhafile, "rt" ) as f:
+                slhas.append ( f.read() )
+        client = Client ( args.socket, args.dbpath )
+        for slhafile, answer in zip ( args.client, client.evaluate ( slhas ) ):
+            print ( f"{slhafile} ({answer['time']:.2f}s): {answer.get('results',answer.get('error'))}" )
+        stop()
+        sys.exit()
+    if args.socket is None:
+        ## stdout is for the answers only, everything else goes to stderr
+        stdout, sys.stdout = sys.stdout, sys.stderr
+    start ( args.dbpath, args.nprocesses )
+    try:
+        if args.socket is None:
+            serveStdio ( stdout )
+        else:
+            serveSocket ( args.socket )
+    finally:
+        stop()
@@ -86,6 +86,9 @@ class Data(Dataset):
 
 
 
+## bump this, whenever the drawing of random points changes
+datasetCacheVersion = 1
+
 class DatasetBuilder():
 
 	"""
@@ -126,6 +129,15 @@ class DatasetBuilder():
 
 		self.externalFile = parameter["externalFile"]
 
+		try: self.datasetCache = parameter["datasetCache"]
+		except KeyError: self.datasetCache = None
+		if self.datasetCache == None:
+			self.datasetCache = os.path.join(os.path.expanduser("~"), ".cache", "smodels-utils", "datasets")
+		if self.datasetCache in ["none", "None", "false", "False", ""]:
+			self.datasetCache = None
+		else:
+			self.datasetCache = os.path.expanduser(self.datasetCache)
+
 		if self.externalFile != None:
 			if os.path.isfile(self.externalFile):
 				self.massColumns = parameter["massColumns"]
@@ -427,6 +439,149 @@ class DatasetBuilder():
 		self._delauney = Delaunay(hullPoints)
 
 
+	def _massesFor(self, rand):
+
+		"""
+		Returns the mass points (coordinates without units) of many points in PCA space, i.e. tx.dataToCoordinates(tx.coordinatesToData(point, ...)) for each point.
+		Without widths this map is affine, so it is calibrated once with a few single point calls, verified, and then applied to the whole array.
+
+		:param rand: (2dim array, float) points in PCA space, one per row
+
+		"""
+
+		tx = self.txnameData
+
+		def single(point):
+			x = tx.coordinatesToData(list(point), rotMatrix = tx._V, transVector = tx.delta_x)
+			return np.array(tx.dataToCoordinates(x), dtype = float)
+
+		if not hasattr(self, "_affineMap"):
+			self._affineMap = None
+			if tx.widthPosition == []:
+				origin = np.mean(self._origPCA, axis = 0)[:tx.dimensionality]
+				offset = single(origin)
+				matrix = np.array([single(origin + e) - offset for e in np.eye(tx.dimensionality)]).T
+				checks = origin + np.random.normal(0., 100., (3, tx.dimensionality))
+				expected = np.array([single(c) for c in checks])
+				mapped = (checks - origin) @ matrix.T + offset
+				if np.allclose(mapped, expected, rtol = 1e-8, atol = 1e-6):
+					self._affineMap = (origin, matrix, offset)
+				else:
+					logger.info("mass coordinates are not affine in PCA space, will convert point by point")
+
+		rand = np.asarray(rand, dtype = float).reshape(-1, tx.dimensionality)
+		if self._affineMap != None:
+			origin, matrix, offset = self._affineMap
+			return (rand - origin) @ matrix.T + offset
+
+		return np.array([single(point) for point in rand])
+
+
+	def _valuesFor(self, rand):
+
+		"""
+		Returns the values (effs/ULs without units) of the txname interpolation for many points in PCA space, nan where tx.getValueFor returns None.
+		Points inside the triangulation are interpolated in one go, with the same barycentric interpolation as tx.interpolate,
+		the units are calibrated once against tx.getValueFor. Points outside (extrapolation) are evaluated one by one.
+
+		:param rand: (2dim array, float) points in PCA space, one per row
+
+		"""
+
+		tx = self.txnameData
+		rand = np.asarray(rand, dtype = float).reshape(-1, tx.dimensionality)
+
+		def single(point):
+			x = tx.coordinatesToData(list(point), rotMatrix = tx._V, transVector = tx.delta_x)
+			val = removeUnits(tx.getValueFor(x), physicsUnits.standardUnits)
+			return np.nan if val is None else float(val)
+
+		values = np.full(len(rand), np.nan)
+		tri = getattr(tx, "tri", None)
+		if tri == None or not hasattr(tx, "y_values"):
+			simplices = np.full(len(rand), -1)
+		else:
+			simplices = tri.find_simplex(rand, tol = 1e-6)
+			inside = simplices >= 0
+			trans = tri.transform[simplices[inside]]
+			bary = np.einsum("nij,nj->ni", trans[:, :tx.dimensionality, :], rand[inside] - trans[:, tx.dimensionality, :])
+			weights = np.hstack([bary, 1. - bary.sum(axis = 1, keepdims = True)])
+			vertexValues = np.asarray(tx.y_values, dtype = float)[tri.simplices[simplices[inside]]]
+			interpolated = np.maximum((vertexValues * weights).sum(axis = 1), vertexValues.min(axis = 1))
+			with np.errstate(divide = "ignore"):
+				digits = 5 - np.floor(np.log10(np.abs(interpolated)))
+			digits[~np.isfinite(digits)] = 0
+			interpolated = np.round(interpolated * 10.**digits) / 10.**digits
+			factor = self._unitFactor(rand[inside], interpolated, single)
+			if factor == None: # cannot calibrate, so we do every point by itself
+				simplices[:] = -1
+			else:
+				values[inside] = factor * interpolated
+
+		for i in np.where(simplices < 0)[0]:
+			values[i] = single(rand[i])
+
+		return values
+
+
+	def _unitFactor(self, rand, interpolated, single):
+
+		"""
+		Calibrates and verifies the ratio between tx.getValueFor (without units) and the bare interpolation, once per builder.
+		Returns None, if the bulk interpolation does not reproduce tx.getValueFor.
+
+		"""
+
+		if hasattr(self, "_valueFactor") and self._valueFactor[1] >= 3:
+			return self._valueFactor[0]
+
+		factor, nchecked = getattr(self, "_valueFactor", (None, 0))
+		for point, val in zip(rand, interpolated):
+			if nchecked >= 3: break
+			if val == 0.: continue
+			ratio = single(point) / val
+			if factor == None: factor = ratio
+			if not np.isclose(ratio, factor, rtol = 1e-4):
+				logger.info("bulk interpolation differs from getValueFor, will evaluate point by point")
+				self._valueFactor = (None, float("inf"))
+				return None
+			nchecked += 1
+
+		self._valueFactor = (factor, nchecked)
+		if nchecked < 3:
+			return None # not yet verified, these points go one by one
+
+		return factor
+
+
+	def _getRefXsecs(self, mothers):
+
+		"""
+		Vectorized version of self._getRefXsec, for an array of mother masses
+
+		"""
+
+		masses = np.asarray(self.refXsecs["masses"], dtype = float)
+		xsecs = np.asarray(self.refXsecs["xsecs"], dtype = float)
+		indices = np.minimum(np.searchsorted(masses, mothers, side = "right"), len(masses) - 1)
+
+		return xsecs[indices]
+
+
+	def _isOnHullMany(self, masses):
+
+		"""
+		Returns 1. for each mass point within the convex hull of the original grid points, 0. else. One find_simplex call for all points.
+
+		:param masses: (2dim array, float) mass points, one per row
+
+		"""
+
+		mp = np.asarray(masses, dtype = float)[:, self._delauneyAxes]
+
+		return (self._delauney.find_simplex(mp) >= 0).astype(float)
+
+
 	def _drawRandomPointsRegression(self):
 
 		"""
@@ -457,35 +612,28 @@ class DatasetBuilder():
 
 			while pointsLeft > 0:
 
-				rand = []
-				for i in range(tx.dimensionality):
-					rand.append(np.random.normal(mean[i], 50. + 4.*std[i]))
-
-				x = tx.coordinatesToData(rand, rotMatrix = tx._V, transVector = tx.delta_x)
-				val = tx.getValueFor(x)
-				val = removeUnits(val,physicsUnits.standardUnits)
+				# draw candidates in batches, typically more than we need
+				batchSize = min(max(2 * pointsLeft, 64), 100000)
+				rand = np.random.normal(mean[:tx.dimensionality], 50. + 4.*std[:tx.dimensionality], (batchSize, tx.dimensionality))
 
-				if self.refXsecs != None and val != None:
-					x0 = x
-					while type(x0) == list or type(x0) == tuple: x0 = x0[0]
-					x0 = x0.asNumber(GeV)
-					xsec = self._getRefXsec(x0)
+				vals = self._valuesFor(rand)
+				valid = np.isfinite(vals)
+				masses = np.full((batchSize, 0), np.nan)
+				if valid.any():
+					masses = self._massesFor(rand[valid])
 
-					thresh = self.luminosity * xsec * val
+				if self.refXsecs != None and valid.any():
+					thresh = self.luminosity * self._getRefXsecs(masses[:, 0]) * vals[valid]
+					vals[np.where(valid)[0][thresh < 1e-2]] = 0.
 
-					if thresh < 1e-2:
-						val = 0.
+				accepted = valid & ((clusterMeanVals[n] == 0) | (vals != 0.) | (np.random.random(batchSize) < 0.15)) #0.1
+				accepted = np.where(accepted)[0][:pointsLeft]
+				rows = np.searchsorted(np.where(valid)[0], accepted)
 
-				if type(val) != type(None) and ( clusterMeanVals[n] == 0 or (val != 0. or random() < 0.15) ): #0.1
-						
-					pointsLeft -= 1
-						
-					if val == 0.:
-						zeroes += 1
-
-					strippedUnits = tx.dataToCoordinates(x)
-					drawnMasses.append(strippedUnits)
-					drawnTargets.append(val)
+				pointsLeft -= len(accepted)
+				zeroes += int(np.sum(vals[accepted] == 0.))
+				drawnMasses += masses[rows].tolist()
+				drawnTargets += vals[accepted].tolist()
 
 		logger.debug(f"{round(100.0 * (zeroes / len(drawnMasses)), 3)}% are zero.")
 
@@ -541,24 +689,17 @@ class DatasetBuilder():
 
 				while(samplesPerHullPointLeft > 0):
 
-					rand = []
-					for i in range(tx.dimensionality):
-						rand.append(np.random.normal(point[i], 0.15*std[i]))
-
-					masses = tx.coordinatesToData(rand, rotMatrix = tx._V, transVector = tx.delta_x)
-					masses = tx.dataToCoordinates(masses)
-
-					if all([m >= 0 for m in masses]):
+					rand = np.random.normal(point[:tx.dimensionality], 0.15*std[:tx.dimensionality], (2 * samplesPerHullPointLeft, tx.dimensionality))
+					masses = self._massesFor(rand)
+					masses = masses[np.all(masses >= 0, axis = 1)][:samplesPerHullPointLeft]
 
-						val = self._isOnHull(masses)
+					drawnMasses += masses.tolist()
+					drawnTargets += self._isOnHullMany(masses).tolist()
 
-						drawnMasses.append(masses)
-						drawnTargets.append(val)
+					samplesLeft -= len(masses)
+					samplesPerHullPointLeft -= len(masses)
 
-						samplesLeft -= 1
-						samplesPerHullPointLeft -= 1
-
-						logger.debug(f"points drawn: {len(drawnMasses)}")
+				logger.debug(f"points drawn: {len(drawnMasses)}")
 
 			
 		samplesLeft = 0
@@ -574,21 +715,14 @@ class DatasetBuilder():
 
 			while pointsLeft > 0:
 
-				rand = []
-				for i in range(tx.dimensionality):
-					rand.append(np.random.normal(mean[i], 2.5*std[i]))
-
-				masses = tx.coordinatesToData(rand, rotMatrix = tx._V, transVector = tx.delta_x)
-				masses = tx.dataToCoordinates(masses)
-
-				if all([m >= 0 for m in masses]):
+				rand = np.random.normal(mean[:tx.dimensionality], 2.5*np.array(std[:tx.dimensionality]), (2 * pointsLeft, tx.dimensionality))
+				masses = self._massesFor(rand)
+				masses = masses[np.all(masses >= 0, axis = 1)][:pointsLeft]
 
-					val = self._isOnHull(masses)
+				drawnMasses += masses.tolist()
+				drawnTargets += self._isOnHullMany(masses).tolist()
 
-					drawnMasses.append(masses)
-					drawnTargets.append(val)
-							
-					pointsLeft -= 1
+				pointsLeft -= len(masses)
 			
 
 		self.masses = np.array(drawnMasses)
@@ -624,18 +758,91 @@ class DatasetBuilder():
 		logger.info(f"dataset generation completed ({round(time() - t0, 3)}s)")
 
 
-	def createDataset(self, nettype):
+	def _cacheFile(self):
+
+		"""
+		Returns the path of the cached dataset of the current nettype, keyed by analysis, txname, signal region and the dataset parameters.
+		None if caching is switched off.
+
+		"""
+
+		if self.datasetCache == None:
+			return None
+
+		import hashlib
+		tx = self.txnameData
+		key = [datasetCacheVersion, self.expres.globalInfo.id, str(tx), self.dataselector, self.signalRegion, self.nettype,
+			self.sampleSize[self.nettype], self.externalFile, self.refXsecFile, self.refXsecColumns if self.refXsecs != None else None]
+		for fname in [self.externalFile, self.refXsecFile]:
+			if fname != None and os.path.isfile(fname):
+				key.append(os.stat(fname).st_mtime_ns)
+		h = hashlib.sha256(repr(key).encode())
+		if hasattr(tx, "y_values"):
+			h.update(np.asarray(tx.y_values, dtype = float).tobytes())
+
+		return os.path.join(self.datasetCache, f"{self.expres.globalInfo.id}_{tx}_{self.signalRegion}_{self.nettype}_{h.hexdigest()[:16]}.npz")
+
+
+	def _loadFromCache(self):
+
+		"""
+		Load self.masses and self.targets from the dataset cache
+
+		:return: (boolean) True, if the dataset was found in the cache
+
+		"""
+
+		fname = self._cacheFile()
+		if fname == None or not os.path.isfile(fname):
+			return False
+
+		try:
+			with np.load(fname) as f:
+				self.masses, self.targets = f["masses"], f["targets"]
+		except (OSError, ValueError, KeyError) as e:
+			logger.warning(f"could not read cached dataset {fname}: {e}")
+			return False
+
+		logger.info(f"loaded {len(self.targets)} points from {fname}")
+		return True
+
+
+	def _storeInCache(self):
+
+		"""
+		Store self.masses and self.targets in the dataset cache
+
+		"""
+
+		fname = self._cacheFile()
+		if fname == None:
+			return
+
+		try:
+			os.makedirs(os.path.dirname(fname), exist_ok = True)
+			tmpfile = f"{fname}.{os.getpid()}.tmp.npz"
+			np.savez(tmpfile, masses = self.masses, targets = self.targets)
+			os.replace(tmpfile, fname)
+		except OSError as e:
+			logger.warning(f"could not cache dataset in {fname}: {e}")
+
+
+	def createDataset(self, nettype, useCache = True):
 
 		"""
 		Generate self.masses and self.targets for the dataset. Points will either be drawn randomly from the txnamedata interpolation
-		or read from an external file.
+		or read from an external file. Drawn datasets are cached on disk (see self.datasetCache).
 
 		:param nettype: (string) 'regression' or 'classification' type dataset will be generated.
+		:param useCache: (optional) (boolean) reuse a dataset from the cache, if there is one
 
 		"""
 
 		self.nettype = nettype
 
+		if useCache and self._loadFromCache():
+			return
+
 		if not hasattr(self, "_gridPoints"):
 			self._loadGridPoints()	
 
@@ -653,6 +860,8 @@ class DatasetBuilder():
 		elif self.nettype == "classification":
 			self._drawRandomPoints()
 
+		self._storeInCache()
+
 			#self.masses = np.array(self._gridPoints)
 			#self.targets = np.array(self._gridTargets)
 
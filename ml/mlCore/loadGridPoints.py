@@ -1,6 +1,5 @@
 import os
 import numpy as np
-from smodels.tools.stringTools import concatenateLines
 from smodels.base.physicsUnits import GeV, fb
 from smodels.theory.auxiliaryFunctions import rescaleWidth
 from smodels.base.smodelsLogging import logger
@@ -9,7 +8,8 @@ from smodels.base.smodelsLogging import logger
 def loadInternalGridPoints(expres, txnameData, dataselector, signalRegion, singleLines = True, stripUnits = True):
 
 	"""
-	Quick hack to load the original grid points within the database txname.txt files for a given analysis.
+	Load the original grid points within the database txname.txt files for a given analysis.
+	The file is read with the tokenizer of smodels_utils.helper.txnameGrid, once per process.
 
 	:param expres: SModelS experimental result to be loaded (smodels.ExpResult)
 	:param txnameData: SModelS topology to be loaded (smodels.txnameData)
@@ -20,10 +20,7 @@ def loadInternalGridPoints(expres, txnameData, dataselector, signalRegion, singl
 	
 	"""
 
-	if dataselector == "upperLimit":
-		whichTag = "upperLimits"
-	else:
-		whichTag = "efficiencyMap"
+	from smodels_utils.helper.txnameGrid import getGrid, gridTag
 
 	for tx in expres.getTxNames():
 		if tx.txnameData == txnameData:
@@ -36,59 +33,23 @@ def loadInternalGridPoints(expres, txnameData, dataselector, signalRegion, singl
 	else:
 		filePath = f"{expres.path}/{signalRegion}/{tx}.txt"
 
-	with open(filePath) as txtFile:
-		txdata = txtFile.read()
-	content = concatenateLines(txdata.split("\n"))
-	tags = [line.split(":", 1)[0].strip() for line in content]
-
-	for i,tag in enumerate(tags):
-		if not tag: continue
-		line = content[i]
-		value = line.split(':',1)[1].strip()
-		if ";" in value: value = value.split(";")
-
-		if tag == whichTag:
-			data = value
-			break
-
-
-	origData, values = [], []
-
-	data = data.split("],[[[")
-
-	if data[0] != data[0].replace('*fb',''): unitValues = "*fb"
-	elif data[0] != data[0].replace('*pb',''): unitValues = "*pb"
-	else: unitValues = 1.
+	grid = getGrid(filePath, gridTag(dataselector))
+	if grid == None:
+		raise ValueError(f"no {gridTag(dataselector)} in {filePath}")
 
 	if stripUnits: units = [1., 1.]
-	else: units = [GeV, unitValues]
-	
-	for line in data:
-		line = line.replace('[[[[','')
-		line = line.replace('],[',',')
-		line = line.replace(']]','')
-		line = line.replace('*GeV','')
-		line = line.replace('(', '')
-		line = line.replace(')', '')
-		
-		#if line != line.replace('*fb',''): UNITS = "*fb"
-		#elif line != line.replace('*pb',''): UNITS = "*pb"
-		#else: UNITS = None
-			
-		line = line.replace('*fb','')
-		line = line.replace('*pb','')
-
-		point = line.split(",")
-		masses = [float(p)*units[0] for p in point[:-1]]
-		dHalf = int(0.5*len(masses))
+	else: units = [GeV, grid.unit()]
 
-		if not singleLines:
-			masses = [[m for m in masses[0:dHalf]],[m for m in masses[dHalf:]]]
+	origData = grid.masses.tolist()
+	values = grid.values.tolist()
 
-		origData.append(masses)
+	if not stripUnits:
+		origData = [[m*units[0] for m in masses] for masses in origData]
+		values = [v*units[1] for v in values]
 
-		value = float(point[-1])*units[1]
-		values.append(value)
+	if not singleLines:
+		dHalf = int(0.5*grid.masses.shape[1])
+		origData = [[masses[0:dHalf], masses[dHalf:]] for masses in origData]
 
 	return origData, values, units
 
@@ -10,10 +10,9 @@
 
 import os
 import torch
+import multiprocessing
 import matplotlib.pyplot as plt
-from copy import deepcopy
 from pathlib import Path
-from torch.utils.data import DataLoader
 from scipy.optimize import minimize
 from mlCore.dataset import Data
 from mlCore.network import createNet
@@ -21,6 +20,30 @@ from mlCore.lossFunctionsAndOptimizers import loadLossFunction, loadOptimizer, g
 from smodels.base.smodelsLogging import logger
 from smodels.base.smodelsLogging import getLogLevel
 
+_shared = {} # the trainer that is inherited by the forked sweep processes
+
+
+def _runConfiguration(index):
+
+	"""
+	Trains a single hyperparameter configuration in a forked sweep process
+
+	:param index: index of the hyperparameter configuration
+	:return: (index, model, mean validation error, epoch losses)
+
+	"""
+
+	trainer = _shared["trainer"]
+	trainer.hyper._index = index
+	trainer.verbose = False
+	if trainer.cores != None:
+		torch.set_num_threads(max(1, trainer.cores // trainer.sweepProcesses))
+	torch.manual_seed(torch.initial_seed() + index) # forked processes share the rng state
+	trainer.epochLoss = {"epoch":[], "training":[], "testing":[]}
+	trainer.runCurrentConfiguration()
+
+	return index, trainer.model, trainer.meanError, trainer.epochLoss
+
 
 class ModelTrainer():
 
@@ -45,6 +68,14 @@ class ModelTrainer():
 
 		self.device = parameter["device"]
 		self.cores = parameter["cores"]
+		if self.device.type == "cpu" and self.cores != None:
+			torch.set_num_threads(self.cores)
+
+		self.patience		= parameter["patience"] # epochs without improvement before stopping, None or 0 = never
+		self.evalInterval	= parameter["evalInterval"] or 1 # evaluate losses every n-th epoch
+		self.evalSubsample	= parameter["evalSubsample"] # evaluate losses on at most n points, None = all
+		self.sweepProcesses = parameter["sweepProcesses"] or 1 # train configurations in parallel processes
+		self.verbose = True
 
 		self.full_dim = self.txnameData.full_dimensionality
 		self.rescaleParameter = dataset["rescaleParams"]
@@ -70,21 +101,14 @@ class ModelTrainer():
 
 		"""
 
-		self.hyper.resetIndex
-		while(self.hyper.incrIndex):
-
-			self.epochLoss = {"training":[], "testing":[]}
-
-			logger.info(f"training with hyperparam config {int(self.hyper.index + 1)}/{len(self.hyper)} ..")
-
-			self.runCurrentConfiguration()
+		for index, model, meanError, epochLoss in self._runConfigurations():
 
-			if self.winner["error"] > self.meanError:
+			if self.winner["error"] > meanError:
 
-				self.winner["model"]	 = deepcopy(self.model)
-				self.winner["error"]   	 = self.meanError
-				self.winner["config"]  	 = self.hyper[-1]
-				self.winner["epochLoss"] = self.epochLoss
+				self.winner["model"]	 = model
+				self.winner["error"]   	 = meanError
+				self.winner["config"]  	 = self.hyper[index]
+				self.winner["epochLoss"] = epochLoss
 				#self.winner["logData"]  = self.logData
 
 				self.winner["model"].setValidationLoss(self.winner["error"])
@@ -95,6 +119,44 @@ class ModelTrainer():
 
 
 
+	def _runConfigurations(self):
+
+		"""
+		Trains all hyperparameter configurations, one after the other or
+		in self.sweepProcesses forked processes that share the datasets.
+		Every configuration trains a freshly created model.
+
+		:return: generator of (index, model, mean validation error, epoch losses)
+
+		"""
+
+		self.hyper.resetIndex
+
+		if self.sweepProcesses > 1 and len(self.hyper) > 1:
+
+			logger.info(f"training {len(self.hyper)} hyperparam configs in {min(self.sweepProcesses, len(self.hyper))} processes ..")
+
+			_shared["trainer"] = self
+			ctx = multiprocessing.get_context("fork")
+			with ctx.Pool(min(self.sweepProcesses, len(self.hyper))) as pool:
+				for result in pool.imap_unordered(_runConfiguration, range(len(self.hyper))):
+					logger.info(f"hyperparam config {int(result[0] + 1)}/{len(self.hyper)} done, error: {result[2]:f}")
+					yield result
+			_shared.clear()
+			return
+
+		while(self.hyper.incrIndex):
+
+			self.epochLoss = {"epoch":[], "training":[], "testing":[]}
+
+			logger.info(f"training with hyperparam config {int(self.hyper.index + 1)}/{len(self.hyper)} ..")
+
+			self.runCurrentConfiguration()
+
+			yield self.hyper.index, self.model, self.meanError, self.epochLoss
+
+
+
 	def runCurrentConfiguration(self, secondRun = False):
 
 		"""
@@ -138,45 +200,91 @@ class ModelTrainer():
 		if lossFunction == None: lossFunction = loadLossFunction(self.hyper["lossFunction"], self.device)
 
 		lossFunc2 = loadLossFunction("MSE", self.device)
-		alpha, beta = 1., 50.
+		beta = 50.
 
-		trainloader = DataLoader(training, batch_size = batchSize, shuffle = True, num_workers = self.cores)
+		trainingEval = self._evaluationSubset(training)
+		testingEval = self._evaluationSubset(testing)
 
-		bestLossLocal, bestEpochLocal, bestModelLocal  = 1e6, 0, deepcopy(self.model)
+		bestLossLocal, bestEpochLocal, bestStateLocal = 1e6, 0, self._stateSnapshot()
+		numOfPoints = len(training)
 
 		for epoch in range(epochNum):
 
 			self.model.train()
 
-			for i, data in enumerate(trainloader):  
+			# minibatches are slices of a shuffled index tensor, the data are in memory already
+			permutation = torch.randperm(numOfPoints, device = training.inputs.device)
+
+			for start in range(0, numOfPoints, batchSize):
+
+				indices = permutation[start:start + batchSize]
+				inputs, labels = training.inputs[indices], training.labels[indices]
 
 				optimizer.zero_grad()
-				inputs, labels = data[0], data[1]
-				loss1 = lossFunction(self.model(inputs), labels)
-				loss2 = lossFunc2(self.model(inputs), labels)
-				loss = alpha * loss1 + beta * loss2
+				outputs = self.model(inputs)
+				loss1 = lossFunction(outputs, labels)
 				loss1.backward()
 				optimizer.step()
 
+			if (epoch + 1) % self.evalInterval != 0 and epoch + 1 < epochNum:
+				continue
+
 			self.model.eval()
 
 			with torch.no_grad():
+
+				loss2 = lossFunc2(outputs, labels) # monitored only, on the last minibatch
+				trainingLoss = lossFunction(self.model(trainingEval[0]), trainingEval[1]).item()
+				testingLoss = lossFunction(self.model(testingEval[0]), testingEval[1]).item()
+
+			self.epochLoss["epoch"].append(epoch + 1)
+			self.epochLoss["training"].append(trainingLoss)
+			self.epochLoss["testing"].append(testingLoss)
+
+			if testingLoss < bestLossLocal:
+				bestLossLocal  = testingLoss
+				bestStateLocal = self._stateSnapshot()
+				bestEpochLocal = epoch
+
+			stop = bool(self.patience) and epoch - bestEpochLocal >= self.patience
 			
-				trainingLoss = lossFunction(self.model(training.inputs), training.labels)
-				testingLoss = lossFunction(self.model(testing.inputs), testing.labels)
-
-				self.epochLoss["training"].append(trainingLoss)
-				self.epochLoss["testing"].append(testingLoss)
-									
-				if testingLoss < bestLossLocal:
-					bestLossLocal  = testingLoss
-					bestModelLocal = deepcopy(self.model)
-					#bestEpochLocal = epoch
-			
-			if getLogLevel() <= 20: # 20 == info
-				print(f"\repoch: {int(epoch + 1)}/{int(epochNum)} | loss: {bestLossLocal:f} ({testingLoss:f}) {loss1.item()} {beta * loss2.item()}   ", end = "" if epoch+1 < epochNum else "\n")
+			if self.verbose and getLogLevel() <= 20: # 20 == info
+				print(f"\repoch: {int(epoch + 1)}/{int(epochNum)} | loss: {bestLossLocal:f} ({testingLoss:f}) {loss1.item()} {beta * loss2.item()}   ", end = "" if epoch+1 < epochNum and not stop else "\n")
+
+			if stop:
+				logger.debug(f"no improvement since epoch {int(bestEpochLocal + 1)}, stopping early")
+				break
+
+		self.model.load_state_dict(bestStateLocal)
+
+
+
+	def _stateSnapshot(self):
+
+		"""
+		Copy of the current weights and biases, much cheaper than a deepcopy of the model
+
+		"""
+
+		return {key: value.detach().clone() for key, value in self.model.state_dict().items()}
+
+
+
+	def _evaluationSubset(self, data):
+
+		"""
+		Inputs and labels the losses are evaluated on during training: all of data,
+		or a random but fixed subsample of self.evalSubsample points
+
+		:param data: Data (training or testing set)
+
+		"""
+
+		if self.evalSubsample == None or self.evalSubsample >= len(data):
+			return data.inputs, data.labels
 
-		self.model = bestModelLocal
+		indices = torch.randperm(len(data), device = data.inputs.device)[:self.evalSubsample]
+		return data.inputs[indices], data.labels[indices]
 
 
 
@@ -248,7 +356,7 @@ class ModelTrainer():
 		trainingLoss = self.winner["epochLoss"]["training"]
 		testingLoss = self.winner["epochLoss"]["testing"]
 
-		epo = [n+1 for n in range(len(trainingLoss))]
+		epo = self.winner["epochLoss"].get("epoch", [n+1 for n in range(len(trainingLoss))])
 
 		title = f"epoch loss for {str(self.txnameData)}:{self.type}"
 
@@ -33,9 +33,14 @@ TrainingParameter = {
 				("externalFile", str),
 				("massColumns", int), 
 				("refXsecFile", str), 
-				("refXsecColumns", int)],
+				("refXsecColumns", int),
+				("datasetCache", str)],
 	"computation": [("device", str),
-				("cores", int)],
+				("cores", int),
+				("patience", int),
+				("evalInterval", int),
+				("evalSubsample", int),
+				("sweepProcesses", int)],
 	"validation": [("logFile", bool),
 				("lossPlot", bool),
 				("runPerformance", bool)],
@@ -113,6 +113,184 @@ class PyhfData:
             # Checking if all signals matching this json are zero
             self.zeroSignalsFlag.append(allZero)
 
+# Same modifiers_settings as those use when running the 'pyhf cls' command line
+msettings = {'normsys': {'interpcode': 'code4'}, 'histosys': {'interpcode': 'code4p'}}
+
+_engines = {} # id(inputJson) -> (inputJson, PyhfModelEngine), we keep the json so the id stays unique
+
+def getEngine(inputJson, wsInfo):
+    """
+    Returns the engine of a workspace, compiled only once per process
+
+    :param inputJson: the background-only workspace, as python json instance
+    :param wsInfo: the channels information of the workspace, see PyhfData.getWSInfo
+    :return: PyhfModelEngine, None if the model cannot be built
+    """
+    key = id(inputJson)
+    if not key in _engines:
+        try:
+            engine = PyhfModelEngine(inputJson, wsInfo)
+        except (pyhf.exceptions.InvalidSpecification, KeyError, ValueError) as e:
+            logger.error(f"Cannot build the model of the json file:\n{e}")
+            engine = None
+        _engines[key] = (inputJson, engine)
+    return _engines[key][1]
+
+class PyhfModelEngine:
+    """
+    Holds the compiled model of one workspace, with the signal sample added to the
+    signal regions and the control and validation regions removed, as in
+    PyhfUpperLimitComputer.patchMaker. The signal sample has unit yields and a
+    shapefactor per signal region; the signal of a hypothesis enters as the fixed
+    values of the shapefactors (the yields divided by their maximum), the maximum
+    itself is absorbed into the POI. So the model is compiled once, for all signal
+    hypotheses and all rescalings of the signals.
+    """
+    def __init__(self, inputJson, wsInfo):
+        """
+        :param inputJson: the background-only workspace, as python json instance
+        :param wsInfo: the channels information of the workspace, see PyhfData.getWSInfo
+        """
+        self.sizes = [srInfo['size'] for srInfo in wsInfo['signalRegions']]
+        patch = []
+        shapefactors = []
+        for i_sr, srInfo in enumerate(wsInfo['signalRegions']):
+            name = f"SModelS_signal_{i_sr}"
+            shapefactors.append(name)
+            value = {"data": [1.]*srInfo['size'], "name": "bsm"}
+            value["modifiers"] = [{"data": None, "type": "normfactor", "name": "mu_SIG"},
+                                  {"data": None, "type": "lumi", "name": "lumi"},
+                                  {"data": None, "type": "shapefactor", "name": name}]
+            patch.append({"op": "add", "path": srInfo['path'], "value": value})
+        for path in wsInfo['otherRegions']:
+            patch.append({'op': 'remove', 'path': path})
+        start = time.time()
+        workspace = pyhf.Workspace(jsonpatch.apply_patch(inputJson, patch))
+        self.model = workspace.model(modifier_settings=msettings)
+        self.data = workspace.data(self.model)
+        config = self.model.config
+        self.poi = config.poi_index
+        self.init = np.array(config.suggested_init(), dtype=float)
+        self.bounds = [list(b) for b in config.suggested_bounds()]
+        self.fixed = list(config.suggested_fixed())
+        # signal regions can be removed with the other regions (e.g. CRISR), then they have no slice
+        self.signalSlices = [config.par_slice(name) if name in config.par_map else None
+                             for name in shapefactors]
+        for sl in self.signalSlices:
+            if sl == None:
+                continue
+            for i in range(sl.start, sl.stop):
+                self.fixed[i] = True
+        logger.debug(f"Model compiled in {time.time() - start:1.4f} secs")
+
+    def parameters(self, signal):
+        """
+        Returns the initial values and the bounds of the parameters for a signal
+
+        :param signal: the signal yields of all signal region bins
+        :return: init_pars, par_bounds and the normalization of the signal
+        """
+        signal = np.asarray(signal, dtype=float)
+        norm = float(max(signal))
+        init = self.init.copy()
+        bounds = [list(b) for b in self.bounds]
+        start = 0
+        for sl, size in zip(self.signalSlices, self.sizes):
+            if sl != None:
+                init[sl] = signal[start:start+size] / norm
+            start += size
+        init[self.poi] = self.init[self.poi] * norm
+        bounds[self.poi] = [b * norm for b in self.bounds[self.poi]]
+        return init.tolist(), bounds, norm
+
+    def CLs(self, signal, mu, expected=False):
+        """
+        Returns the CLs value of the signal strength mu
+
+        :param signal: the signal yields of all signal region bins
+        :param expected: if True, the expected CLs
+        """
+        init, bounds, norm = self.parameters(signal)
+        args = {"init_pars": init, "par_bounds": bounds, "fixed_params": self.fixed,
+                "return_expected": expected}
+        start = time.time()
+        try:
+            result = pyhf.infer.hypotest(mu * norm, self.data, self.model,
+                                         test_stat="qtilde", **args)
+        except TypeError: # older versions of pyhf
+            result = pyhf.infer.hypotest(mu * norm, self.data, self.model,
+                                         qtilde=True, **args)
+        logger.debug(f"Hypotest elapsed time : {time.time() - start:1.4f} secs")
+        if expected:
+            result = result[1]
+        return float(np.asarray(result).ravel()[0])
+
+    def ulSigma(self, signal, expected=False, cl=0.95):
+        """
+        Compute the upper limit on the signal strength modifier, with the same
+        rescaling of the signals so that mu falls in [1, 10] as in
+        PyhfUpperLimitComputer.ulSigma, only that here the rescaling is free
+
+        :param signal: the signal yields of all signal region bins
+        :param expected: if True, the expected upper limit
+        :param cl: the confidence level
+        :return: the upper limit on mu, None if all signals are zero
+        """
+        signal = np.asarray(signal, dtype=float)
+        if not any(signal > 0.):
+            return None
+        scales = [1.]
+        def root_func(mu):
+            return 1.0 - cl - self.CLs(signal * scales[-1], mu, expected)
+        def rescale(factor):
+            scales.append(scales[-1] * factor)
+            # have we returned to the scale of the previous-to-previous loop?
+            return len(scales) > 2 and np.isclose(scales[-1], scales[-3], rtol=1e-12)
+        factor = 10.
+        alreadyBeenThere = False
+        wereBothLarge = False
+        wereBothTiny = False
+        while "mu is not in [0,10]":
+            rt1 = root_func(1.)
+            rt10 = root_func(10.)
+            if rt1 < 0. and 0. < rt10:
+                break
+            if alreadyBeenThere:
+                factor = 1 + (factor-1)/2
+                logger.debug("Diminishing rescaling factor")
+            if np.isnan(rt1):
+                alreadyBeenThere = rescale(factor)
+                continue
+            if np.isnan(rt10):
+                alreadyBeenThere = rescale(1/factor)
+                continue
+            if rt10 < 0 and rt1 < 0 and wereBothLarge:
+                factor = 1 + (factor-1)/2
+                logger.debug("Diminishing rescaling factor")
+            if rt10 > 0 and rt1 > 0 and wereBothTiny:
+                factor = 1 + (factor-1)/2
+                logger.debug("Diminishing rescaling factor")
+            wereBothTiny = rt10 < 0 and rt1 < 0
+            wereBothLarge = rt10 > 0 and rt1 > 0
+            if rt10 < 0.:
+                alreadyBeenThere = rescale(factor)
+                continue
+            if rt1 > 0.:
+                alreadyBeenThere = rescale(1/factor)
+                continue
+        logger.debug(f"Final scale : {scales[-1]:f}")
+        ul = optimize.brentq(root_func, 1., 10., rtol=1e-3, xtol=1e-3)
+        return ul * scales[-1]
+
+    def ulSigmas(self, signals, expected=False, cl=0.95):
+        """
+        Compute the upper limits for many signal hypotheses, with the same model
+
+        :param signals: list of signal yields, one vector per hypothesis
+        :return: list of upper limits on mu
+        """
+        return [self.ulSigma(signal, expected, cl) for signal in signals]
+
 class PyhfUpperLimitComputer:
     """
     Class that computes the upper limit using the jsons files and signal informations in the `data` instance of `PyhfData`
@@ -243,8 +421,6 @@ class PyhfUpperLimitComputer:
                 workspace = self.workspaces[workspace_index]
         else:
             workspace = self.cbWorkspace()
-        # Same modifiers_settings as those use when running the 'pyhf cls' command line
-        msettings = {'normsys': {'interpcode': 'code4'}, 'histosys': {'interpcode': 'code4p'}}
         model = workspace.model(modifier_settings=msettings)
         test_poi = 1.
         _, nllh = pyhf.infer.mle.fixed_poi_fit(test_poi, workspace.data(model), model, return_fitted_val=True)
@@ -274,7 +450,43 @@ class PyhfUpperLimitComputer:
     # Trying a new method for upper limit computation :
     # re-scaling the signal predictions so that mu falls in [0, 10] instead of looking for mu bounds
     # Usage of the index allows for rescaling
-    def ulSigma (self, expected=False, workspace_index=None):
+    def wsIndex(self, workspace_index=None):
+        """
+        Returns the index of the workspace to use, 0 if there is only one
+        """
+        if self.nWS == 1:
+            return 0
+        return workspace_index
+
+    def engine(self, workspace_index=None):
+        """
+        Returns the PyhfModelEngine of the workspace, None if it cannot be built
+        """
+        i_ws = self.wsIndex(workspace_index)
+        return getEngine(self.inputJsons[i_ws], self.channelsInfo[i_ws])
+
+    def ulSigmas(self, signals, expected=False, workspace_index=None):
+        """
+        Compute the upper limits on the signal strength modifier for many signal
+        hypotheses, without rebuilding the model of the workspace
+
+        :param signals: list of signal predictions, each with one entry per signal
+                        region bin of the workspace
+        :param expected: if True, the expected upper limits
+        :param workspace_index: index of the workspace, if there are several
+        :return: list of upper limits, None for hypotheses with zero signals
+        """
+        if self.data.errorFlag or self.channelsInfo == None:
+            return None
+        if self.nWS > 1 and workspace_index == None:
+            logger.error("There are several workspaces but no workspace index was provided")
+            return None
+        engine = self.engine(workspace_index)
+        if engine == None:
+            return None
+        return engine.ulSigmas(signals, expected, self.cl)
+
+    def ulSigma (self, expected=False, workspace_index=None, useEngine=True):
         """
         Compute the upper limit on the signal strength modifier with:
             - by default, the combination of the workspaces contained into self.workspaces
@@ -284,6 +496,8 @@ class PyhfUpperLimitComputer:
                           - else: uses `self.nsignals`
         :param workspace_index: - if different from `None`: index of the workspace to use for upper limit
                           - else: all workspaces are combined
+        :param useEngine: if True, use the compiled model of the workspace (see PyhfModelEngine),
+                          else patch and rebuild the workspace at every rescaling
         :return: the upper limit at `self.cl` level (0.95 by default)
         """
         startUL = time.time()
@@ -301,6 +515,13 @@ class PyhfUpperLimitComputer:
             elif self.zeroSignalsFlag[workspace_index] == True:
                 logger.debug(f"Workspace number {int(workspace_index)} has zero signals")
                 return None
+        if useEngine:
+            engine = self.engine(workspace_index)
+            if engine != None:
+                ul = engine.ulSigma(self.nsignals[self.wsIndex(workspace_index)], expected, self.cl)
+                endUL = time.time()
+                logger.debug(f"ulSigma elpased time : {endUL - startUL:1.4f} secs")
+                return ul*self.scale
         def updateWorkspace():
             if self.nWS == 1:
                 return self.workspaces[0]
@@ -308,8 +529,6 @@ class PyhfUpperLimitComputer:
                 return self.workspaces[workspace_index]
         workspace = updateWorkspace()
         def root_func(mu):
-            # Same modifiers_settings as those use when running the 'pyhf cls' command line
-            msettings = {'normsys': {'interpcode': 'code4'}, 'histosys': {'interpcode': 'code4p'}}
             model = workspace.model(modifier_settings=msettings)
             test_poi = mu
             start = time.time()
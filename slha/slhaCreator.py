@@ -19,7 +19,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.WARNING)
 import tempfile
 import pyslha
-import math, numpy, subprocess, time, sys, os
+import math, numpy, subprocess, time, sys, os, contextlib
 from smodels.decomposition import decomposer
 from smodels.base.physicsUnits import fb, GeV, TeV
 from smodels.base import runtime
@@ -27,7 +27,7 @@ from smodels.tools import xsecComputer
 from smodels_utils.dataPreparation.massPlaneObjects import MassPlane
 from validation.pythiaCardGen import getPythiaCardFor
 from smodels_utils.helper.terminalcolors import *
-import signal
+import signal, atexit
 from typing import Union
 
 __tempfiles__ = set()
@@ -51,9 +51,95 @@ def signal_handler(sig, frame):
         sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
+## also clean up when we leave via sys.exit, forked workers do not run this
+atexit.register ( removeTempFiles )
 
 complaints = { "removingSLHAFile": 0 }
 
+class CompiledTemplate:
+    """
+    A template file, parsed once into a fixed sequence of literal text
+    and placeholder segments, so that a file is rendered with a single join.
+    Placeholders are the tags, e.g. M0, and "tag-5", which is replaced by the
+    value minus 5. Everything from the XSECTION blocks on is dropped.
+    """
+
+    def __init__ ( self, path : str, tags ):
+        """
+        :param path: path to the template file
+        :param tags: the tags to replace, e.g. [ "M0", "M1", "m0", "m1" ]
+        """
+        import re
+        self.path = path
+        self.tags = frozenset ( tags )
+        with open ( path, "rt" ) as f:
+            text = f.read()
+        text = text[:text.find('XSECTION')]
+        ## longest tags first, so M1 never eats the beginning of M10
+        alternatives = "|".join ( re.escape(t) for t in \
+                sorted ( self.tags, key = len, reverse = True ) )
+        pattern = re.compile ( f"({alternatives})(-5)?" )
+        self.segments = [] # literal text or ( tag, offset )
+        pos = 0
+        for match in pattern.finditer ( text ):
+            self.segments.append ( text[pos:match.start()] )
+            offset = -5 if match.group(2) else 0
+            self.segments.append ( ( match.group(1), offset ) )
+            pos = match.end()
+        self.segments.append ( text[pos:] )
+
+    def render ( self, massDict : dict ) -> str:
+        """ the content of the slha file, for the values in massDict """
+        parts = []
+        for segment in self.segments:
+            if type(segment) == str:
+                parts.append ( segment )
+                continue
+            tag, offset = segment
+            if offset == 0:
+                parts.append ( str(massDict[tag]) )
+            else:
+                parts.append ( str(massDict[tag]+offset) )
+        return "".join ( parts )
+
+## the template object, shared with the forked workers of createFilesFor
+_shared = {}
+
+def createFilesForChunk ( chunk : list ) -> tuple:
+    """ create the slha files for a chunk of points, in a worker process of
+    TemplateFile.createFilesFor.
+
+    :param chunk: list of points
+    :returns: list of slha file names (or of tuples of name and content,
+              if we write straight into a tarball), and the coordDicts
+    """
+    tempf = _shared["template"]
+    kwargs = _shared["kwargs"]
+    ret = []
+    for pt in chunk:
+        slhafile = tempf.createFileFor ( pt, computeXsecs=False,
+                massesInFileName=kwargs["massesInFileName"],
+                swapBranches=kwargs["swapBranches"] )
+        if not slhafile:
+            continue
+        if kwargs["reference_xsecs"]:
+            tempf.addReferenceXSecs ( slhafile, kwargs["sqrts"],
+                    kwargs["ignore_pids"], kwargs["comment"], False )
+        if kwargs["inMemory"]:
+            with open ( slhafile, "rt" ) as f:
+                content = f.read()
+            os.unlink ( slhafile )
+            if kwargs["reference_xsecs"] and not tempf.keep and \
+                    not "XSECTION" in content:
+                complaints["removingSLHAFile"]+=1
+                if complaints["removingSLHAFile"]<3:
+                    print ( f"[slhaCreator] dropping {os.path.basename(slhafile)}: has no cross sections (use --keep if you want to keep them)" )
+                continue
+            ret.append ( ( os.path.basename ( slhafile ), content ) )
+        else:
+            ret.append ( slhafile )
+    return ret, getattr ( tempf, "coordDicts", None )
+
 class TemplateFile(object):
     """
     Holds the information for a given template file as well as convenient methods
@@ -100,6 +186,7 @@ class TemplateFile(object):
         self.motherPDGs = []
         self.pythiaCard = None
         self.pythiaVersion = pythiaVersion
+        self.compiled = None
         if tempdir:
             self.tempdir = tempdir
         else:
@@ -134,8 +221,11 @@ class TemplateFile(object):
 
         if self.motherPDGs:
             print ( f"[slhaCreator] setting things up with the following potential mother pids: {' '.join(map(str,self.motherPDGs))}" )
+            ## the card goes to the system temp dir, not to the current dir
+            fd, card = tempfile.mkstemp ( prefix="pythia_", suffix=".card" )
+            os.close ( fd )
             self.pythiaCard = getPythiaCardFor( self.motherPDGs,
-                pythiaVersion=pythiaVersion )
+                filename = card, pythiaVersion=pythiaVersion )
             if not self.keep:
                 __tempfiles__.add ( self.pythiaCard )
         #Define original plot
@@ -241,12 +331,9 @@ class TemplateFile(object):
             logger.info( f"Labels do not match the ones defined in {self.path}. keys={set(massDict.keys())}. tags={set(self.tags)} (might mean only that we dont use these labels)." )
             # sys.exit()
         #Replace the axes labels by their mass values:
-        ftemplate = open(self.path,'r')
-        fdata = ftemplate.read()
-        ftemplate.close()
-        for tag in massDict:
-            fdata = fdata.replace(f"{tag}-5",str(massDict[tag]-5))
-            fdata = fdata.replace(tag,str(massDict[tag]))
+        if self.compiled is None or self.compiled.tags != set ( massDict ):
+            self.compiled = CompiledTemplate ( self.path, massDict.keys() )
+        fdata = self.compiled.render ( massDict )
 
         self.coordDicts = { "masses": [], "widths": None }
         #Create SLHA filename (if not defined)
@@ -280,8 +367,6 @@ class TemplateFile(object):
                 slhaname += ".slha"
                 slhaname = os.path.join(self.tempdir,slhaname)
 
-        fdata = fdata[:fdata.find('XSECTION')]
-
         #Save file
         fslha = open(slhaname,'w')
         fslha.write(fdata)
@@ -291,10 +376,29 @@ class TemplateFile(object):
 
         return slhaname
 
+    def addReferenceXSecs ( self, slhafile, sqrts, ignore_pids = None,
+                            comment : Union[None,str] = None,
+                            first : bool = False ):
+        """ add the reference cross sections to slhafile
+        :param sqrts: sqrtses (list)
+        :param first: if true, refxsecComputer will be verbose about its tables
+        """
+        from smodels_utils.morexsecs.refxsecComputer import RefXSecComputer
+        computer = RefXSecComputer( self.verbose, first )
+        c = f"produced via slhaCreator v{self.version}"
+        if comment != None:
+            c+= f": {comment}"
+        if self.ewk != "wino":
+            c+= f" [{self.ewk}]"
+        computer.computeForOneFile ( sqrts[0], slhafile, True, \
+                  comment = c, ignore_pids = ignore_pids,
+                  ewk = self.ewk )
+
     def createFilesFor( self, pts, massesInFileName=False, computeXsecs=False,
                         nevents = 10000, sqrts = None, reference_xsecs=False,
                         swapBranches = False, ignore_pids = None, 
-                        comment : Union[None,str] = None ):
+                        comment : Union[None,str] = None,
+                        nworkers : int = 1, tarball : Union[None,str] = None ):
         """
         Creates new SLHA files from the template for the respective (x,y) values
         in pts.
@@ -307,33 +411,79 @@ class TemplateFile(object):
         :param swapBranches: if true, swap branches in filenames
         :param ignore_pids: if not None, pids to ignore when computing xsecs (Works currently only with ref xsecs)
         :param comment: comment to be added to all files
+        :param nworkers: number of forked worker processes that write the files
+        :param tarball: if not None, collect the files straight in this
+                        tarball instead of tempdir, together with the
+                        recipe in tempdir and the coordinates (which also
+                        get written out, see writeOutCoordinates), keeping
+                        the other entries of an existing tarball. Only with
+                        reference_xsecs or without cross sections.
         :return: list of SLHA file names generated.
         """
 
         if sqrts == None:
            sqrts = [[8,13]]
+        if tarball is not None and computeXsecs:
+            logger.error ( "cannot write straight into tarball when computing xsecs with pythia" )
+            sys.exit()
 
+        t0 = time.time()
+        inMemory = tarball is not None
+        if nworkers > 1 and len(pts) > 1 and reference_xsecs:
+            ## let refxsecComputer tell us about its tables once
+            ## in the parent, not in every worker
+            from smodels_utils.morexsecs.refxsecComputer import RefXSecComputer
+            RefXSecComputer( self.verbose, True )
+        _shared.update ( { "template": self, "kwargs": {
+            "massesInFileName": massesInFileName, "swapBranches": swapBranches,
+            "reference_xsecs": reference_xsecs, "sqrts": sqrts,
+            "ignore_pids": ignore_pids, "comment": comment,
+            "inMemory": inMemory } } )
+        nworkers = max ( 1, min ( nworkers, len(pts) ) )
+        chunksize = max ( 1, min ( 100, len(pts) // ( 4 * nworkers ) ) )
+        chunks = [ pts[i:i+chunksize] for i in range(0,len(pts),chunksize) ]
+        pool = contextlib.nullcontext()
+        if nworkers > 1:
+            import multiprocessing
+            pool = multiprocessing.get_context ( "fork" ).Pool ( nworkers )
         slhafiles = []
-        first = True
-        for pt in pts:
-            slhafile = self.createFileFor( pt, computeXsecs=False,
-                     massesInFileName=massesInFileName, nevents=nevents, sqrts=sqrts,
-                     swapBranches = swapBranches, ignore_pids = ignore_pids )
-            if slhafile:
-                slhafiles.append(slhafile)
-
-            if reference_xsecs:
-                from smodels_utils.morexsecs.refxsecComputer import RefXSecComputer
-                computer = RefXSecComputer( self.verbose, first )
-                c = f"produced via slhaCreator v{self.version}"
-                if comment != None:
-                    c+= f": {comment}"
-                if self.ewk != "wino":
-                    c+= f" [{self.ewk}]"
-                computer.computeForOneFile ( sqrts[0], slhafile, True, \
-                          comment = c, ignore_pids = ignore_pids,
-                          ewk = self.ewk )
-                first = False
+        tar, previous = None, set()
+        if inMemory:
+            tar, previous = self.openTarball ( tarball )
+        try:
+            with pool:
+                results = map ( createFilesForChunk, chunks )
+                if nworkers > 1:
+                    results = pool.imap ( createFilesForChunk, chunks )
+                for files, coordDicts in results:
+                    if coordDicts is not None:
+                        self.coordDicts = coordDicts
+                    if inMemory:
+                        for name,content in files:
+                            self.addToTarball ( tar, name, content )
+                            previous.discard ( name )
+                            slhafiles.append ( name )
+                    else:
+                        slhafiles += files
+            if inMemory:
+                ## coordinates and recipe go into the tarball, too
+                self.writeOutCoordinates ( self.tempdir )
+                for name in [ "coordinates", "recipe" ]:
+                    fname = f"{self.tempdir}/{name}"
+                    if not os.path.exists ( fname ):
+                        continue
+                    with open ( fname, "rt" ) as f:
+                        self.addToTarball ( tar, name, f.read() )
+                    previous.discard ( name )
+        except BaseException as e:
+            if inMemory: ## dont leave a half-written tarball behind
+                tar.close()
+                os.unlink ( f"{tarball}.new" )
+            raise
+        if inMemory:
+            self.closeTarball ( tar, tarball, previous )
+        dt = time.time() - t0
+        print ( f"[slhaCreator] wrote {len(slhafiles)} files with {nworkers} workers in {dt:.1f}s ({len(slhafiles)/max(dt,1e-9):.1f} files/s)" )
 
         # print ( f"[slhaCreator] now calling xseccomputer {computeXsecs} {self.pythiaVersion}" )
         #Compute cross-sections
@@ -375,6 +525,42 @@ class TemplateFile(object):
                 xsecComputer.main(xargs)
         return slhafiles
 
+    def openTarball ( self, tarball : str ):
+        """ open a new tarball for writing, next to an existing one,
+        whose entries get carried over when closing.
+        :returns: the open tarfile, and the names of the entries of the
+                  existing tarball
+        """
+        import tarfile
+        previous = set()
+        if os.path.exists ( tarball ):
+            with tarfile.open ( tarball, "r:gz" ) as old:
+                previous = set ( old.getnames() )
+        tar = tarfile.open ( f"{tarball}.new", "w:gz" )
+        return tar, previous
+
+    def addToTarball ( self, tar, name : str, content : str ):
+        """ add a file with name and content to the open tarfile """
+        import tarfile, io
+        data = content.encode()
+        info = tarfile.TarInfo ( name )
+        info.size = len(data)
+        info.mtime = time.time()
+        info.mode = 0o644
+        tar.addfile ( info, io.BytesIO ( data ) )
+
+    def closeTarball ( self, tar, tarball : str, previous : set ):
+        """ carry over the entries in previous from the existing tarball,
+        then replace the existing tarball with the new one """
+        import tarfile
+        if len(previous)>0:
+            with tarfile.open ( tarball, "r:gz" ) as old:
+                for member in old.getmembers():
+                    if member.name in previous and member.isfile():
+                        tar.addfile ( member, old.extractfile ( member ) )
+        tar.close()
+        os.replace ( f"{tarball}.new", tarball )
+
     def addToRecipe ( self, directory, command ):
         """ add our current command to the recipe file """
         # print ( f"adding to recipe {directory}" )
@@ -587,6 +773,10 @@ if __name__ == "__main__":
         help="add pids to list of candidate mother pids, e.g. '[1000022]'.")
     argparser.add_argument('--swapBranches', action='store_true',
         help="switch the order of the branches in the slha file name")
+    argparser.add_argument ( '-j', '--nworkers', help='number of worker processes that write the slha files [1]',
+        type=int, default=1 )
+    argparser.add_argument('--direct', action='store_true',
+        help="add the slha files straight to the tarball, without unpacking and repacking it. each file is still briefly written to the temp dir, to add the cross sections. requires -r")
     argparser.add_argument('-6', '--pythia6', action='store_true',
         help="use pythia6 for LO cross sections")
     argparser.add_argument('-8', '--pythia8', action='store_true',
@@ -638,11 +828,32 @@ if __name__ == "__main__":
     sqrts = args.sqrts
     if sqrts == None:
         sqrts = [ 8, 13 ]
+    argvs = sys.argv
+    for i,a in enumerate(argvs):
+        if "(" in a or "[" in a:
+            argvs[i]=f'"{a}"'
+    if args.direct:
+        if not args.reference_xsecs:
+            logger.error ( "--direct works only with reference cross sections (-r)" )
+            sys.exit()
+        if os.path.exists ( tarball ):
+            subprocess.getoutput ( f"cp {tarball} prev.{tarball}" )
+            subprocess.getoutput ( f"cd {tempf.tempdir}; tar xzf ../{tarball} recipe" )
+        tempf.addToRecipe ( tempf.tempdir, " ".join ( argvs ) )
+        slhafiles = tempf.createFilesFor( masses, massesInFileName=True,
+                   sqrts = [ sqrts ], reference_xsecs = True,
+                   swapBranches = args.swapBranches, ignore_pids = args.ignore_pids,
+                   comment = args.comment, nworkers = args.nworkers,
+                   tarball = tarball )
+        print ( f"[slhaCreator] New tarball {tarball}" )
+        if not args.keep:
+            removeTempFiles()
+        sys.exit()
     slhafiles = tempf.createFilesFor( masses, computeXsecs = args.pythia6 or args.pythia8,
                    massesInFileName=True, nevents=args.nevents,
                    sqrts = [ sqrts ], reference_xsecs = args.reference_xsecs,
                    swapBranches = args.swapBranches, ignore_pids = args.ignore_pids, 
-                   comment = args.comment )
+                   comment = args.comment, nworkers = args.nworkers )
     print ( f"[slhaCreator] Produced {len(slhafiles)} slha files" )
     # newtemp = tempfile.mkdtemp(dir="./" ) # FIXME now idea what that was for
     newtemp = tempf.tempdir # FIXME anyways this does it correctly it seems
@@ -659,10 +870,6 @@ if __name__ == "__main__":
     cmd = "cp {tempf.tempdir}/{args.topology}*.slha {tempf.tempdir}/recipe {tempf.tempdir}/coordinates {newtemp}"
     # print ( "cmd", cmd )
     subprocess.getoutput ( cmd )
-    argvs = sys.argv
-    for i,a in enumerate(argvs):
-        if "(" in a or "[" in a:
-            argvs[i]=f'"{a}"'
     tempf.addToRecipe ( newtemp, " ".join ( argvs ) )
     tempf.writeOutCoordinates ( newtemp )
     from slhaHelpers import hasXSecs
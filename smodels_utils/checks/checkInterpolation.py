@@ -10,6 +10,8 @@ home = os.path.expanduser("~")
 sys.path.append(os.path.join(home,'smodels'))
 
 from smodels.experiment.databaseObj import Database
+from smodels.experiment.txnameDataObj import TxNameData
+from smodels_utils.helper.txnameGrid import getGrid, gridTag
 from smodels.base.physicsUnits import GeV, fb, TeV, pb
 import random
 from ROOT import TCanvas, TGraph2D, TLatex, gPad, gStyle, TH1F
@@ -59,10 +61,12 @@ def createPlot(pts,silentMode=False):
     #Loop over events and get points
     for pt in pts:
         #Get plotting variables  
-        xval = pt[0][0][0].asNumber(GeV)
-        yval = pt[0][0][-1].asNumber(GeV)
+        #the masses are flat: the first one of the first branch, and the last
+        #one of the first branch (for two branches of the same length)
+        xval = pt[0][0]
+        yval = pt[0][len(pt[0])//2-1]
         zval = abs(pt[1]-pt[2])/pt[1]
-        if zval.asNumber() == 0.:
+        if zval == 0.:
             grOld.SetPoint(grOld.GetN(),xval,yval,zval)
         else:
             gr.SetPoint(gr.GetN(),xval,yval,zval)
@@ -113,28 +117,32 @@ def createPlot(pts,silentMode=False):
     return plane
 
 
-def rmvPoints(txnameData):
+def rmvPoints(txname):
     """
-    Remove points from a TxnameData object and returns the points.
-    :param txnameData: TxNameData object
-    :return: list of points [[mass1,val1],[mass2,val2]...]
+    Remove points from the data grid of a TxName object and returns the points.
+    The original points are read from the txname.txt file.
+    :param txname: TxName object
+    :return: lists of removed and kept points, [[mass1,val1],[mass2,val2]...],
+             the masses as flat and unitless lists, the values without units
     """
     
     random.seed(10.)
-    #Make sure data is loaded
-    txnameData.loadData()
+    grid = getGrid(txname.path, gridTag(txname.dataType))
+    #Convert to the flat unitless points of the TxNameData
+    x, y = txname.transformData([grid.point(i,withUnits=True) for i in range(len(grid))])
     pts = []
     maxN = 20
-    reducedData = txnameData.data[:]
-    while len(pts) < len(txnameData.data)/4. and len(pts) < maxN:
+    reducedData = [[list(xpt),ypt] for xpt,ypt in zip(x,y)]
+    while len(pts) < len(grid)/4. and len(pts) < maxN:
         ipt = random.randint(0,len(reducedData)-1)
         pts.append(reducedData.pop(ipt))
             
     #Reload the reduced data grid:
-    txnameData.store_value = reducedData
-    txnameData.loadData()
+    txname.txnameData = TxNameData(x=[pt[0] for pt in reducedData],
+                                   y=[pt[1] for pt in reducedData],
+                                   txdataId=txname.txnameData._id)
             
-    return pts
+    return pts, reducedData
 
 def checkInterpolationFor(expIds = ['all'], txnames=['all'], datasetIDs = ['all']):
     """
@@ -156,9 +164,11 @@ def checkInterpolationFor(expIds = ['all'], txnames=['all'], datasetIDs = ['all'
     
     #Loop over each grid and generate a reduced grid partially removing
     #the original points
-    removedPts = []
+    removedPts, keptPts = [], []
     for txname in txnames:
-        removedPts.append(rmvPoints(txname.txnameData))
+        removed, kept = rmvPoints(txname)
+        removedPts.append(removed)
+        keptPts.append(kept)
         
     #Now interpolate for the removed points
     maxErrors = [0.]*len(txnames)
@@ -167,14 +177,12 @@ def checkInterpolationFor(expIds = ['all'], txnames=['all'], datasetIDs = ['all'
         txnameErrors[txname.path] = []
         for pt in removedPts[itx]:            
             val = txname.txnameData.getValueFor(pt[0])
-            if type(pt[1]) == type(fb): pt[1] = pt[1].asNumber(fb)
             if pt[1] == 0. or val is None: continue
-            elif type(val) == type(fb): val = val.asNumber(fb)
             maxErrors[itx] = max(maxErrors[itx],abs(val-pt[1])/pt[1])
             newpt = pt
             newpt.append(val)
             txnameErrors[txname.path].append(newpt)
-        for pt in txname.txnameData.data:
+        for pt in keptPts[itx]:
             newpt = pt
             newpt.append(pt[1])
             txnameErrors[txname.path].append(newpt)
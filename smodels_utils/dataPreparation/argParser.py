@@ -20,6 +20,12 @@ def getParserArgs():
     argparser.add_argument ('-r', '--resetValidation',
         help = 'reset the validation flag',\
         action= "store_true" )
+    argparser.add_argument ('-nc', '--noInputCache',
+        help = 'do not use the persistent cache of the input data points.',\
+        action= "store_true" )
+    argparser.add_argument ('-mb', '--maxBins',
+        help = 'trim maps with more entries than this, 0 is full resolution. default: 12000, but no trimming of uproot histograms.',\
+        type = int, default = None )
 
     args = argparser.parse_args()
 
@@ -29,6 +35,12 @@ def getParserArgs():
     if args.resetValidation:
         os.environ["SMODELS_RESETVALIDATION"]="1"
 
+    if args.noInputCache:
+        os.environ["SMODELS_NOINPUTCACHE"]="1"
+
+    if args.maxBins is not None:
+        os.environ["SMODELS_MAXNBINS"]=str(args.maxBins)
+
     if args.utilsPath:
         utilsPath = args.utilsPath
     else:
@@ -17,6 +17,8 @@ sys.path.append('/home/lessa/smodels-utils')
 sys.path.append('/home/lessa/smodels')
 from smodels.base.physicsUnits import fb,pb,GeV,TeV
 from smodels_utils.dataPreparation.databaseCreation import removeRepeated
+from smodels_utils.helper.txnameGrid import TxnameGrid, parseGrid, valueUnits
+import numpy as np
 import logging
 FORMAT = '%(levelname)s in %(module)s.%(funcName)s() in %(lineno)s: %(message)s'
 logging.basicConfig(format=FORMAT)
@@ -25,6 +27,7 @@ logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.ERROR)
 
 databasePath = '/home/lessa/smodels-database'
+dataFields = ['upperLimits','expectedUpperLimits','efficiencyMap']
 
 def compareLines(new,old,ignore=['#']):
     """
@@ -104,6 +107,33 @@ def checkValue(value,oldValue,reps):
     return True
 
 
+def checkGrid(grid,oldGrid,reps):
+    """
+    Compare two data grids (TxnameGrid objects), with the same
+    relative difference as checkValue, for masses and values.
+
+    :return: True/False
+    """
+
+    if grid.layout != oldGrid.layout or len(grid) != len(oldGrid):
+        logger.error(f'New grid = {grid} \nOld grid = {oldGrid}')
+        return False
+    if (grid.valueUnit is None) != (oldGrid.valueUnit is None):
+        logger.error(f'New unit = {grid.valueUnit} \nOld unit = {oldGrid.valueUnit}')
+        return False
+    factor = valueUnits.get(grid.valueUnit,1.)
+    oldFactor = valueUnits.get(oldGrid.valueUnit,1.)
+    for new,old in [(grid.masses,oldGrid.masses),
+                    (grid.values*factor,oldGrid.values*oldFactor)]:
+        differ = np.abs(new-old) > reps*np.abs(new+old)
+        if differ.any():
+            i = np.argwhere(differ)[0][0]
+            logger.error(f'New point = {grid.point(i)} \nOld point = {oldGrid.point(i)}')
+            return False
+
+    return True
+
+
 def compareFields(new,old,ignoreFields=['susyProcess'],skipFields=[],reps=0.01):
     """
     Compare the fields and their values
@@ -144,6 +174,13 @@ def compareFields(new,old,ignoreFields=['susyProcess'],skipFields=[],reps=0.01):
             else:
                 fields[lastField] += l.strip()
         for key,value in fields.items():
+            if key in dataFields:
+                #Tokenize the data grids, evaluating them is slow
+                try:
+                    fields[key] = parseGrid(value,key)
+                    continue
+                except ValueError:
+                    pass
             try:
                 fields[key] = eval(value,{'fb' : fb, 
                                           'GeV' : GeV, 
@@ -173,7 +210,12 @@ def compareFields(new,old,ignoreFields=['susyProcess'],skipFields=[],reps=0.01):
         oldValue = oldFields[key]
         if key in skipFields:
             continue
-        if key == 'upperLimits' or key == 'expectedUpperLimits' or key == 'efficiencyMap':
+        if isinstance(value,TxnameGrid) and isinstance(oldValue,TxnameGrid):
+            if not checkGrid(value, oldValue.unique(), reps):
+                logger.error(f"Field {key} value differ in {new}")
+                return False
+            continue
+        if key in dataFields:
             oldValue  = removeRepeated(oldValue)
         if not checkValue(value, oldValue, reps):
             logger.error(f"Field {key} value differ in {new}:\n old = {str(oldValue)[:80]} ...\n new = {str(value)[:80]} ...")
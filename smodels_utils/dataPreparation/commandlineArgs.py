@@ -18,6 +18,10 @@ def setEnv ( args ):
         os.environ["SMODELS_NOUPDATE"]="1"
     if hasattr ( args, "resetValidation" ) and args.resetValidation==True:
         os.environ["SMODELS_RESETVALIDATION"]="1"
+    if hasattr ( args, "noInputCache" ) and args.noInputCache==True:
+        os.environ["SMODELS_NOINPUTCACHE"]="1"
+    if hasattr ( args, "maxBins" ) and args.maxBins is not None:
+        os.environ["SMODELS_MAXNBINS"]=str(args.maxBins)
     from smodels.base.smodelsLogging import setLogLevel
     if hasattr ( args, "verbose" ):
         setLogLevel ( args.verbose )
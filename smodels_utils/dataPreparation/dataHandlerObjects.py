@@ -17,7 +17,8 @@ import os
 import logging
 import math
 import numpy as np
-from typing import List, Generator
+from typing import List, Generator, Union
+from smodels_utils.dataPreparation import inputCache
 
 FORMAT = '%(levelname)s in %(module)s.%(funcName)s() in %(lineno)s: %(message)s'
 logging.basicConfig(format=FORMAT)
@@ -49,11 +50,19 @@ def _Hash ( lst ): ## simple hash function for our masses
 # maximum number of entries before we trim
 # (given that allowTrimming is true, see below)
 max_nbins = 12000
+## the same for uproot histograms. they are read as whole arrays
+## (see DataHandler._upRootHistoArray), so by default we do not trim them.
+## None means no limit. see also DataHandler.maxBins
+max_nbins_uproot = None
 allowTrimming=True ## allow big grids to be trimmed down
 trimmingFactor = [ None ] ## the factor by which to trim, if none then determine automatically
 
 fileCache  = {} ## a file cache for input files, to speed things up
+## the points of ttrees, per tree a dictionary with search bins as keys
+## and arrays of [ x, (y,) eff ] as values
 pointsCache = {}
+persistTreeCache = False ## also keep all points of a ttree in the inputCache directory
+useInputCache = True ## keep the extracted points in the persistent inputCache
 
 class DataHandler(object):
 
@@ -205,7 +214,7 @@ class DataHandler(object):
         if not hasattr ( self, self.fileType ):
             logger.error ( f"Format type '{self.fileType}' is not defined. Try either one of 'root', 'csv', 'txt', 'embaked', 'mscv', 'effi', 'cMacro', 'canvas', 'svg', 'pdf', 'direct' instead. " )
             sys.exit(-1)
-        for point in getattr(self,self.fileType)():
+        for point in self.readPoints():
             ptDict = self.mapPoint(point) #Convert point to dictionary
             if self.allowNegativeValues:
                 self.data.append(ptDict)
@@ -216,6 +225,29 @@ class DataHandler(object):
                 if self._positiveValues(values, strictlyPositive = strictlyPositive ):
                     self.data.append(ptDict)
 
+    def readPoints(self) -> List:
+        """
+        Read the points from the source, via the persistent input cache
+        (see inputCache), if useInputCache is true. The trimming factor
+        the reader sets is restored on a cache hit.
+
+        :returns: list of points, as yielded by the method of the file type
+        """
+        reader = getattr(self,self.fileType)
+        key = None
+        if useInputCache and inputCache.isEnabled():
+            key = inputCache.keyFor ( self )
+        if key is None:
+            return list ( reader() )
+        entry = inputCache.load ( key )
+        if entry is not None:
+            points, trimmingFactor[0] = entry
+            logger.debug ( f"got {len(points)} points for {self.path} from input cache" )
+            return points
+        points = list ( reader() )
+        inputCache.store ( key, points, trimmingFactor[0] )
+        return points
+
     def __nonzero__(self):
 
         """
@@ -436,6 +468,29 @@ class DataHandler(object):
         if scale:
             self.reweightBy(scale)
 
+    def maxBins ( self, uproot : bool = False ) -> float:
+        """ the number of entries above which we trim (given that
+        allowTrimming is true). a maxBins argument of the source (see
+        setSource) comes first, then the environment variable
+        SMODELS_MAXNBINS (convert.py --maxBins), then max_nbins, or
+        max_nbins_uproot for uproot histograms. None or 0 mean no limit.
+
+        :param uproot: the limit for an uproot histogram
+        :returns: the limit, inf if there is none
+        """
+        args = getattr ( self, "args", {} )
+        if "maxBins" in args:
+            ret = args["maxBins"]
+        elif os.environ.get ( "SMODELS_MAXNBINS", "" ) != "":
+            ret = int ( os.environ["SMODELS_MAXNBINS"] )
+        elif uproot:
+            ret = max_nbins_uproot
+        else:
+            ret = max_nbins
+        if not ret:
+            return float("inf")
+        return ret
+
     @property
     def massUnit(self):
 
@@ -527,8 +582,9 @@ class DataHandler(object):
         xcoord, ycoord = self.coordinateMap[x], self.coordinateMap[y]
         ## FIXME should we ever sort here?
         # lines.sort( key= lambda x: x[xcoord]*1e6+x[ycoord] )
-        if len(lines) > max_nbins and trimmingFactor[0] == None:
-            trimmingFactor[0] = int ( round ( math.sqrt ( len(lines) / 6000. ) ) )
+        maxBins = self.maxBins()
+        if len(lines) > maxBins and trimmingFactor[0] == None:
+            trimmingFactor[0] = int ( round ( math.sqrt ( len(lines) / ( maxBins / 2. ) ) ) )
             trimmingFactor[0] = trimmingFactor[0]**2
             newyields = []
             for cty,y in enumerate ( lines ):
@@ -701,8 +757,9 @@ class DataHandler(object):
                         fr[1]=frx
                 yields.append ( fr )
             csvfile.close()
-            if len(yields) > max_nbins and trimmingFactor[0] == None:
-                trimmingFactor[0] = int ( round ( math.sqrt ( len(yields) / 6000. ) ) )
+            maxBins = self.maxBins()
+            if len(yields) > maxBins and trimmingFactor[0] == None:
+                trimmingFactor[0] = int ( round ( math.sqrt ( len(yields) / ( maxBins / 2. ) ) ) )
                 trimmingFactor[0] = trimmingFactor[0]**2
                 newyields = []
                 for cty,y in enumerate ( yields ):
@@ -1165,6 +1222,7 @@ class DataHandler(object):
         if not self.dimensions+1 == len ( hist.axes ):
             logger.error( f"Data dimensions ({self.dimensions}) and histogram dimensions ({hist.name}:{len (hist.axes) }) do not match {self.path}" )
 
+        maxBins = self.maxBins ( uproot = True )
         xAxis = hist.axes[0] # make sure this is the x axis
         assert ( xAxis.tojson()["fName"] == "xaxis" )
         xRange = range(len(xAxis))
@@ -1176,15 +1234,15 @@ class DataHandler(object):
             yRange = range(len(yAxis))
             n_bins=n_bins * len(yRange )
             total_points = len(yRange)*len(xRange)
-            if total_points > 6000. and trimmingFactor[0]==None:
-                trimmingFactor[0] = int ( round ( math.sqrt ( total_points / 6000. ) ) )
+            if total_points > maxBins / 2. and trimmingFactor[0]==None:
+                trimmingFactor[0] = int ( round ( math.sqrt ( total_points / ( maxBins / 2. ) ) ) )
                 logger.info ( f"total points is {total_points}. set trimmingFactor to {trimmingFactor[0]}" )
         if len(hist.axes) > 2:
             zAxis = hist.axes[2]
             assert ( zAxis.tojson()["fName"] == "zaxis" )
             zRange = range(len(zAxis))
             n_bins=n_bins * len(zRange )
-            if n_bins > max_nbins:
+            if n_bins > maxBins:
                 if len(zRange)>50:
                     if allowTrimming:
                         if not errorcounts["trimzaxis"]:
@@ -1198,13 +1256,13 @@ class DataHandler(object):
                         if not errorcounts["trimzaxis"]:
                             errorcounts["trimzaxis"]=True
                             logger.warning ( f"Very large map (nbins in z is {int(n_bins)}), but trimming turned off." )
-        if self.dimensions > 1 and n_bins > max_nbins:
+        if self.dimensions > 1 and n_bins > maxBins:
             if len(yRange)>50:
                 if allowTrimming:
                     yRange = range(0,len(yAxis), trimmingFactor[0] )
                     # yRange = range(1,len(yAxis) + 1, trimmingFactor[0] )
                     if not errorcounts["trimyaxis"]:
-                        logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {max_nbins}). Will trim y-axis from {len(yAxis)} to {len(yRange)} (turn this off via dataHandlerObjects.allowTrimming)." )
+                        logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {maxBins}). Will trim y-axis from {len(yAxis)} to {len(yRange)} (turn this off via dataHandlerObjects.allowTrimming)." )
                         errorcounts["trimyaxis"]=True
                     n_bins = n_bins / len(yAxis)
                     n_bins = n_bins * len(yRange)
@@ -1212,12 +1270,12 @@ class DataHandler(object):
                     if not errorcounts["trimyaxis"]:
                         errorcounts["trimyaxis"]=True
                         logger.warning ( f"Very large map (nbins in y is {int(n_bins)}), but trimming turned off." )
-        if n_bins > max_nbins:
+        if n_bins > maxBins:
             if allowTrimming:
                 xRange = range(0,len(xAxis), trimmingFactor[0] )
                 if not errorcounts["trimxaxis"]:
                     errorcounts["trimxaxis"]=True
-                    logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {max_nbins}). Will trim x-axis from {len(xAxis)} to {len(xRange)} (turn this off via dataHandlerObjects.allowTrimming)" )
+                    logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {maxBins}). Will trim x-axis from {len(xAxis)} to {len(xRange)} (turn this off via dataHandlerObjects.allowTrimming)" )
                 n_bins = n_bins / len(xAxis)
                 n_bins = n_bins * len(xRange)
 
@@ -1229,30 +1287,11 @@ class DataHandler(object):
         if False: # total_points > n_bins:
             logger.warning ( f"n_bins={n_bins}, total_points={total_points}, n_dims={self.dimensions}, xRange={list(xRange)[:4]} yRange={list(yRange)[:4]} {self.name}" )
 
-        ct = 0
-        # self.interact ( hist )
-        for xBin in xRange:
-            x = xAxis.centers()[xBin]
-            if self.dimensions == 1:
-                ul = hist.values()[xBin]
-                if ul == 0.: continue
-                yield [x, ul]
-            elif self.dimensions > 1:
-                for yBin in yRange:
-                    y = yAxis.centers()[yBin]
-                    ul = hist.values()[xBin][yBin]
-                    if type(ul) in [ float, np.float32, np.float64 ]:
-                        if ul == 0.: continue
-                        ct+=1
-                        yield [x, y, ul]
-                    else:
-                        zRange = range(len(zAxis) ) # , trimmingFactor[0] )
-                        for zBin in zRange:
-                            z = zAxis.centers()[zBin]
-                            ul = hist.values()[xBin][yBin][zBin]
-                            #if ul == 0.: continue
-                            if zBin == index:
-                                yield [x, y, ul]
+        ranges = [ xRange ]
+        if self.dimensions > 1:
+            ranges.append ( yRange )
+        for point in self._upRootHistoArray ( hist, ranges, index ):
+            yield list ( point )
 
     def _getUpRootHistoPoints(self,hist):
 
@@ -1271,6 +1310,7 @@ class DataHandler(object):
         if not self.dimensions == len ( hist.axes ):
             logger.error( f"Data dimensions ({self.dimensions}) and histogram dimensions ({hist.name}:{len (hist.axes) }) do not match {self.path}" )
 
+        maxBins = self.maxBins ( uproot = True )
         xAxis = hist.axes[0] # make sure this is the x axis
         assert ( xAxis.tojson()["fName"] == "xaxis" )
         xRange = range(len(xAxis))
@@ -1282,15 +1322,15 @@ class DataHandler(object):
             yRange = range(len(yAxis))
             n_bins=n_bins * len(yRange )
             total_points = len(yRange)*len(xRange)
-            if total_points > 6000. and trimmingFactor[0] == None:
-                trimmingFactor[0] = int ( round ( math.sqrt ( total_points / 6000. ) ) )
+            if total_points > maxBins / 2. and trimmingFactor[0] == None:
+                trimmingFactor[0] = int ( round ( math.sqrt ( total_points / ( maxBins / 2. ) ) ) )
                 logger.info ( f"total points is {total_points}. set trimmingFactor to {trimmingFactor[0]}" )
         if self.dimensions > 2:
             zAxis = hist.axes[2]
             assert ( zAxis.tojson()["fName"] == "zaxis" )
             zRange = range(len(zAxis))
             n_bins=n_bins * len(zRange )
-            if len ( n_bins ) > max_nbins:
+            if n_bins > maxBins:
                 if len(zRange)>50:
                     if allowTrimming:
                         if not errorcounts["trimzaxis"]:
@@ -1304,13 +1344,13 @@ class DataHandler(object):
                         if not errorcounts["trimzaxis"]:
                             errorcounts["trimzaxis"]=True
                             logger.warning ( f"Very large map (nbins in z is {int(n_bins)}), but trimming turned off." )
-        if self.dimensions > 1 and n_bins > max_nbins:
+        if self.dimensions > 1 and n_bins > maxBins:
             if len(yRange)>50:
                 if allowTrimming:
                     yRange = range(0,len(yAxis), trimmingFactor[0] )
                     # yRange = range(1,len(yAxis) + 1, trimmingFactor[0] )
                     if not errorcounts["trimyaxis"]:
-                        logger.warning ( f"'{self.name}' for {self.txName} is too large a map: (nbins={n_bins} > {max_nbins}). Will trim y-axis from {len(yAxis)} to {len(yRange)} (turn this off via dataHandlerObjects.allowTrimming)." )
+                        logger.warning ( f"'{self.name}' for {self.txName} is too large a map: (nbins={n_bins} > {maxBins}). Will trim y-axis from {len(yAxis)} to {len(yRange)} (turn this off via dataHandlerObjects.allowTrimming)." )
                         errorcounts["trimyaxis"]=True
                     n_bins = n_bins / len(yAxis)
                     n_bins = n_bins * len(yRange)
@@ -1318,12 +1358,12 @@ class DataHandler(object):
                     if not errorcounts["trimyaxis"]:
                         errorcounts["trimyaxis"]=True
                         logger.warning ( f"Very large map (nbins in y is {int(n_bins)}), but trimming turned off." )
-        if n_bins > max_nbins:
+        if n_bins > maxBins:
             if allowTrimming:
                 xRange = range(0,len(xAxis),  trimmingFactor[0] )
                 if not errorcounts["trimxaxis"]:
                     errorcounts["trimxaxis"]=True
-                    logger.warning ( f"'{self.name}' for {self.txName} is too large a map: (nbins={int(n_bins)} > {max_nbins}). Will trim x-axis from {len(xAxis)} to {len(xRange)} (turn this off via dataHandlerObjects.allowTrimming)" )
+                    logger.warning ( f"'{self.name}' for {self.txName} is too large a map: (nbins={int(n_bins)} > {maxBins}). Will trim x-axis from {len(xAxis)} to {len(xRange)} (turn this off via dataHandlerObjects.allowTrimming)" )
                 n_bins = n_bins / len(xAxis)
                 n_bins = n_bins * len(xRange)
 
@@ -1335,30 +1375,41 @@ class DataHandler(object):
         if False: # total_points > n_bins:
             logger.warning ( f"n_bins={n_bins}, total_points={total_points}, n_dims={self.dimensions}, xRange={list(xRange)[:4]} yRange={list(yRange)[:4]} {self.name}" )
 
-        ct = 0
-        # self.interact ( hist )
-        for xBin in xRange:
-            x = xAxis.centers()[xBin]
-            if self.dimensions == 1:
-                ul = hist.values()[xBin]
-                if ul == 0.: continue
-                yield [x, ul]
-            elif self.dimensions > 1:
-                for yBin in yRange:
-                    y = yAxis.centers()[yBin]
-                    if self.dimensions == 2:
-                        ul = hist.values()[xBin][yBin]
-                        if ul == 0.: continue
-                        ct+=1
-                        #if ct % 300 == 0:
-                        #    print ( f"yield {ct}: {yBin}/{x},{y} {ul}" )
-                        yield [x, y, ul]
-                    elif self.dimensions == 3:
-                        for zBin in zRange:
-                            z = zAxis.centers()[zBin]
-                            ul = hist.values()[xBin][yBin][zBin]
-                            if ul == 0.: continue
-                            yield [x, y, z, ul]
+        ranges = [ xRange ]
+        if self.dimensions > 1:
+            ranges.append ( yRange )
+        if self.dimensions > 2:
+            ranges.append ( zRange )
+        for point in self._upRootHistoArray ( hist, ranges ):
+            yield list ( point )
+
+    def _upRootHistoArray ( self, hist, ranges : List, index = None ):
+        """
+        the bins of an uproot histogram as one array, with one row
+        per bin: [ x, y, ..., bin content ]. The bin contents and
+        the axis centers are retrieved only once. Empty bins are dropped.
+
+        :param ranges: the (possibly trimmed) ranges of the bins to use,
+                       one per axis
+        :param index: if the histogram has one more axis than ranges,
+                      use only the bins with this index in the last axis.
+                      In this case, empty bins are kept.
+        """
+        values = np.asarray ( hist.values() )
+        keepEmpty = False
+        if values.ndim > len(ranges):
+            values = values[...,index]
+            keepEmpty = True
+        indices = [ np.asarray ( r, dtype=int ) for r in ranges ]
+        values = values[np.ix_(*indices)]
+        centers = [ np.asarray ( hist.axes[i].centers() )[idx] \
+                    for i,idx in enumerate(indices) ]
+        columns = [ c.ravel() for c in np.meshgrid ( *centers, indexing="ij" ) ]
+        columns.append ( values.ravel() )
+        points = np.stack ( columns, axis=1 )
+        if not keepEmpty:
+            points = points[ points[:,-1] != 0. ]
+        return points
 
     def _getPyRootHistoPoints(self,hist):
 
@@ -1378,6 +1429,7 @@ class DataHandler(object):
         if not self.dimensions == hist.GetDimension():
             logger.error( f"Data dimensions ({self.dimensions}) and histogram dimensions ({hist.GetName()}:{hist.GetDimension()}) do not match {self.path}" )
 
+        maxBins = self.maxBins()
         xAxis = hist.GetXaxis()
         xRange = range(1,xAxis.GetNbins() + 1)
         n_bins = len(xRange)
@@ -1386,14 +1438,14 @@ class DataHandler(object):
             yRange = range(1,yAxis.GetNbins() + 1)
             n_bins=n_bins * len(yRange )
             total_points = len(yRange)*len(xRange)
-            if total_points > 6000.:
-                trimmingFactor[0] = int ( round ( math.sqrt ( total_points / 6000. ) ) )
+            if total_points > maxBins / 2.:
+                trimmingFactor[0] = int ( round ( math.sqrt ( total_points / ( maxBins / 2. ) ) ) )
                 logger.info ( f"total points is {total_points}. set trimmingFactor to {trimmingFactor[0]}" )
         if self.dimensions > 2:
             zAxis = hist.GetZaxis()
             zRange = range(1,zAxis.GetNbins() + 1)
             n_bins=n_bins * len(zRange )
-            if len ( n_bins ) > max_nbins:
+            if len ( n_bins ) > maxBins:
                 if len(zRange)>50:
                     if allowTrimming:
                         if not errorcounts["trimzaxis"]:
@@ -1406,12 +1458,12 @@ class DataHandler(object):
                         if not errorcounts["trimzaxis"]:
                             errorcounts["trimzaxis"]=True
                             logger.warning ( f"Very large map (nbins in z is {int(n_bins)}), but trimming turned off." )
-        if self.dimensions > 1 and n_bins > max_nbins:
+        if self.dimensions > 1 and n_bins > maxBins:
             if len(yRange)>50:
                 if allowTrimming:
                     yRange = range(1,yAxis.GetNbins() + 1, trimmingFactor[0] )
                     if not errorcounts["trimyaxis"]:
-                        logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {max_nbins}). Will trim y-axis from {yAxis.GetNbins()} to {len(yRange)} (turn this off via dataHandlerObjects.allowTrimming)." )
+                        logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {maxBins}). Will trim y-axis from {yAxis.GetNbins()} to {len(yRange)} (turn this off via dataHandlerObjects.allowTrimming)." )
                         errorcounts["trimyaxis"]=True
                     n_bins = n_bins / yAxis.GetNbins()
                     n_bins = n_bins * len(yRange)
@@ -1419,12 +1471,12 @@ class DataHandler(object):
                     if not errorcounts["trimyaxis"]:
                         errorcounts["trimyaxis"]=True
                         logger.warning ( f"Very large map (nbins in y is {int(n_bins)}), but trimming turned off." )
-        if n_bins > max_nbins:
+        if n_bins > maxBins:
             if allowTrimming:
                 xRange = range(1,xAxis.GetNbins() + 1,  trimmingFactor[0] )
                 if not errorcounts["trimxaxis"]:
                     errorcounts["trimxaxis"]=True
-                    logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {max_nbins}). Will trim x-axis from {xAxis.GetNbins()} to {len(xRange)} (turn this off via dataHandlerObjects.allowTrimming)" )
+                    logger.warning ( f"'{self.name}' is too large a map: (nbins={n_bins} > {maxBins}). Will trim x-axis from {xAxis.GetNbins()} to {len(xRange)} (turn this off via dataHandlerObjects.allowTrimming)" )
                 n_bins = n_bins / xAxis.GetNbins()
                 n_bins = n_bins * len(xRange)
 
@@ -1497,61 +1549,62 @@ class DataHandler(object):
         :param tree: Root tree object (TTree)
         :yield: ttree point
         """
-        if type(self.index) in [ tuple, list ]: ## for aggregation!
-            ys = []
-            for i in self.index:
-                idfier = f"{tree.file.file_path}:{tree.name}:{i}"
-                if not idfier in pointsCache:
-                    self._cacheUpRootTreePoints ( tree )
-                for y in pointsCache[idfier]:
-                    ys.append ( y )
-            ysDict = {}
-            for y in ys:
-                tmpy = y[:-1]
-                if not tmpy in ysDict:
-                    ysDict[tmpy]=0.
-                ysDict[tmpy]+=y[-1]
-            for k,v in ysDict.items():
-                t = ( *k, v )
-                yield t
+        bins = self._cacheUpRootTreePoints ( tree )
+        if type(self.index) in [ tuple, list, dict ]: ## for aggregation!
+            weights = self.index
+            if type(self.index) in [ tuple, list ]:
+                weights = { i: 1. for i in self.index }
+            points = []
+            for i,w in weights.items():
+                if not str(i) in bins:
+                    logger.error ( f"search bin {i} not found in {tree.name}" )
+                    continue
+                pts = bins[str(i)].copy()
+                pts[:,-1] *= w
+                points.append ( pts )
+            if len(points)==0:
+                return
+            points = np.concatenate ( points )
+            ## sum up the efficiencies of the same coordinates,
+            ## in the order of their first appearance
+            coords, first, inverse = np.unique ( points[:,:-1], axis=0,
+                    return_index=True, return_inverse=True )
+            inverse = inverse.reshape(-1)
+            sums = np.bincount ( inverse, weights = points[:,-1] )
+            for k in np.argsort ( first, kind="stable" ):
+                yield ( *coords[k].tolist(), float(sums[k]) )
             return
 
-        if type(self.index) in [ dict ]: ## for aggregation!
-            ys = []
-            # tot = sum ( self.index.values() )
-            for i,w in self.index.items():
-                idfier = f"{tree.file.file_path}:{tree.name}:{i}"
-                if not idfier in pointsCache:
-                    self._cacheUpRootTreePoints ( tree )
-                for y in pointsCache[idfier]:
-                    y = ( *y[:-1], y[-1]*w ) # /tot )
-                    # print ( "@@w", w, "y", y, "tot", tot )
-                    ys.append ( y )
-            ysDict = {}
-            for y in ys:
-                tmpy = y[:-1]
-                if not tmpy in ysDict:
-                    ysDict[tmpy]=0.
-                ysDict[tmpy]+=y[-1]
-            for k,v in ysDict.items():
-                t = ( *k, v )
-                yield t
+        if not str(self.index) in bins:
+            logger.error ( f"search bin {self.index} not found in {tree.name}" )
             return
+        for y in bins[str(self.index)]:
+            yield tuple ( y.tolist() )
 
-        idfier = f"{tree.file.file_path}:{tree.name}:{self.index}"
-        if not idfier in pointsCache:
-            self._cacheUpRootTreePoints ( tree )
-        for y in pointsCache[idfier]:
-            yield y
-
-    def _cacheUpRootTreePoints(self,tree ):
-        import uproot
+    def _cacheUpRootTreePoints(self,tree ) -> dict:
+        """ read the points of a ttree once, grouped by search bin.
+        The result is kept in pointsCache, and in a npz file in the
+        inputCache directory, if persistTreeCache is true.
 
+        :returns: dictionary with search bins (as strings) as keys and
+                  arrays with rows [ x, (y,) eff ] as values
+        """
+        tidfier = f"{tree.file.file_path}:{tree.name}"
+        if tidfier in pointsCache:
+            return pointsCache[tidfier]
         if self.dimensions >= 3:
             logger.error(f"Root trees can not contain more than 2 axes. \
             (Data is defined as {self.dimensions}-th dimensional)" )
             sys.exit()
 
+        cachefile = None
+        if persistTreeCache and inputCache.isEnabled():
+            cachefile = inputCache.treeFile ( tree.file.file_path, tree.name )
+        bins = self._loadTreeCache ( cachefile )
+        if bins is not None:
+            pointsCache[tidfier] = bins
+            return bins
+
         #Check dimensions:
         if self.dimensions == 1 and not len(tree.keys())==3:
             logger.error(f"TTree dimensions ({self.dimensions}) do not match data ({len(tree.keys())}). Will assume that this is ok, but you have been warned.")
@@ -1560,27 +1613,60 @@ class DataHandler(object):
             logger.error(f"TTree dimensions ({self.dimensions}) do not match data ({len(tree.keys())}). Will assume that this is ok, but you have been warned.")
             #sys.exit()
 
-        branches = tree.arrays()
         keys = tree.keys()
         xvar, yvar = keys[0], keys[1] # get the names of the branches!
-        effs = branches [ "AccEff" ]
-        yields = []
+        variables = [ xvar ]
+        if self.dimensions == 2:
+            variables.append ( yvar )
+        branches = tree.arrays( variables + [ "AccEff", "SearchBin" ],
+                                library = "np" )
         print ( f"[dataHandlerObjects] caching {len(branches[xvar])} ttree entries!" )
-        # import sys, IPython; IPython.embed( colors = "neutral" ); sys.exit()
-        for i in range( len(branches[xvar]) ):
-#            if type(self.index) == str: # and \
-#                    self.index != branches["SearchBin"][i]:
-#                continue
-            eff = float(effs[i])
-            x = float(branches[ xvar ][i])
-            tidfier = f"{tree.file.file_path}:{tree.name}:{branches['SearchBin'][i]}"
-            if not tidfier in pointsCache:
-                pointsCache[tidfier] = []
-            if self.dimensions == 1:
-                pointsCache[tidfier].append ( ( x, eff ) )
-            elif self.dimensions == 2:
-                y = float(branches[ yvar ][i])
-                pointsCache[tidfier].append ( ( x, y, eff ) )
+        points = np.stack ( [ np.asarray ( branches[v], dtype=float ) for v in \
+                              variables + [ "AccEff" ] ], axis=1 )
+        searchBins = np.asarray ( [ str(b) for b in branches["SearchBin"] ] )
+        ## group by search bin: a stable sort, then split at the boundaries
+        order = np.argsort ( searchBins, kind="stable" )
+        names, starts = np.unique ( searchBins[order], return_index=True )
+        groups = np.split ( points[order], starts[1:] )
+        bins = dict ( zip ( names.tolist(), groups ) )
+        pointsCache[tidfier] = bins
+        if cachefile is not None:
+            self._saveTreeCache ( cachefile, bins )
+        return bins
+
+    def _loadTreeCache ( self, cachefile : Union[None,str] ):
+        """ load the ttree points from cachefile, None if not there """
+        if cachefile is None or not os.path.exists ( cachefile ):
+            return None
+        try:
+            with np.load ( cachefile ) as f:
+                if f["points"].shape[1] != self.dimensions + 1:
+                    return None
+                groups = np.split ( f["points"], f["starts"][1:] )
+                ret = dict ( zip ( f["names"].tolist(), groups ) )
+            os.utime ( cachefile ) ## mark as recently used
+            return ret
+        except (OSError,ValueError,KeyError) as e:
+            logger.warning ( f"could not read {cachefile}: {e}" )
+        return None
+
+    def _saveTreeCache ( self, cachefile : str, bins : dict ):
+        """ write the ttree points to cachefile, then evict old
+        entries of the inputCache if needed """
+        names = list ( bins.keys() )
+        lengths = [ len(bins[n]) for n in names ]
+        starts = np.concatenate ( [ [0], np.cumsum ( lengths )[:-1] ] ).astype(int)
+        tmpfile = f"{cachefile}.{os.getpid()}.tmp"
+        try:
+            os.makedirs ( os.path.dirname ( cachefile ), exist_ok = True )
+            with open ( tmpfile, "wb" ) as f:
+                np.savez ( f, names = np.asarray ( names ), starts = starts,
+                    points = np.concatenate ( [ bins[n] for n in names ] ) )
+            os.replace ( tmpfile, cachefile )
+        except OSError as e:
+            logger.warning ( f"could not write {cachefile}: {e}" )
+            return
+        inputCache.evict()
 
     def _getPyRootGraphPoints(self,graph):
 
@@ -1656,9 +1742,7 @@ class ExclusionHandler(DataHandler):
         :yield: [x-value, y-value]
         """
 
-        points = []
-        for point in getattr(self,self.fileType)():
-            points.append(point)
+        points = self.readPoints()
         if self.sort:
             points = sorted(points, key = lambda x: x[0])
         if self.reverse:
@@ -41,6 +41,56 @@ except Exception as e:
 
 from smodels_utils.helper.various import round_to_n
 
+## the database creator, shared with the forked workers of createInParallel
+_shared = {}
+
+def runCreationTask ( task : tuple ) -> dict:
+    """ run one task of DatabaseCreator.createInParallel, in a worker process
+
+    :param task: ( "dataset", idataset ) writes dataInfo.txt of a dataset,
+                 ( "txname", idataset, itxname ) writes one txname file
+    :returns: dictionary with the task, the result, the error (or None),
+              the input files marked in DatabaseCreator.tempInputFiles,
+              and the time spent
+    """
+    creator = _shared["creator"]
+    dataset = creator[task[1]]
+    ret = { "task": task, "result": None, "error": None,
+            "name": f"{dataset._name}" }
+    t0 = time.time()
+    ntemp = len ( DatabaseCreator.tempInputFiles )
+    try:
+        folder = f"./{dataset._name}"
+        if task[0] == "dataset":
+            if creator._createDataInfoAt ( dataset, folder ):
+                ## the (picklable) state of the dataset, without the txnames
+                import pickle
+                ret["result"] = {}
+                for k,v in dataset.__dict__.items():
+                    if k == "_txnameList":
+                        continue
+                    try:
+                        pickle.dumps ( v )
+                        ret["result"][k] = v
+                    except Exception as e:
+                        pass
+        else:
+            txName = dataset._txnameList[task[2]]
+            ret["name"] = f"{dataset._name}:{txName}"
+            creator._createTxnameAt ( dataset, txName, folder )
+            for plane in txName._planes: ## to be able to pickle lambdify
+                plane.branches = None
+            ret["result"] = txName
+    except Exception as e:
+        import traceback
+        logger.error ( f"task {ret['name']} failed: {traceback.format_exc()}" )
+        ret["error"] = f"{type(e).__name__}: {e}"
+    except SystemExit as e: # sys.exit() in the conversion code
+        ret["error"] = f"exited with {e}"
+    ret["tempInputFiles"] = DatabaseCreator.tempInputFiles[ntemp:]
+    ret["dt"] = time.time() - t0
+    return ret
+
 class DatabaseCreator(list):
     tempInputFiles = []
 
@@ -101,6 +151,7 @@ class DatabaseCreator(list):
         #              None for monochrome
         self.colorScheme = "light" ## "dark", None
         self.ncpus = 1 ## the number of CPUs used
+        self.retries = 1 ## how often to retry a failed task, if ncpus > 1
 
         try:
             self.ncpus = 1 #  multiprocessing.cpu_count()
@@ -253,28 +304,13 @@ class DatabaseCreator(list):
             self._createValidationFolder()
 
         #Loop over datasets:
-        chunkedDatasets = [self[x::self.ncpus] for x in range(self.ncpus) if self[x::self.ncpus]]
         if self.ncpus == 1:
             updatedDatasets = []
-            self.createDatasets ( chunkedDatasets[0], updatedDatasets )
+            self.createDatasets ( self, updatedDatasets )
+            for dataset in updatedDatasets:
+                self.updateDataset(dataset)
         else:
-            manager = multiprocessing.Manager()
-            updatedDatasets = manager.list() #Stores the updated datasets for each process
-            children = []
-            for chunk in chunkedDatasets:
-                p = multiprocessing.Process(target=self.createDatasets, args=(chunk,updatedDatasets))
-                children.append(p)
-                p.start()
-            for p in children:
-                p.join(timeout=100000)
-
-            if len(updatedDatasets) != len(self):
-                logger.error( f"Error, when creating datasets: some children didnt terminate within the timeout." )
-                logger.error ( f"I see {len(updatedDatasets)} out of {len(self)} children have terminated." )
-                sys.exit()
-
-        for dataset in updatedDatasets:
-            self.updateDataset(dataset)
+            self.createInParallel()
         #Get all exclusion curves and write to sms.root:
         self.exclusions = self.getExclusionCurves()
         # self._createSmsRoot(createAdditional)
@@ -338,6 +374,96 @@ class DatabaseCreator(list):
         for dataset in datasetList:
             newDatasets.append(self._createDatasetAt(dataset,f"./{dataset._name}"))
 
+    def createInParallel(self):
+        """
+        Creates the datasets on a pool of self.ncpus forked worker processes.
+        Every dataset is one task (its dataInfo.txt), followed by one task
+        per txname, so the workers pick up whatever is left to do, and
+        big signal regions do not hold up the others. Failed tasks are
+        retried self.retries times, and reported at the end, together with
+        the slowest tasks.
+        """
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        from concurrent.futures.process import BrokenProcessPool
+        _shared["creator"] = self
+        ctx = multiprocessing.get_context ( "fork" )
+        todo = [ ( "dataset", i ) for i in range(len(self)) ]
+        attempts, done, failed = {}, [], []
+        self._txnamesLeft = {} ## per dataset, the txnames still to come back
+        self.timeStamp ( f"creating {len(self)} datasets on {self.ncpus} processes" )
+        while len(todo)>0:
+            executor = ProcessPoolExecutor ( max_workers = self.ncpus,
+                                             mp_context = ctx )
+            running = {}
+            broken = False
+            while len(todo)>0 or len(running)>0:
+                if not broken:
+                    for task in todo:
+                        running[executor.submit ( runCreationTask, task )] = task
+                    todo = []
+                if len(running)==0:
+                    break
+                finished, _ = wait ( running, return_when = FIRST_COMPLETED )
+                for future in finished:
+                    task = running.pop ( future )
+                    try:
+                        ret = future.result()
+                    except BrokenProcessPool as e: # a worker died
+                        broken = True
+                        ret = { "task": task, "error": "worker died",
+                                "name": str(task), "dt": 0. }
+                    except Exception as e: # e.g. result could not be pickled
+                        ret = { "task": task, "error": f"{type(e).__name__}: {e}",
+                                "name": str(task), "dt": 0. }
+                    attempts[task] = attempts.get ( task, 0 ) + 1
+                    if ret["error"] is not None:
+                        if attempts[task] <= self.retries:
+                            self.timeStamp ( f"{ret['name']} failed ({ret['error']}), retrying", "error" )
+                            todo.append ( task )
+                        else:
+                            failed.append ( ret )
+                            if task[0] == "txname": ## still register its inputs
+                                self._txnameBack ( task[1] )
+                        continue
+                    done.append ( ret )
+                    DatabaseCreator.tempInputFiles += ret["tempInputFiles"]
+                    todo += self._collectTaskResult ( task, ret["result"] )
+                    self.timeStamp ( f"[{len(done)}] {ret['name']} done in {ret['dt']:.1f}s", "debug" )
+            executor.shutdown ( wait = not broken )
+        for ret in failed:
+            self.timeStamp ( f"{ret['name']} failed after {attempts[ret['task']]} attempts: {ret['error']}", "error" )
+        self.timeStamp ( f"{len(done)} tasks done, {len(failed)} failed. slowest tasks:" )
+        for ret in sorted ( done, key = lambda r: r["dt"], reverse = True )[:10]:
+            self.timeStamp ( f"   {ret['name']}: {ret['dt']:.1f}s" )
+
+    def _collectTaskResult ( self, task : tuple, result ) -> list:
+        """ merge the result of a task of createInParallel into self.
+        once all txnames of a dataset are back, its input files are
+        registered, like updateDataset does in the serial case.
+
+        :returns: list of the new tasks that this task makes possible
+        """
+        dataset = self[task[1]]
+        if task[0] == "dataset":
+            if result is None: # did not pass the consistency checks
+                return []
+            dataset.__dict__.update ( result )
+            self._txnamesLeft[task[1]] = len(dataset._txnameList)
+            if len(dataset._txnameList)==0:
+                self.updateInputFileList ( dataset )
+            return [ ( "txname", task[1], i ) for i in range(len(dataset._txnameList)) ]
+        dataset._txnameList[task[2]] = result
+        self._txnameBack ( task[1] )
+        return []
+
+    def _txnameBack ( self, i : int ):
+        """ a txname task of dataset i is back, successful or failed for good.
+        once all are back, register the input files of the dataset, so
+        that they are not reported as cruft """
+        self._txnamesLeft[i] -= 1
+        if self._txnamesLeft[i] == 0:
+            self.updateInputFileList ( self[i] )
+
     def _createDatasetAt(self,dataset,datasetFolder):
         """
         Creates a dataset folder and the correponsing txname and dataInfo files
@@ -346,6 +472,24 @@ class DatabaseCreator(list):
         :param datasetFolder: Path to the dataset folder
         """
 
+        if not self._createDataInfoAt ( dataset, datasetFolder ):
+            return
+
+        #Loop over txnames in datasets:
+        for txName in dataset._txnameList:
+            self._createTxnameAt ( dataset, txName, datasetFolder )
+
+        return dataset
+
+    def _createDataInfoAt(self,dataset,datasetFolder) -> bool:
+        """
+        Creates a dataset folder and the dataInfo file
+
+        :param dataset: DataSetInput object
+        :param datasetFolder: Path to the dataset folder
+        :returns: false, if the dataset failed the consistency checks
+        """
+
         #Set current dataset folder (for writing all files below)
         self.timeStamp ( f"reading {dataset}", "debug" )
         #Create dataInfo.txt file:
@@ -358,33 +502,29 @@ class DatabaseCreator(list):
         #Consistency checks:
         if not dataset.checkConsistency():
             logger.error( f"Dataset {dataset} failed the consistency checks" )
-            return
+            return False
             # sys.exit()
         self._createInfoFile('dataInfo', dataset, datasetFolder)
+        return True
 
-        #Loop over txnames in datasets:
-        for txName in dataset._txnameList:
-            if not hasattr(txName, 'constraint'):
-                logger.error( f'Missing constraint for txname {str(txName)}' )
-                sys.exit()
-
-            #(getData has to be called first to define which planes contain data for this txname)
-            txName.getDataFromPlanes(dataType = dataset.dataType)  #Read source files and load data
-            txName.getMetaData()  #Set txname info attributes
-            #Write down txname.txt
-            if txName.hasData(dataset.dataType): #Do not write empty txnames:
-                self._createTxnameFile(str(txName), txName, datasetFolder)
+    def _createTxnameAt(self,dataset,txName,datasetFolder):
+        """
+        Loads the data of a txname, and writes its txname file
 
-        #Remove lambda functions from objects
-        #Required for storing datasets through parallel processing
-        #(issue with pickling lambda functions)
+        :param dataset: DataSetInput object
+        :param txName: TxNameInput object
+        :param datasetFolder: Path to the dataset folder
+        """
+        if not hasattr(txName, 'constraint'):
+            logger.error( f'Missing constraint for txname {str(txName)}' )
+            sys.exit()
 
-        if self.ncpus > 1:
-            for tx in dataset._txnameList: ## to be able to pickle lambidy
-                for plane in tx._planes:
-                    plane.branches = None
-
-        return dataset
+        #(getData has to be called first to define which planes contain data for this txname)
+        txName.getDataFromPlanes(dataType = dataset.dataType)  #Read source files and load data
+        txName.getMetaData()  #Set txname info attributes
+        #Write down txname.txt
+        if txName.hasData(dataset.dataType): #Do not write empty txnames:
+            self._createTxnameFile(str(txName), txName, datasetFolder)
 
     def addExclusionLinesForPlaneV2 ( self, plane, txname, curves, allCurves ):
         for axes in str(plane.axes).split(";"):
@@ -1031,8 +1171,7 @@ class DatabaseCreator(list):
 
         directory = infoFolder
 
-        if not os.path.exists(directory):
-            os.mkdir(directory)
+        os.makedirs(directory, exist_ok=True)
 
         path = os.path.join(directory, infoFileName.strip()+self.infoFileExtension.strip())
         return path
@@ -1051,6 +1190,12 @@ class DatabaseCreator(list):
             logger.error("Data for TxNameInput must be in list format")
             sys.exit()
 
+        #Fast path for regular grids: round, remove repeated entries,
+        #and write, all on arrays
+        vStr = formatGrid(value,n,dataType)
+        if vStr is not None:
+            return vStr
+
         #First round numbers:
         value = round_list(value,n)
 
@@ -1159,26 +1304,25 @@ def removeRepeated(datalist,dataType=None):
                           key = lambda k: datalist[k][1],reverse=rev),
                           key = lambda k: datalist[k][0])
 
-    uniqueEntries = []
+    uniqueEntries = set()
     repeatedEntries = []
     inconsistentEntries = []
     inconsistencies = {}
+    kept = None # the entry we keep for the current mass
     for i,pt in enumerate(sortedValue):
         originalIndex = sortedIndices[i]
         m = pt[0]
         #Check if new mass is different from previous one:
-        if m != sortedValue[i-1][0]:
-        #if m != sortedValue[i][0]:
-            uniqueEntries.append(originalIndex)
+        if i == 0 or m != sortedValue[i-1][0]:
+            uniqueEntries.add(originalIndex)
+            kept = pt
         else:
             #Check if the values differ:
-            if pt[1] == sortedValue[i][1]:
-            # if pt[1] == sortedValue[i-1][1]:
+            if pt[1] == kept[1]:
                 repeatedEntries.append(originalIndex) #Entries are identical, but repeated
             else:
                 inconsistentEntries.append(originalIndex) #Masses are identical, but with inconsistent values
-                inconsistencies[originalIndex]= ( pt[1], sortedValue[i][1] )
-                # inconsistencies[originalIndex]= ( pt[1], sortedValue[i-1][1] )
+                inconsistencies[originalIndex]= ( pt[1], kept[1] )
 
     if inconsistentEntries:
         for j in inconsistentEntries:
@@ -1197,6 +1341,130 @@ def removeRepeated(datalist,dataType=None):
 
     return newList
 
+def _gridLeaves(x,leaves,kinds):
+    """
+    Flatten one data point into its numbers (leaves) and a format string.
+    The kinds of the leaves (unum with its unit, float, int) are appended
+    to kinds.
+
+    :returns: format string with {} for every number, or None if the point
+              contains something we do not know how to handle
+    """
+    if isinstance(x,(list,tuple)):
+        parts = []
+        for pt in x:
+            part = _gridLeaves(pt,leaves,kinds)
+            if part is None:
+                return None
+            parts.append(part)
+        if isinstance(x,list):
+            return "[" + ",".join(parts) + "]"
+        if len(parts)==1:
+            return "(" + parts[0] + ",)"
+        return "(" + ",".join(parts) + ")"
+    if isinstance(x,str):
+        return repr(x).replace(" ","").replace("{","{{").replace("}","}}")
+    if isinstance(x,Unum):
+        leaves.append(x)
+        kinds.append(("unum",str(x._unit)))
+        return "{}"
+    if type(x) == int:
+        leaves.append(x)
+        kinds.append(("int",None))
+        return "{}"
+    if isinstance(x,float):
+        leaves.append(x)
+        kinds.append(("float",None))
+        return "{}"
+    return None
+
+def _unitSuffix(x : Unum, fmt : str) -> str:
+    """ the unit of x, as written in the txname files, e.g. '*GeV' """
+    Unum.VALUE_FORMAT = fmt
+    suffix = str(x)[len(fmt % x.asNumber()):]
+    suffix = suffix.replace('[GeV]','*GeV').replace('[TeV]','*TeV')
+    suffix = suffix.replace('[m]','*m').replace('[ns]','*ns')
+    suffix = suffix.replace('[fb]','*fb').replace('[pb]','*pb')
+    return suffix.replace(" ","")
+
+def formatGrid(datalist,n=5,dataType=None):
+    """
+    Round the values of a data grid to n digits, remove repeated mass
+    entries (keeping the highest upper limit, or the lowest efficiency),
+    and write it as a string, as DatabaseCreator._formatData does,
+    but on numpy arrays. Works only for regular grids, i.e. all points
+    have the same structure and the same units.
+
+    :param datalist: data grid list (e.g. [[massArray1,ul1],[massArray2,ul2],...]
+    :returns: the grid as a string, or None if the grid is not regular
+    """
+    import numpy as np
+    if len(datalist)==0:
+        return None
+    template, kinds, rows = None, None, []
+    for pt in datalist:
+        if not isinstance(pt,list) or len(pt)!=2 or isinstance(pt[1],(list,tuple)):
+            return None
+        leaves, ptKinds = [], []
+        ptTemplate = _gridLeaves(pt,leaves,ptKinds)
+        if ptTemplate is None:
+            return None
+        if template is None:
+            template, kinds, firstLeaves = ptTemplate, ptKinds, leaves
+        elif ptTemplate != template or ptKinds != kinds:
+            return None
+        rows.append([ l.asNumber() if isinstance(l,Unum) else l for l in leaves ])
+    try:
+        table = np.array(rows,dtype=float)
+    except (ValueError,TypeError) as e:
+        return None
+    if not np.all(np.isfinite(table)):
+        return None
+
+    #Round to n significant digits, with python's round, as round_list does
+    #(np.rint(x*10**k)/10**k differs in the last digit, e.g. for 75.5555)
+    table = np.array([ round_list(x,n) for x in table.ravel().tolist() ],
+                     dtype=float).reshape(table.shape)
+
+    #Remove repeated masses, keep the most conservative value:
+    masses, values = table[:,:-1], table[:,-1]
+    if dataType and dataType == 'efficiencyMap':
+        sortValues = values
+    else:
+        sortValues = -values
+    index = np.arange(len(table))
+    order = np.lexsort((index,sortValues)+tuple(masses[:,i] for i in \
+                       reversed(range(masses.shape[1]))))
+    sortedMasses, sortedValues = masses[order], values[order]
+    first = np.ones(len(order),dtype=bool)
+    if len(order)>1:
+        first[1:] = np.any(sortedMasses[1:] != sortedMasses[:-1],axis=1)
+    keptValues = sortedValues[np.maximum.accumulate(np.where(first,index,0))]
+    inconsistent = ~first & ( sortedValues != keptValues )
+    for j in np.nonzero(inconsistent)[0]:
+        logger.warning("Mass entry %s appears in data with distinct values: %s != %s"
+                       %(str(datalist[order[j]][0]).replace(" ",""),
+                         sortedValues[j],keptValues[j]))
+    nrepeated = int(np.sum(~first & ~inconsistent))
+    if nrepeated > 0:
+        logger.info(f"{nrepeated} entries appear in data repeated (after rounding)")
+    keep = np.sort(order[first])
+
+    #Write out:
+    fmt = f"%.{int(n - 1)}E"
+    columns = []
+    for i,(kind,unit) in enumerate(kinds):
+        column = table[keep,i].tolist()
+        if kind == "unum":
+            suffix = _unitSuffix(firstLeaves[i],fmt)
+            columns.append([ (fmt % v) + suffix for v in column ])
+        elif kind == "int": ## non-zero ints become floats when rounding
+            columns.append([ repr(v) if v != 0. else "0" for v in column ])
+        else:
+            columns.append([ repr(v) for v in column ])
+    vStr = "[" + ",".join( template.format(*r) for r in zip(*columns) ) + "]"
+    return vStr.replace('],[[','],\n[[')
+
 
 
 databaseCreator = DatabaseCreator()
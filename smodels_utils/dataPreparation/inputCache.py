@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: inputCache
+   :synopsis: persistent cache for the points that the DataHandler objects
+              extract from their source files (csv, root, embaked, effi, ...).
+              Entries are keyed by the hash of the source file(s) plus the
+              parameters of the data handler, so that an entry is only
+              ever reused for identical input. Along with the points, the
+              trimming factor that the reader ended up with is stored, as
+              reading has that side effect. Regular float tables are
+              stored as .npz files, anything else is pickled. The cache
+              is kept below maxSize bytes by evicting the least recently
+              used entries. Run as a script to inspect or clear the cache.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import logging
+import numpy as np
+from typing import Union, List, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+## bump this, whenever the readers in dataHandlerObjects change their output
+cacheVersion = 2
+## the maximum total size of the cache, in bytes
+maxSize = int ( float ( os.environ.get ( "SMODELS_INPUTCACHE_SIZE", 2e9 ) ) )
+## file types whose points depend only on the source files and the handler
+cacheableTypes = [ "csv", "mcsv", "txt", "root", "embaked", "effi" ]
+
+_fileHashes = {} ## ( path, size, mtime ) -> sha256, per process
+
+def cacheDir() -> str:
+    """ the directory of the cache, SMODELS_INPUTCACHE or
+    ~/.cache/smodels-utils/inputs """
+    ret = os.environ.get ( "SMODELS_INPUTCACHE",
+            os.path.join ( os.path.expanduser ( "~" ), ".cache",
+                           "smodels-utils", "inputs" ) )
+    return ret
+
+def isEnabled() -> bool:
+    """ the cache can be switched off with SMODELS_NOINPUTCACHE=1 """
+    return os.environ.get ( "SMODELS_NOINPUTCACHE", "0" ) in [ "", "0" ]
+
+def fileHash ( path : str ) -> str:
+    """ sha256 of the content of path, memoized per size and mtime """
+    stat = os.stat ( path )
+    tag = ( os.path.abspath ( path ), stat.st_size, stat.st_mtime_ns )
+    if tag in _fileHashes:
+        return _fileHashes[tag]
+    h = hashlib.sha256()
+    with open ( path, "rb" ) as f:
+        for chunk in iter ( lambda: f.read ( 1 << 20 ), b"" ):
+            h.update ( chunk )
+    _fileHashes[tag] = h.hexdigest()
+    return _fileHashes[tag]
+
+def keyFor ( handler ) -> Union[None,str]:
+    """ the cache key of a data handler, None if its points cannot be cached
+
+    :param handler: a DataHandler object, with its source set
+    """
+    if handler.fileType not in cacheableTypes:
+        return None
+    paths = handler.path
+    if type(paths) not in [ tuple, list ]:
+        paths = [ paths ]
+    try:
+        hashes = [ fileHash ( p ) for p in paths ]
+    except (OSError,TypeError) as e:
+        return None
+    from smodels_utils.dataPreparation import dataHandlerObjects as dho
+    params = [ cacheVersion, type(handler).__name__, handler.fileType,
+        hashes, handler.objectName, handler.index,
+        sorted ( [ ( str(k), v ) for k,v in handler.coordinateMap.items() ],
+                 key = str ),
+        handler.dimensions, handler.unit, handler.massUnit,
+        sorted ( getattr ( handler, "args", {} ).items(), key = str ),
+        ## the trimming factor as it is *before* reading, the readers apply
+        ## a preset factor. the factor they set themselves is stored with
+        ## the points, see store
+        dho.allowTrimming, handler.maxBins(), handler.maxBins ( uproot = True ),
+        dho.trimmingFactor[0] ]
+    return hashlib.sha256 ( repr(params).encode() ).hexdigest()
+
+def treeFile ( rootfile : str, treename : str ) -> Union[None,str]:
+    """ the cache file for all points of a ttree, see
+    DataHandler._cacheUpRootTreePoints. it is keyed by the hash of the root
+    file, and evicted and cleared like the other entries.
+
+    :returns: path of the npz file, None if rootfile cannot be read
+    """
+    try:
+        params = [ cacheVersion, "ttree", fileHash ( rootfile ), treename ]
+    except OSError as e:
+        return None
+    key = hashlib.sha256 ( repr(params).encode() ).hexdigest()
+    return os.path.join ( cacheDir(), f"{key}.npz" )
+
+def _entryFiles ( key : str ) -> List[str]:
+    d = cacheDir()
+    return [ os.path.join ( d, f"{key}.npz" ), os.path.join ( d, f"{key}.pkl" ) ]
+
+def load ( key : str ) -> Union[None,Tuple[List,Union[None,int]]]:
+    """ retrieve the points stored under key
+
+    :returns: list of points and the trimming factor after reading them,
+              or None if not in cache
+    """
+    npzfile, pklfile = _entryFiles ( key )
+    try:
+        if os.path.exists ( npzfile ):
+            with np.load ( npzfile, allow_pickle = False ) as f:
+                points = f["points"].tolist()
+                factor = int ( f["trimmingFactor"] )
+            os.utime ( npzfile ) ## mark as recently used
+            return points, ( None if factor < 0 else factor )
+        if os.path.exists ( pklfile ):
+            with open ( pklfile, "rb" ) as f:
+                ret = pickle.load ( f )
+            os.utime ( pklfile )
+            return ret["points"], ret["trimmingFactor"]
+    except (OSError,ValueError,KeyError,EOFError,pickle.UnpicklingError) as e:
+        logger.warning ( f"could not read input cache entry {key}: {e}" )
+    return None
+
+def _isFloatTable ( points : List ) -> bool:
+    """ can points be stored as a 2d float array, without changing types? """
+    if len(points)==0 or type(points[0]) not in [ list, tuple ]:
+        return False
+    n = len(points[0])
+    for pt in points:
+        if type(pt) not in [ list, tuple ] or len(pt) != n:
+            return False
+        for v in pt:
+            if type(v) != float:
+                return False
+    return True
+
+def store ( key : str, points : List, trimmingFactor : Union[None,int] = None ):
+    """ store points under key, then evict old entries if needed
+
+    :param trimmingFactor: the trimming factor after reading the points
+    """
+    d = cacheDir()
+    try:
+        os.makedirs ( d, exist_ok = True )
+        npzfile, pklfile = _entryFiles ( key )
+        if _isFloatTable ( points ):
+            fname = npzfile
+            tmpfile = f"{npzfile}.{os.getpid()}.tmp"
+            factor = -1 if trimmingFactor is None else trimmingFactor
+            with open ( tmpfile, "wb" ) as f:
+                np.savez ( f, points = np.asarray ( points, dtype=float ),
+                           trimmingFactor = np.int64 ( factor ) )
+        else:
+            fname = pklfile
+            tmpfile = f"{pklfile}.{os.getpid()}.tmp"
+            with open ( tmpfile, "wb" ) as f:
+                pickle.dump ( { "points": list(points),
+                    "trimmingFactor": trimmingFactor }, f,
+                    protocol = pickle.HIGHEST_PROTOCOL )
+        os.replace ( tmpfile, fname )
+    except (OSError,pickle.PicklingError,TypeError) as e:
+        logger.warning ( f"could not write input cache entry {key}: {e}" )
+        return
+    evict()
+
+def entries() -> List[Dict]:
+    """ list the entries of the cache, least recently used first """
+    d = cacheDir()
+    if not os.path.isdir ( d ):
+        return []
+    ret = []
+    for fname in os.listdir ( d ):
+        if not fname.endswith ( ".npz" ) and not fname.endswith ( ".pkl" ):
+            continue
+        path = os.path.join ( d, fname )
+        try:
+            stat = os.stat ( path )
+        except FileNotFoundError as e: # evicted in the meantime
+            continue
+        ret.append ( { "path": path, "key": fname[:-4], "size": stat.st_size,
+                       "used": stat.st_mtime } )
+    ret.sort ( key = lambda e: e["used"] )
+    return ret
+
+def evict ( size : Union[None,int] = None ) -> int:
+    """ remove least recently used entries until the cache is below size
+
+    :param size: maximum total size in bytes, if None use maxSize
+    :returns: number of removed entries
+    """
+    if size is None:
+        size = maxSize
+    es = entries()
+    total = sum ( [ e["size"] for e in es ] )
+    nremoved = 0
+    for e in es:
+        if total <= size:
+            break
+        try:
+            os.unlink ( e["path"] )
+            nremoved += 1
+        except FileNotFoundError as err:
+            pass
+        total -= e["size"]
+    return nremoved
+
+def clear ( olderThan : Union[None,float] = None ) -> int:
+    """ remove entries from the cache
+
+    :param olderThan: if given, remove only entries unused for that many days
+    :returns: number of removed entries
+    """
+    nremoved = 0
+    for e in entries():
+        if olderThan is not None and time.time() - e["used"] < olderThan * 86400.:
+            continue
+        try:
+            os.unlink ( e["path"] )
+            nremoved += 1
+        except FileNotFoundError as err:
+            pass
+    return nremoved
+
+def main():
+    import argparse
+    argparser = argparse.ArgumentParser(description =
+        'inspect or clear the cache of the data handler input points' )
+    argparser.add_argument ( 'command', nargs = '?', default = 'info',
+        choices = [ 'info', 'list', 'clear', 'evict' ],
+        help = 'info: summary, list: all entries, clear: remove entries, evict: shrink to the maximum size [info]' )
+    argparser.add_argument ( '-d', '--days', type = float, default = None,
+        help = 'with clear, remove only entries unused for that many days' )
+    argparser.add_argument ( '-s', '--size', type = float, default = None,
+        help = f'with evict, the maximum size in MB [{maxSize/1e6:.0f}]' )
+    args = argparser.parse_args()
+    if args.command == "clear":
+        n = clear ( args.days )
+        print ( f"[inputCache] removed {n} entries from {cacheDir()}" )
+        return
+    if args.command == "evict":
+        size = None if args.size is None else int ( args.size * 1e6 )
+        n = evict ( size )
+        print ( f"[inputCache] evicted {n} entries from {cacheDir()}" )
+        return
+    es = entries()
+    if args.command == "list":
+        for e in es:
+            used = time.strftime ( "%Y-%m-%d %H:%M", time.localtime ( e["used"] ) )
+            print ( f"{e['key'][:16]} {os.path.basename(e['path'])[-3:]} {e['size']/1e3:10.1f} kB  {used}" )
+    total = sum ( [ e["size"] for e in es ] )
+    print ( f"[inputCache] {cacheDir()}: {len(es)} entries, {total/1e6:.1f} of {maxSize/1e6:.0f} MB" )
+
+if __name__ == "__main__":
+    main()
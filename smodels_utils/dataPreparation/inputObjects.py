@@ -12,6 +12,8 @@
 
 import sys
 import os
+import re
+import numpy as np
 from smodels_utils.helper.txDecays import TxDecay
 from smodels_utils.dataPreparation.databaseCreation import databaseCreator,round_list
 from smodels_utils.dataPreparation.dataHandlerObjects import hbar
@@ -43,6 +45,18 @@ errormsgs = {}
 _complainAboutOverlappingConstraints = False
 
 complainAbout = { "sympy obj": 0, "x in datamap": 0, "axesMap": 0 }
+_compiledVertices = {} ## the mass constraints of vertices, compiled
+
+def _compiledVertex ( vertex : str ):
+    """ the mass constraint of a vertex, e.g. 'dm >= 80.', compiled only once """
+    if not vertex in _compiledVertices:
+        _compiledVertices[vertex] = compile ( vertex, "<massConstraint>", "eval" )
+    return _compiledVertices[vertex]
+
+## mass constraints of the form "dm >= 80.", that can be checked on arrays
+_vertexPattern = re.compile ( r"^\s*dm\s*(>=|<=|>|<)\s*([-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*$" )
+_vertexOperators = { ">=": np.greater_equal, ">": np.greater,
+                     "<=": np.less_equal, "<": np.less }
 
 def elementsInStr(instring : str,removeQuotes : bool = True) -> list: ## from V2
     """
@@ -1061,6 +1075,38 @@ class TxNameInput(Locker):
         logger.error ( f"cannot determine the unit of the values from {unit}" )
         return ""
 
+    def getValueScaler ( self, dataHandler ) -> Callable:
+        """ compile the unit of the values of a data handler into a function
+        that scales a value, so that the unit is interpreted only once
+
+        :returns: function that takes and returns a value
+        """
+        if not hasattr(dataHandler, 'unit') or not dataHandler.unit:
+            return lambda value: value
+        unit = self.getValueUnit ( dataHandler.unit )
+        if unit == "%":
+            return lambda value: value / 100.
+        if unit == "/10000":
+            return lambda value: value / 10000.
+        if self.widthsInNs(dataHandler.unit):
+            return lambda value: value
+        if type(unit) == str and unit.startswith ( "/" ):
+            factor = unit[1:]
+            try:
+                factor = float ( factor )
+            except ValueError as e:
+                logger.error ( f"unit starting with / is meant as a factor. cannot cast {dataHandler.unit[1:]} to a float!" )
+            return lambda value: value / factor
+        if type(unit) == str and unit.startswith ( "*" ):
+            factor = unit[1:]
+            try:
+                factor = float ( factor )
+            except ValueError as e:
+                logger.error ( f"unit starting with * is meant as a factor. cannot cast {dataHandler.unit[1:]} to a float!" )
+            return lambda value: value * factor
+        factor = eval(unit, {'fb':fb,'pb': pb,'GeV': GeV,'TeV': TeV})
+        return lambda value: value*factor
+
     def addDataFromV2(self, plane, dataLabel : str ):
         """
         extend the given data list by the values related to this type of list
@@ -1090,7 +1136,7 @@ class TxNameInput(Locker):
                 acceptanceData = getattr(plane,'acceptanceMap')
                 dataHandler.reweightBy(acceptanceData)
 
-        dataList = []
+        points = []
         for ptDict in dataHandler:
             nPtDict = 0
             for k,v in ptDict.items():
@@ -1107,7 +1153,24 @@ class TxNameInput(Locker):
             xDict = dict([[str(xv),v] for xv,v in ptDict.items() if xv in plane.xvars])
             #Get the (upper limit, efficiency,..) value:
             value = [v for xv,v in ptDict.items() if  not xv in plane.xvars][0]
-            massArray = plane.getParticleMasses(**xDict)
+            points.append ( ( xDict, value ) )
+
+        #Compute the mass arrays of all points at once, if possible
+        massArrays = None
+        try:
+            xArrays = { str(xv): [ xDict[str(xv)] for xDict,_ in points ] \
+                        for xv in plane.xvars }
+            if len(points)>0:
+                massArrays = plane.getParticleMassesMany(**xArrays)
+        except KeyError as e: # not all points have all variables
+            pass
+
+        candidates = []
+        for i,(xDict,value) in enumerate(points):
+            if massArrays is not None:
+                massArray = massArrays[i]
+            else:
+                massArray = plane.getParticleMasses(**xDict)
             skipMass = False
             #Check if the massArray is positive and value is positive:
             for br in massArray:
@@ -1129,49 +1192,36 @@ class TxNameInput(Locker):
                 logger.warning( f"Negative value for {self} found. Point {massArray} will be ignored." )
             if skipMass:
                 continue
-            #Check if mass array is consistent with the mass constraints given by the
-            #txname constraint. If not, skip this mass.
-            if not self.checkMassConstraints(massArray,value):
+            candidates.append ( ( massArray, value ) )
+
+        #Check if mass arrays are consistent with the mass constraints given by the
+        #txname constraint. If not, skip these masses.
+        accepted = self.checkMassConstraintsMany ( [ c[0] for c in candidates ],
+                                                   [ c[1] for c in candidates ] )
+        scaleValue = self.getValueScaler ( dataHandler )
+        massFactor = None
+        if hasattr(dataHandler, 'massUnit') and dataHandler.massUnit:
+            massFactor = eval(dataHandler.massUnit,{'GeV': GeV,'TeV': TeV})
+        dataList = []
+        for (massArray,value),isGood in zip ( candidates, accepted ):
+            if not isGood:
                 continue
             #Add units
-            if hasattr(dataHandler, 'unit') and dataHandler.unit:
-                unit = self.getValueUnit ( dataHandler.unit )
-                if unit == "%":
-                    value = value / 100.
-                elif unit == "/10000":
-                    value = value / 10000.
-                elif self.widthsInNs(dataHandler.unit):
-                    pass #
-                elif type(unit) == str and unit.startswith ( "/" ):
-                    factor = unit[1:]
-                    try:
-                        factor = float ( factor )
-                    except ValueError as e:
-                        logger.error ( f"unit starting with / is meant as a factor. cannot cast {dataHandler.unit[1:]} to a float!" )
-                    value = value / factor
-                elif type(unit) == str and unit.startswith ( "*" ):
-                    factor = unit[1:]
-                    try:
-                        factor = float ( factor )
-                    except ValueError as e:
-                        logger.error ( f"unit starting with * is meant as a factor. cannot cast {dataHandler.unit[1:]} to a float!" )
-                    value = value * factor
-                else:
-                    value = value*eval(unit, {'fb':fb,'pb': pb,'GeV': GeV,'TeV': TeV})
-            if hasattr(dataHandler, 'massUnit') and dataHandler.massUnit:
+            value = scaleValue ( value )
+            if massFactor is not None:
                 for i,br in enumerate(massArray):
                     if isinstance(br,str):  #Allow for string identifiers in the mass array
                         continue
                     for j,M in enumerate(br):
                         if isinstance(M,tuple):
-                            m0 = M[0]*eval(dataHandler.massUnit,{'GeV': GeV,'TeV': TeV})
+                            m0 = M[0]*massFactor
                             if self.widthsInNs(dataHandler.unit):
                                 m1 = hbar / M[1] * GeV
                             else:
                                 m1 = M[1] * GeV ## width in GeV
                             M = ( m0, m1 )
                         if isinstance(M,(float,int)):
-                            M = M*eval(dataHandler.massUnit,{'GeV': GeV,'TeV': TeV})
+                            M = M*massFactor
                         massArray[i][j] = M
             dataList.append([massArray, value])
 
@@ -1226,6 +1276,7 @@ class TxNameInput(Locker):
                 acceptanceData = getattr(plane,'acceptanceMap')
                 dataHandler.reweightBy(acceptanceData)
 
+        scaleValue = self.getValueScaler ( dataHandler )
         dataList = []
         for ptDict in dataHandler:
             if len(ptDict) != nvars+1:
@@ -1261,31 +1312,7 @@ class TxNameInput(Locker):
             if not self.checkMassConstraints(massArray,value):
                 continue
             #Add units
-            if hasattr(dataHandler, 'unit') and dataHandler.unit:
-                unit = self.getValueUnit ( dataHandler.unit )
-                if unit == "%":
-                    value = value / 100.
-                elif unit == "/10000":
-                    value = value / 10000.
-                elif self.widthsInNs(dataHandler.unit):
-                    pass #
-                elif type(unit) == str and unit.startswith ( "/" ):
-                    factor = unit[1:]
-                    try:
-                        factor = float ( factor )
-                    except ValueError as e:
-                        logger.error ( f"unit starting with / is meant as a factor. cannot cast {dataHandler.unit[1:]} to a float!" )
-                    value = value / factor
-                elif type(unit) == str and unit.startswith ( "*" ):
-                    factor = unit[1:]
-                    try:
-                        factor = float ( factor )
-                    except ValueError as e:
-                        logger.error ( f"unit starting with * is meant as a factor. cannot cast {dataHandler.unit[1:]} to a float!" )
-                    value = value * factor
-                else:
-                    value = value*eval(unit, {'fb':fb,'pb': pb,'GeV': GeV,'TeV': TeV})
-            dataList.append([massArray, value])
+            dataList.append([massArray, scaleValue ( value )])
 
         if not dataList:
             logger.warning( f'Could not retrieve data for {self} (plane {plane})' )
@@ -1481,7 +1508,7 @@ class TxNameInput(Locker):
                                 logger.error("(I quenched a few more error msgs as the one above)" )
                         return False
                     #Evaluate the inequality replacing m by the mass difference:
-                    check = eval(vertex,{'dm' : massDiff})
+                    check = eval(_compiledVertex(vertex),{'dm' : massDiff})
                     if check == False:
                         goodMasses = False
                         break
@@ -1493,6 +1520,120 @@ class TxNameInput(Locker):
 
         return False
 
+    def _compileMassConstraintsV2 ( self ):
+        """ compile the (V2) mass constraints into thresholds on the mass
+        differences, e.g. 'dm >= 80.' into ( ib, iv, np.greater_equal, 80. )
+
+        :returns: one list of ( branch, vertex, operator, threshold ) per
+                  element (None for elements without constraint), or None,
+                  if a constraint cannot be compiled
+        """
+        ret = []
+        for elMass in self.massConstraints:
+            if elMass == None:
+                ret.append ( None )
+                continue
+            if type(elMass) == dict:
+                return None
+            element = []
+            for ib,br in enumerate(elMass):
+                for iv,vertex in enumerate(br):
+                    m = _vertexPattern.match ( str(vertex) )
+                    if m is None:
+                        return None
+                    element.append ( ( ib, iv, _vertexOperators[m.group(1)],
+                                       float ( m.group(2) ) ) )
+            ret.append ( element )
+        return ret
+
+    def _massDiffColumns ( self, massArrays : list, compiled : list ):
+        """ the parent and daughter masses at every vertex that is
+        constrained, as arrays over all mass arrays
+
+        :returns: dictionary with ( branch, vertex ) as keys and
+                  arrays of parent and daughter masses as values, or None,
+                  if the mass arrays do not all have the expected form
+        """
+        ret = {}
+        for element in compiled:
+            if element is None:
+                continue
+            for ib,iv,_,_ in element:
+                if ( ib, iv ) in ret:
+                    continue
+                m1s, m2s = [], []
+                for massArray in massArrays:
+                    if len(massArray)<=ib or type(massArray[ib]) not in [ list, tuple ] \
+                            or len(massArray[ib])<=iv+1:
+                        return None
+                    m1, m2 = massArray[ib][iv], massArray[ib][iv+1]
+                    if type(m1) == tuple:
+                        m1 = m1[0]
+                    if type(m2) == tuple:
+                        m2 = m2[0]
+                    if type(m1) not in [ float, int ] or type(m2) not in [ float, int ]:
+                        return None
+                    m1s.append ( m1 )
+                    m2s.append ( m2 )
+                ret[(ib,iv)] = ( np.array ( m1s ), np.array ( m2s ) )
+        return ret
+
+    def checkMassConstraintsMany(self,massArrays : list, values : list ) -> list:
+        """
+        checkMassConstraints for many mass arrays at once. The mass
+        constraints are compiled once into thresholds on the mass differences,
+        which are then checked on arrays. Falls back to checking point by
+        point, if the constraints or the mass arrays are not of the
+        standard form.
+
+        :param massArrays: list of mass arrays
+        :param values: list of the values of the points
+        :returns: list of booleans, true if the mass array is accepted
+        """
+        if hasattr(self,'massConstraint') and self.massConstraint!=None:
+            ## FIXME obsolete?
+            self.massConstraints = [self.massConstraint]
+        if not hasattr(self,'massConstraints'):
+            self._setMassConstraints()
+        if not self.massConstraints or len(massArrays)==0:
+            return [ True ] * len(massArrays)
+        compiled = self._compileMassConstraintsV2()
+        columns = None
+        if compiled is not None and not [] in massArrays:
+            columns = self._massDiffColumns ( massArrays, compiled )
+        if columns is None:
+            return [ self.checkMassConstraints(m,v) for m,v in zip(massArrays,values) ]
+        n = len(massArrays)
+        positive = np.array ( [ v is None or v > 0. for v in values ] )
+        decided = np.zeros ( n, dtype=bool )
+        ret = np.zeros ( n, dtype=bool )
+        ## same order of checks as in checkMassConstraintsV2: the first
+        ## element that is fulfilled accepts, a parent lighter than
+        ## its daughter rejects
+        for element in compiled:
+            if element is None:
+                continue
+            good = ~decided
+            for ib,iv,operator,threshold in element:
+                m1, m2 = columns[(ib,iv)]
+                massDiff = m1 - m2
+                negative = good & ( massDiff < 0. ) & positive
+                nnegative = int ( negative.sum() )
+                for k,i in enumerate ( np.nonzero ( negative )[0] ):
+                    if quenchNegativeMasses or self._smallerThanError >= 3:
+                        self._smallerThanError += nnegative - k
+                        break
+                    self._smallerThanError += 1
+                    if self._smallerThanError < 3:
+                        logger.error( f"Parent mass ({m1[i]:.1f}) is smaller than daughter mass ({m2[i]:.1f}) for {self} value is {values[i]}" )
+                    if self._smallerThanError == 3:
+                        logger.error("(I quenched a few more error msgs as the one above)" )
+                decided |= negative
+                good &= ~negative & operator ( massDiff, threshold )
+            ret |= good
+            decided |= good
+        return ret.tolist()
+
     def checkMassConstraints(self,massArray, value = None ):
         """
         Check if massArray satisfies the mass constraints defined in massConstraints
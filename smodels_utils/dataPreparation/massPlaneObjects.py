@@ -241,6 +241,27 @@ class MassPlane(MassPlaneBase):
         massArray = [br.getParticleMasses(**xMass) for br in self.branches]
         return massArray
 
+    def getParticleMassesMany(self,**xMasses):
+
+        """
+        Translate many points of the plot to mass arrays at once
+        :param xMasses: arrays of x,y,... values (all of the same length)
+        :return: list of mass arrays, one per point, as in getParticleMasses,
+                 or None if they cannot be computed as arrays
+        """
+
+        if self.branches == None:
+            return None
+        branches = []
+        for br in self.branches:
+            if not hasattr ( br, "getParticleMassesMany" ):
+                return None
+            masses = br.getParticleMassesMany(**xMasses)
+            if masses is None:
+                return None
+            branches.append ( masses )
+        return [ list(massArray) for massArray in zip ( *branches ) ]
+
     def getXYValues(self,massArray,widthArray=None):
 
         """
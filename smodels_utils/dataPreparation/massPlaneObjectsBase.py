@@ -235,8 +235,11 @@ class Axes(object):
         self._massFunctions = []
         self._widthFunctions = []
         self._widthIndices = [] ## take note of where width info was given
+        self._massFunctionsNp = [] ## the same, for numpy arrays
+        self._widthFunctionsNp = []
         for m in self._massVars:
             self._massFunctions.append(_lambdify(self._xvars,s[m],'math',dummify=False))
+            self._massFunctionsNp.append(_lambdify(self._xvars,s[m],'numpy',dummify=False))
         tall = solve(self._equations,widths,dict=True)
         if len(tall)==0:
             return
@@ -246,6 +249,7 @@ class Axes(object):
             try:
                 x=_lambdify(self._xvars,t[m],'math',dummify=False)
                 self._widthFunctions.append ( x )
+                self._widthFunctionsNp.append ( _lambdify(self._xvars,t[m],'numpy',dummify=False) )
                 self._widthIndices.append ( i )
             except KeyError: ## does not have to be given!
                 pass
@@ -292,6 +296,40 @@ class Axes(object):
             combinedArray.append ( tmp )
         return combinedArray
 
+    def getParticleMassesMany(self,**xMasses):
+
+        """
+        translate many points of the plot to mass arrays at once,
+        evaluating every mass function only once, on arrays.
+        :param xMasses: arrays of x,y,... values, all of the same length
+        :return: list of mass arrays, one per point, as in getParticleMasses,
+                 or None if the points cannot be evaluated as arrays
+        """
+
+        if not self._equations:
+            return None
+
+        if not '_massFunctions' in self.__dict__:
+            self._getMassFunction()
+
+        xValues = {}
+        for xv in self._xvars:
+            if not str(xv) in xMasses:  #Missing a variable
+                return None
+            value = np.asarray ( xMasses[str(xv)] )
+            if not np.issubdtype ( value.dtype, np.number ):
+                return None
+            xValues[str(xv)] = value
+        n = len ( list ( xMasses.values() )[0] )
+        ## constant masses are returned as scalars, hence the broadcast
+        columns = [ np.broadcast_to ( np.asarray ( mfunc(**xValues), dtype=float ), \
+                    (n,) ).tolist() for mfunc in self._massFunctionsNp ]
+        widths = [ np.broadcast_to ( np.asarray ( mfunc(**xValues), dtype=float ), \
+                    (n,) ).tolist() for mfunc in self._widthFunctionsNp ]
+        for i,wi in enumerate(self._widthIndices):
+            columns[wi] = list ( zip ( columns[wi], widths[i] ) )
+        return [ list(row) for row in zip ( *columns ) ]
+
     def _setXYFunction(self):
 
         """
@@ -648,3 +686,8 @@ class WildAxes(Axes):
     def getParticleMasses(self,**xMass):
 
         return '*'
+
+    def getParticleMassesMany(self,**xMasses):
+
+        n = len ( list ( xMasses.values() )[0] )
+        return [ '*' ] * n
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: exclusionLineStore
+    :synopsis: in-memory store of the exclusion lines of exclusion_lines.json
+               files. Every file is read once per process (and again only if
+               it changes), the points are kept as numpy arrays, the curves
+               are indexed by txname, observed/expected and +-1 sigma, and
+               the comparisons of the axes are memoized.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import os
+import copy
+import numpy as np
+from functools import lru_cache
+from typing import Union, Dict, List
+
+_stores = {} ## abspath -> ( mtime, ExclusionLineStore )
+
+def getStore ( jsonfile : os.PathLike ):
+    """ the store of jsonfile, read from disk only if needed
+
+    :returns: ExclusionLineStore, None if file does not exist
+    """
+    if not os.path.isfile ( jsonfile ):
+        return None
+    path = os.path.abspath ( jsonfile )
+    mtime = os.stat ( path ).st_mtime_ns
+    if path in _stores and _stores[path][0] == mtime:
+        return _stores[path][1]
+    store = ExclusionLineStore ( path )
+    _stores[path] = ( mtime, store )
+    return store
+
+@lru_cache(maxsize=None)
+def evalAxes ( axes : str ):
+    """ evaluate an axes string, with x,y,z,w being sympy symbols.
+    memoized, so do not change the returned object!
+
+    :returns: the evaluated axes, None if the string cannot be evaluated
+    """
+    from sympy import var
+    x,y,z,w = var('x y z w')
+    try:
+        return eval ( axes.replace(" ","").strip() )
+    except (SyntaxError,NameError,TypeError) as e:
+        return None
+
+@lru_cache(maxsize=None)
+def canonicalExpr ( expr : str ):
+    """ parse a single axis expression, e.g. '0.5*x+0.5*y', memoized """
+    import sympy
+    return sympy.parse_expr ( expr )
+
+@lru_cache(maxsize=None)
+def flattenedAxes ( axes : str ) -> Union[None,tuple]:
+    """ the canonicalized entries of a v2 axes string, in the order of the
+    v3 dictionaries: the masses of both branches, then the widths
+
+    :param axes: e.g. [[x,y,60.0],[x,y,60.0]]
+    """
+    nested = evalAxes ( axes )
+    if nested is None:
+        return None
+    ret, last = [], []
+    for t in [ item for row in nested for item in row ]:
+        if type(t) in [ tuple ]:
+            ret.append ( t[0] )
+            last.append ( t[1] )
+        else:
+            ret.append ( t )
+    return tuple ( [ canonicalExpr ( str(t) ) for t in ret + last ] )
+
+@lru_cache(maxsize=None)
+def axesMatchV3 ( nameAxes : str, queryAxes : str ) -> bool:
+    """ does the axes part of a curve name match the (v3) query axes?
+
+    :param nameAxes: e.g. [[x,y,60.0],[x,y,60.0]] or {0:'x',1:'y',2:'y'}
+    :param queryAxes: e.g. {0:'x',1:'0.5*x+0.5*y',2:'y'}
+    """
+    query = evalAxes ( queryAxes )
+    if "{" in nameAxes: ## we have a type v3 axis name!!
+        return evalAxes ( nameAxes ) == query
+    flattened = flattenedAxes ( nameAxes )
+    if flattened is None:
+        return False
+    for k,v in query.items():
+        if k >= len(flattened) or canonicalExpr ( str(v) ) != flattened[k]:
+            return False
+    return True
+
+@lru_cache(maxsize=None)
+def axesMatchV2 ( nameAxes : str, queryAxes : str ) -> bool:
+    """ does the axes part of a curve name match the (v2) query axes? """
+    caxis = evalAxes ( nameAxes )
+    return caxis is not None and caxis == evalAxes ( queryAxes )
+
+class ExclusionLine:
+    """ a single exclusion curve, its points held as numpy arrays """
+
+    def __init__ ( self, txname : str, name : str, content, position : int ):
+        """
+        :param content: the entry in the json file, either a list of lines,
+                        each a list of { "x":, "y": } points, or (the old
+                        format) a dictionary { "x": [], "y": [] }
+        :param position: the position of the curve in the file
+        """
+        self.txname = txname
+        self.name = name
+        self.position = position
+        p1 = name.find("_")
+        self.prefix = name[:p1]
+        self.axes = name[p1+1:]
+        self.kind = None
+        for kind in [ "obs", "exp" ]:
+            if name.startswith ( kind ):
+                self.kind = kind
+        self.variant = ""
+        for variant in [ "P1", "M1" ]:
+            if f"Exclusion{variant}" in name:
+                self.variant = variant
+        self.raw = None ## content that we could not convert
+        self.lines, self.columns, self.extras = None, None, {}
+        if type(content)==dict:
+            self.columns = [ c for c in [ "x", "y" ] if c in content ]
+            self.extras = { k:v for k,v in content.items() if not k in self.columns }
+            self.points = { c: np.asarray ( content[c], dtype=float ) for c in self.columns }
+            return
+        self.points = None
+        try:
+            columns = [ "x", "y" ] if len(content)>0 and len(content[0])>0 \
+                      and "y" in content[0][0] else [ "x" ]
+            lines = []
+            for line in content:
+                if any ( [ set(pt.keys()) != set(columns) for pt in line ] ):
+                    raise ValueError ( "irregular points" )
+                lines.append ( np.array ( [ [ pt[c] for c in columns ] for pt in line ],
+                                          dtype=float ).reshape(-1,len(columns)) )
+            self.lines, self.columns = lines, columns
+        except (ValueError,TypeError,AttributeError,KeyError) as e:
+            self.raw = content
+
+    def mask ( self, points : np.ndarray, ranges : dict,
+               columns : List[str] ) -> np.ndarray:
+        """ mask of the points (rows x,(y)) that are strictly within ranges,
+        in the given columns """
+        ret = np.ones ( len(points), dtype=bool )
+        for i,c in enumerate ( self.columns ):
+            if not c in columns:
+                continue
+            lo, hi = ranges.get ( c, [ float("-inf"), float("inf") ] )
+            ret &= ( lo < points[::,i] ) & ( points[::,i] < hi )
+        return ret
+
+    def getPoints ( self, ranges : Union[None,dict] = None ) -> Union[List,Dict]:
+        """ the points, in the format of the json file, cut at ranges
+
+        :param ranges: if dict, then cut exclusion lines, e.g.
+                       { "x": [ 100, 200 ] }
+        :returns: fresh python objects, the caller may change them
+        """
+        if self.raw is not None:
+            from smodels_utils.helper.various import cutPoints
+            return cutPoints ( copy.deepcopy ( self.raw ), ranges )
+        if self.points is not None: ## old format
+            if ranges is None:
+                ret = { c: self.points[c].tolist() for c in self.columns }
+                ret.update ( { k: copy.deepcopy(v) for k,v in self.extras.items() } )
+                return ret
+            stacked = np.column_stack ( [ self.points[c] for c in self.columns ] )
+            m = self.mask ( stacked, ranges, self.columns )
+            return { c: self.points[c][m].tolist() for c in self.columns }
+        ret = []
+        for line in self.lines:
+            if ranges is not None:
+                ## like cutPoints, lines are cut in x only
+                line = line[self.mask ( line, ranges, [ "x" ] )]
+                if len(line)==0:
+                    continue
+            ret.append ( [ dict ( zip ( self.columns, row ) ) for row in line.tolist() ] )
+        return ret
+
+class ExclusionLineStore:
+    """ the exclusion lines of one exclusion_lines.json file """
+
+    def __init__ ( self, jsonfile : os.PathLike ):
+        import json
+        self.jsonfile = jsonfile
+        with open ( jsonfile, "rt" ) as handle:
+            content = json.load ( handle )
+            handle.close()
+        self.curves = {} ## txname -> list of ExclusionLine, in file order
+        ## ( txname, "obs"/"exp"/None, ""/"P1"/"M1" ) -> list of ExclusionLine
+        self.index = {}
+        position = 0
+        for txn,co in content.items():
+            if type(co)!=dict: ## e.g. schema_version
+                continue
+            self.curves[txn] = []
+            for name,line in co.items():
+                curve = ExclusionLine ( txn, name, line, position )
+                position += 1
+                self.curves[txn].append ( curve )
+                key = ( txn, curve.kind, curve.variant )
+                if not key in self.index:
+                    self.index[key]=[]
+                self.index[key].append ( curve )
+
+    def txnames ( self ) -> List[str]:
+        return list ( self.curves.keys() )
+
+    def select ( self, txname : Union[str,None] = None,
+                 expected : bool = False, get_all : bool = False ) -> List:
+        """ select the curves by txname, observed/expected and +-1 sigma
+
+        :returns: list of ExclusionLine, in file order
+        """
+        txnames = self.txnames() if txname is None else [ txname ]
+        kinds = [ "exp" if expected else "obs", None ]
+        variants = [ "", "P1", "M1" ] if get_all else [ "" ]
+        ret = []
+        for txn in txnames:
+            for kind in kinds:
+                for variant in variants:
+                    ret += self.index.get ( ( txn, kind, variant ), [] )
+        ret.sort ( key = lambda c: c.position )
+        return ret
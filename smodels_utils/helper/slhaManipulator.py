@@ -59,28 +59,26 @@ def extractSLHAFileFromTarball ( slhafile, tarball=None, extractToDir=None ):
     else extract to cwd
     :returns: path to slhafile
     """
+    import os
     if tarball == None:
         p1 = -1
         while slhafile[p1+1].isalpha():
             p1 = slhafile.find("_",p1+1)
-        import os, tarfile
         from smodels_utils import SModelSUtils
         tarf = f"{slhafile[:p1]}.tar.gz"
         tarball = os.path.join ( SModelSUtils.installDirectory(), "slha", tarf )
-    if not os.path.exists ( tarball ): ## no tarball!
+    from smodels_utils.helper.tarballIndex import getIndexedTarball
+    tar = getIndexedTarball ( tarball )
+    if tar is None: ## no tarball!
         print ( f"[slhaManipulator] tarball {tarball} does not exist!" )
         return None
-    tar = tarfile.open ( tarball, "r:gz" )
-    fobj = tar.extractfile ( slhafile )
-    txt = fobj.read()
+    targetdir = "."
+    if extractToDir != None:
+        targetdir = extractToDir
+    tar.extract ( slhafile, targetdir )
     targetfile = slhafile
     if extractToDir != None:
         targetfile = f"{extractToDir}/{slhafile}"
-    with open ( targetfile, "wt" ) as f:
-        f.write ( txt.decode("ascii") )
-        f.close()
-    tar.close()
-
     return targetfile
 
 def removeXSecs ( In, Out=None ):
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: tarballIndex
+    :synopsis: random access to the members of (gzipped) tarballs, e.g. the
+               SLHA tarballs of the validation. A tarball is repacked once,
+               in a single streaming pass, into a sidecar <tarball>.pack file,
+               where every member is compressed individually and an index
+               holds the offsets, so that any single member can be read
+               with one seek. The pack is rebuilt whenever the tarball
+               changes.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import tarfile
+from typing import Union, List, Dict
+
+magic = b"SLHAPACK"
+## the trailer of a pack: offset of the index, then the magic
+_trailer = struct.Struct ( "<Q8s" )
+_tarballs = {} ## abspath -> IndexedTarball, per process
+
+def getIndexedTarball ( tarball : os.PathLike ):
+    """ the IndexedTarball of tarball, created only once per process
+
+    :returns: IndexedTarball, None if the tarball does not exist
+    """
+    if not os.path.exists ( tarball ):
+        return None
+    path = os.path.abspath ( tarball )
+    if not path in _tarballs:
+        _tarballs[path] = IndexedTarball ( path )
+    ret = _tarballs[path]
+    ret.refresh()
+    return ret
+
+def defaultPackFile ( tarball : os.PathLike ) -> str:
+    """ <tarball>.pack, if the directory of the tarball is writable,
+    else a file in ~/.cache/smodels-utils/tarballs/ """
+    path = os.path.abspath ( tarball )
+    if os.access ( os.path.dirname ( path ), os.W_OK ):
+        return f"{path}.pack"
+    cachedir = os.path.join ( os.path.expanduser ( "~" ), ".cache",
+                              "smodels-utils", "tarballs" )
+    os.makedirs ( cachedir, exist_ok = True )
+    h = hashlib.sha1 ( path.encode() ).hexdigest()[:10]
+    return os.path.join ( cachedir, f"{os.path.basename(path)}.{h}.pack" )
+
+class IndexedTarball:
+    """ a tarball with an index, for reading single members in O(1) """
+
+    def __init__ ( self, tarball : os.PathLike,
+                   packfile : Union[None,str] = None ):
+        """
+        :param tarball: path to the tarball
+        :param packfile: path to the sidecar pack, if None then
+                         <tarball>.pack (see defaultPackFile)
+        """
+        self.tarball = os.path.abspath ( tarball )
+        if packfile is None:
+            packfile = defaultPackFile ( self.tarball )
+        self.packfile = packfile
+        self.fd = None
+        self.members = {} ## name -> ( offset, compressed size, size )
+        self.source = None
+        self.refresh()
+
+    def sourceInfo ( self ) -> Dict:
+        stat = os.stat ( self.tarball )
+        return { "size": stat.st_size, "mtime_ns": stat.st_mtime_ns }
+
+    def refresh ( self ):
+        """ (re-)open the pack, rebuild it if it is missing or outdated """
+        source = self.sourceInfo()
+        if self.fd is not None and source == self.source:
+            return
+        self.close()
+        if not self.load ( source ):
+            self.build()
+            if not self.load ( source ):
+                raise OSError ( f"could not create index of {self.tarball}" )
+
+    def load ( self, source : Dict ) -> bool:
+        """ open the pack, if it exists and was made from source
+
+        :returns: true, if successful
+        """
+        if not os.path.exists ( self.packfile ):
+            return False
+        fd = os.open ( self.packfile, os.O_RDONLY )
+        try:
+            end = os.fstat ( fd ).st_size
+            if end < _trailer.size:
+                raise ValueError ( "too short" )
+            offset, m = _trailer.unpack ( os.pread ( fd, _trailer.size,
+                                          end - _trailer.size ) )
+            if m != magic:
+                raise ValueError ( "not a pack" )
+            index = json.loads ( os.pread ( fd, end - _trailer.size - offset,
+                                 offset ) )
+        except (ValueError,struct.error) as e:
+            os.close ( fd )
+            return False
+        if index["source"] != source:
+            os.close ( fd )
+            return False
+        self.fd = fd
+        self.source = source
+        self.members = { k: tuple(v) for k,v in index["members"].items() }
+        return True
+
+    def build ( self ):
+        """ repack the tarball, streaming through it once """
+        tmpfile = f"{self.packfile}.{os.getpid()}.tmp"
+        source = self.sourceInfo()
+        members = {}
+        offset = 0
+        with open ( tmpfile, "wb" ) as f, \
+             tarfile.open ( self.tarball, "r|*" ) as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                data = tar.extractfile ( member ).read()
+                blob = zlib.compress ( data, 6 )
+                f.write ( blob )
+                members[member.name] = ( offset, len(blob), len(data) )
+                offset += len(blob)
+            index = { "source": source, "members": members }
+            f.write ( json.dumps ( index ).encode() )
+            f.write ( _trailer.pack ( offset, magic ) )
+        os.replace ( tmpfile, self.packfile ) ## atomic, for concurrent jobs
+
+    def close ( self ):
+        if self.fd is not None:
+            os.close ( self.fd )
+        self.fd = None
+
+    def names ( self ) -> List[str]:
+        """ the names of the (file) members, in the order of the tarball """
+        return list ( self.members.keys() )
+
+    def __contains__ ( self, name : str ) -> bool:
+        return name in self.members
+
+    def __len__ ( self ) -> int:
+        return len ( self.members )
+
+    def read ( self, name : str ) -> bytes:
+        """ the content of member name
+
+        :raises KeyError: if there is no such member
+        """
+        offset, csize, size = self.members[name]
+        return zlib.decompress ( os.pread ( self.fd, csize, offset ) )
+
+    def extract ( self, name : str, todir : os.PathLike = "." ) -> str:
+        """ write member name into directory todir
+
+        :returns: path to the extracted file
+        """
+        path = os.path.join ( todir, name )
+        dirname = os.path.dirname ( path )
+        if dirname != "":
+            os.makedirs ( dirname, exist_ok = True )
+        with open ( path, "wb" ) as f:
+            f.write ( self.read ( name ) )
+        return path
+
+    def extractMany ( self, names : Union[None,List[str]] = None,
+                      todir : os.PathLike = ".",
+                      skipExisting : bool = False ) -> int:
+        """ write many members into directory todir
+
+        :param names: the members to write, if None then all
+        :param skipExisting: do not overwrite files that already exist
+        :returns: number of files written
+        """
+        if names is None:
+            names = self.names()
+        n = 0
+        for name in names:
+            if skipExisting and os.path.exists ( os.path.join ( todir, name ) ):
+                continue
+            self.extract ( name, todir )
+            n += 1
+        return n
+
+if __name__ == "__main__":
+    import argparse
+    argparser = argparse.ArgumentParser(description =
+        'build (or check) the index of tarballs' )
+    argparser.add_argument ( 'tarballs', nargs = '+', help = 'the tarballs' )
+    args = argparser.parse_args()
+    for tarball in args.tarballs:
+        t = getIndexedTarball ( tarball )
+        if t is None:
+            print ( f"[tarballIndex] {tarball} does not exist" )
+            continue
+        print ( f"[tarballIndex] {tarball}: {len(t)} members in {t.packfile}" )
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: txnameGrid
+    :synopsis: fast reader of the data grids (upperLimits, expectedUpperLimits,
+               efficiencyMap) of txname.txt files. The file is streamed up to
+               the end of the requested block only, the grid is tokenized with
+               plain string operations (regular expressions only for mixed
+               units), and returned as numpy arrays of
+               masses and values, together with the units and the layout of
+               the points (branches, tuples with widths). Nothing is eval'ed.
+               Grids are kept per process, and read again only if the file
+               changes.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import os
+import re
+import numpy as np
+from typing import Union, List, Dict
+
+## a number, optionally followed by *unit, e.g. 1.5640E+02*GeV
+_number = re.compile ( r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?:\*([A-Za-z]+))?" )
+## factors of the mass units, to GeV
+massUnits = { "": 1., "GeV": 1., "TeV": 1e3, "MeV": 1e-3, "keV": 1e-6 }
+## factors of the value units, to fb
+valueUnits = { "fb": 1., "pb": 1e3, "ab": 1e-3, "nb": 1e6 }
+_delimiters = str.maketrans ( "[](),", "     " )
+_numerals = str.maketrans ( "", "", "0123456789.eE+-" )
+_grids = {} ## ( abspath, tag ) -> ( mtime, TxnameGrid )
+
+def gridTag ( dataType : str, expected : bool = False ) -> str:
+    """ the tag of the data grid in the txname.txt file
+
+    :param dataType: upperLimit or efficiencyMap
+    :param expected: if true, the expected upper limits
+    """
+    if dataType == "efficiencyMap":
+        return "efficiencyMap"
+    if expected:
+        return "expectedUpperLimits"
+    return "upperLimits"
+
+def readGridString ( path : os.PathLike, tag : str ) -> Union[None,str]:
+    """ stream through a txname.txt file, up to the end of the block tag.
+    follows the conventions of the database: a line that ends with "," or
+    "\\", or that is followed by an indented line, continues in the next.
+
+    :returns: the value of tag, without the tag, None if there is no such tag
+    """
+    block, more = None, False
+    with open ( path, "rt" ) as f:
+        for line in f:
+            p1 = line.find ( "#" )
+            if p1 == 0 or ( p1 > 0 and line[p1-1] != "\\" ):
+                line = line[:p1]
+            line = line.rstrip()
+            if line == "":
+                continue
+            if block is not None:
+                if not more and not line[0] in [ " ", "\t", "}" ]:
+                    break
+                block.append ( line )
+            elif line.split ( ":", 1 )[0].strip() == tag:
+                block = [ line.split ( ":", 1 )[1] ]
+            else:
+                continue
+            more = line[-1] in [ ",", "\\" ]
+            if line[-1] == "\\":
+                block[-1] = block[-1][:-1]
+    if block is None:
+        return None
+    return "".join ( block )
+
+class TxnameGrid:
+    """ the data grid of a txname, as numpy arrays """
+
+    def __init__ ( self, masses : np.ndarray, values : np.ndarray,
+                   valueUnit : Union[None,str], layout : str,
+                   tag : Union[None,str] = None ):
+        """
+        :param masses: array of shape ( npoints, ncolumns ), in GeV. every row
+                       is a point, flattened in the order of the file, widths
+                       (the second entries of tuples) in place
+        :param values: array of shape ( npoints ), in units of valueUnit
+        :param valueUnit: fb, pb, ..., None for efficiencies
+        :param layout: the layout of the masses of a point, with # for the
+                       numbers, e.g. [[#,#],[(#,#),#]]
+        """
+        self.masses = masses
+        self.values = values
+        self.massUnit = "GeV"
+        self.valueUnit = valueUnit
+        self.layout = layout
+        self.tag = tag
+        self.widthColumns = [] ## the columns that hold widths
+        column, inTuple = 0, False
+        for c in layout:
+            if c == "(":
+                inTuple, first = True, True
+            elif c == ")":
+                inTuple = False
+            elif c == "#":
+                if inTuple and not first:
+                    self.widthColumns.append ( column )
+                first = False
+                column += 1
+
+    def __len__ ( self ) -> int:
+        return len ( self.values )
+
+    def __str__ ( self ) -> str:
+        return f"{self.tag}: {len(self)} points of {self.layout}, {self.valueUnit}"
+
+    def nested ( self, i : int, withUnits : bool = False ) -> List:
+        """ the masses of point i, in the nested layout of the file
+
+        :param withUnits: if true, multiply with GeV
+        """
+        row = self.masses[i].tolist()
+        if withUnits:
+            from smodels.base.physicsUnits import GeV
+            row = [ m*GeV for m in row ]
+        stack, column = [ [] ], 0
+        for c in self.layout:
+            if c in [ "[", "(" ]:
+                stack.append ( [] )
+            elif c == "]":
+                current = stack.pop()
+                stack[-1].append ( current )
+            elif c == ")":
+                current = stack.pop()
+                stack[-1].append ( tuple ( current ) )
+            elif c == "#":
+                stack[-1].append ( row[column] )
+                column += 1
+        return stack[0][0]
+
+    def unit ( self ):
+        """ the unit of the values, as smodels unit, 1. for efficiencies """
+        if self.valueUnit is None:
+            return 1.
+        from smodels.base import physicsUnits
+        if hasattr ( physicsUnits, self.valueUnit ):
+            return getattr ( physicsUnits, self.valueUnit )
+        return valueUnits[self.valueUnit] * physicsUnits.fb
+
+    def value ( self, i : int, withUnits : bool = False ):
+        """ the value of point i
+
+        :param withUnits: if true, multiply with the unit of the file
+        """
+        ret = float ( self.values[i] )
+        if withUnits and self.valueUnit is not None:
+            ret = ret * self.unit()
+        return ret
+
+    def point ( self, i : int, withUnits : bool = False ) -> List:
+        """ point i as in the file, [ masses, value ] """
+        return [ self.nested ( i, withUnits ), self.value ( i, withUnits ) ]
+
+    def unique ( self, keepLargest : bool = True ):
+        """ the grid without repeated masses, sorted by the masses, like
+        databaseCreation.removeRepeated
+
+        :param keepLargest: keep the largest value of repeated masses, else
+                            the smallest (for efficiencies)
+        :returns: new TxnameGrid
+        """
+        sign = -1. if keepLargest else 1.
+        ## sort by the masses, the first column being the most significant,
+        ## then by the value
+        order = np.lexsort ( [ sign * self.values ] + \
+                [ self.masses[::,j] for j in range(self.masses.shape[1]-1,-1,-1) ] )
+        masses = self.masses[order]
+        keep = np.ones ( len(order), dtype=bool )
+        keep[1:] = np.any ( masses[1:] != masses[:-1], axis=1 )
+        return TxnameGrid ( masses[keep], self.values[order][keep],
+                            self.valueUnit, self.layout, self.tag )
+
+def _firstPoint ( data : str, tag : Union[None,str] ) -> str:
+    """ the layout of the first point of data, [ masses, value ],
+    with # for the numbers, e.g. [[#,#],#] """
+    if data[:2] != "[[":
+        raise ValueError ( f"{tag} is not a data grid" )
+    depth = 0
+    for end,c in enumerate ( data[1:] ):
+        if c in [ "[", "(" ]:
+            depth += 1
+        elif c in [ "]", ")" ]:
+            depth -= 1
+        if depth == 0:
+            break
+    ret = _number.sub ( "#", data[1:end+2] )
+    if not ret.endswith ( ",#]" ):
+        raise ValueError ( f"cannot understand the points of {tag}: {ret}" )
+    return ret
+
+def _checkLayout ( skeleton : str, first : str, nnumbers : int,
+                   tag : Union[None,str], numerals : bool = True ) -> int:
+    """ check that skeleton consists of points that all look like first
+
+    :param nnumbers: the number of numbers in the grid
+    :param numerals: if false, then the numbers were removed from the
+                     skeleton, instead of being replaced by #
+    :returns: the number of points
+    """
+    ncolumns = first.count ( "#" )
+    npoints = nnumbers // ncolumns
+    point = first if numerals else first.replace ( "#", "" )
+    if npoints * ncolumns != nnumbers or \
+            skeleton != "[" + ",".join ( [ point ] * npoints ) + "]":
+        raise ValueError ( f"the points of {tag} do not all look like {first}" )
+    return npoints
+
+def _parseUniform ( data : str, first : str,
+                    tag : Union[None,str] ) -> Union[None,TxnameGrid]:
+    """ the fast track for the usual grids: masses in GeV, values all in the
+    same unit (or without unit). no regular expressions, only string
+    operations and numpy.
+
+    :returns: None, if the grid has other units
+    """
+    x = data.replace ( "*GeV", "" )
+    valueUnit = None
+    for unit in valueUnits:
+        if f"*{unit}" in x:
+            if valueUnit is not None:
+                return None
+            valueUnit = unit
+    if valueUnit is not None:
+        nunits = x.count ( f"*{valueUnit}" )
+        x = x.replace ( f"*{valueUnit}", "" )
+    if "*" in x:
+        return None
+    numbers = np.array ( x.translate ( _delimiters ).split(), dtype=float )
+    npoints = _checkLayout ( x.translate ( _numerals ), first, len(numbers),
+                             tag, numerals = False )
+    if valueUnit is not None and nunits != npoints:
+        return None
+    numbers = numbers.reshape ( npoints, -1 )
+    return TxnameGrid ( numbers[::,:-1], numbers[::,-1], valueUnit,
+                        first[1:-3], tag )
+
+def _parseTokens ( data : str, first : str, tag : Union[None,str] ) -> TxnameGrid:
+    """ the general track: tokenize number by number, any units """
+    tokens = _number.findall ( data )
+    npoints = _checkLayout ( _number.sub ( "#", data ), first, len(tokens), tag )
+    tokens = np.array ( tokens, dtype=str ).reshape ( npoints, -1, 2 )
+    numbers = tokens[::,::,0].astype ( float )
+    masses, values = numbers[::,:-1], numbers[::,-1]
+    units, inverse = np.unique ( tokens[::,:-1,1], return_inverse = True )
+    for unit in units:
+        if not unit in massUnits:
+            raise ValueError ( f"unknown mass unit {unit} in {tag}" )
+    factors = np.array ( [ massUnits[u] for u in units ] )
+    masses = masses * factors[inverse].reshape ( masses.shape )
+    units, inverse = np.unique ( tokens[::,-1,1], return_inverse = True )
+    valueUnit = units[0] if units[0] != "" else None
+    if len(units)>1: ## mixed units, we go with fb
+        if "" in units or any ( [ not u in valueUnits for u in units ] ):
+            raise ValueError ( f"inconsistent value units {', '.join(units)} in {tag}" )
+        factors = np.array ( [ valueUnits[u] for u in units ] )
+        values = values * factors[inverse.reshape(-1)]
+        valueUnit = "fb"
+    elif valueUnit is not None and not valueUnit in valueUnits:
+        raise ValueError ( f"unknown value unit {valueUnit} in {tag}" )
+    return TxnameGrid ( masses, values, valueUnit, first[1:-3], tag )
+
+def parseGrid ( string : str, tag : Union[None,str] = None ) -> TxnameGrid:
+    """ tokenize the value of a data grid, e.g.
+    [[[[500*GeV,100*GeV],[500*GeV,100*GeV]],1.2*fb], ...]
+
+    :param tag: the tag, only for the record
+    :raises ValueError: if the points do not all have the same layout, or
+                        if the units are unknown
+    """
+    data = "".join ( string.split() )
+    first = _firstPoint ( data, tag )
+    grid = _parseUniform ( data, first, tag )
+    if grid is None:
+        grid = _parseTokens ( data, first, tag )
+    return grid
+
+def getGrid ( path : os.PathLike, tag : str = "upperLimits" ) -> Union[None,TxnameGrid]:
+    """ the grid tag of txname.txt file path, read from disk only if needed.
+    the grids are shared, so do not change the returned object!
+
+    :returns: TxnameGrid, None if there is no such tag
+    :raises ValueError: if the grid cannot be parsed
+    """
+    path = os.path.abspath ( path )
+    mtime = os.stat ( path ).st_mtime_ns
+    key = ( path, tag )
+    if key in _grids and _grids[key][0] == mtime:
+        return _grids[key][1]
+    string = readGridString ( path, tag )
+    grid = None
+    if string is not None:
+        grid = parseGrid ( string, tag )
+    _grids[key] = ( mtime, grid )
+    return grid
+
+if __name__ == "__main__":
+    import argparse, time
+    argparser = argparse.ArgumentParser(description =
+        'read the data grids of txname.txt files' )
+    argparser.add_argument ( 'files', nargs = '+', help = 'the txname.txt files' )
+    argparser.add_argument ( '-t', '--tag', help = 'the grid [upperLimits]',
+                             type = str, default = "upperLimits" )
+    args = argparser.parse_args()
+    for path in args.files:
+        t0 = time.time()
+        grid = getGrid ( path, args.tag )
+        print ( f"[txnameGrid] {path}: {grid} ({time.time()-t0:.3f}s)" )
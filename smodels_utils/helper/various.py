@@ -321,7 +321,8 @@ def getExclusionCurvesForV2(jsonfile,txname=None,axes=None, get_all=False,
             and the values are the respective dictionaries of coordinates.
     """
 
-    import json
+    from smodels_utils.helper.exclusionLineStore import getStore, \
+         axesMatchV2
     if not os.path.isfile(jsonfile):
         logger.error( f"json file {jsonfile} not found" )
         oldVersion = jsonfile.replace("exclusion_lines.json","exclusions.json")
@@ -330,21 +331,12 @@ def getExclusionCurvesForV2(jsonfile,txname=None,axes=None, get_all=False,
             logger.warning( f"found an old {jsonfile}, trying with that" )
         else:
             return None
-
-    with open ( jsonfile, "rt" ) as handle:
-        content = json.load ( handle )
-        handle.close()
+    store = getStore ( jsonfile )
 
     ret = {}
     maxes = axes
     if maxes != None:
         maxes = axes.replace(" ","").strip()
-    from sympy import var
-    x,y,z,w = var('x y z w')
-    caxes = eval ( maxes )
-    if type(caxes)==dict:
-        from smodels_utils.dataPreparation.graphMassPlaneObjects import GraphMassPlane
-        maxes = GraphMassPlane.getNiceAxes ( maxes )
     exp = "obs"
     if expected:
         exp = "exp"
@@ -354,28 +346,19 @@ def getExclusionCurvesForV2(jsonfile,txname=None,axes=None, get_all=False,
                    f"{exp}ExclusionM1_{maxes}" ]
 
     for cname in cnames:
-        for txn,co in content.items():
+        prefix = cname[:cname.find("_")]
+        for txn in store.txnames():
             if txname != None and txn != txname:
                 continue
-            for axis,points in co.items():
-                points = cutPoints ( points, ranges )
-                p1 = axis.find("_")
-                constr = axis[p1+1:]
-                caxis = constr # eval(constr)
-                try:
-                    caxis = eval(constr) # for SModelS v2 axes
-                except SyntaxError as e:
-                    # for SModelS v3 axes
-                    caxes = GraphMassPlane.getNiceAxes ( axes )
-                if maxes != None and caxis != caxes: # cname != axis:
+            for curve in store.curves[txn]:
+                if maxes != None and not axesMatchV2 ( curve.axes, maxes ):
                     continue
-                # tgraph = exclusionCurveToTGraph ( points, cname )
                 if not txn in ret:
                     ret[txn]=[]
                     if dicts:
                         ret[txn]={}
-                p2 = cname.find("_")
-                if axis[:p1] == cname[:p2]:
+                if curve.prefix == prefix:
+                    points = curve.getPoints ( ranges )
                     if dicts:
                         ret[txn][cname]= points
                     else:
@@ -416,112 +399,42 @@ def getExclusionCurvesFor(jsonfile : os.PathLike , txname : Union[str,None]=None
         return getExclusionCurvesForV2 ( jsonfile, txname, axes, get_all, expected,
                 dicts, ranges )
 
-    import json
+    from smodels_utils.helper.exclusionLineStore import getStore, \
+         axesMatchV3
     if not os.path.isfile(jsonfile):
         logger.error( f"json file {jsonfile} not found" )
         return None
-
-    with open ( jsonfile, "rt" ) as handle:
-        content = json.load ( handle )
-        handle.close()
+    store = getStore ( jsonfile )
 
     ret = {}
     maxes = axes
     if maxes != None:
         maxes = axes.replace(" ","").strip()
-    from sympy import var
-    x,y,z,w = var('x y z w')
-    caxes = eval ( maxes )
-    from smodels_utils.dataPreparation.graphMassPlaneObjects import GraphMassPlane
-    maxes = GraphMassPlane.getNiceAxes ( maxes )
-
-    def match ( name : str ) -> bool:
-        """ do we want an exclusion line with this name?
-        :param name: e.g. obsExclusionP1_0
-        """
-        if expected and name.startswith ( "obs" ):
-            return False
-        if not expected and name.startswith ( "exp" ):
-            return False
-        if not get_all and "ExclusionP1" in name:
-            return False
-        if not get_all and "ExclusionM1" in name:
-            return False
-        return True
 
     def axisMatch ( jsonDict : dict ) -> bool:
         """ see if the axes match """
         convertedDict = {}
         for k,v in jsonDict.items():
             convertedDict[int(k)]=v
-        return convertedDict == caxes
-
-    def axisDescriptionsMatchV3 ( name : str, caxes : Dict ) -> bool:
-        """ do these match? v3 version!
-        :param name: e.g. obsExclusion_{0:'x',1:'y',2:'y'}
-        :param caxes: e.g. {0: 'x', 1: '0.5*x+0.5*y', 2: 'y', 3: 'x',
-        4: '0.5*x+0.5*y', 5: 'y'}
-        :returns: match or no match
-        """
-        p1 = name.find("_")
-        axes = eval ( name[p1+1:] )
-        return axes == caxes
-
-    def axisDescriptionsMatch ( name : str, caxes : Dict ) -> bool:
-        """ do these match?
-        :param name: e.g. obsExclusion_[[x,y,60.0],[x,y,60.0]]
-        :param caxes: e.g. {0: 'x', 1: '0.5*x+0.5*y', 2: 'y', 3: 'x',
-        4: '0.5*x+0.5*y', 5: 'y'}
-        :returns: match or no match
-        """
-        if "{" in name: ## we have a type v3 axis name!!
-            return axisDescriptionsMatchV3 ( name, caxes )
-        p1 = name.find("_")
-        axisInName = eval ( name[p1+1:] )
-        def flatten ( nested : List ) -> List:
-            temp = [item for row in axisInName for item in row]
-            ret = []
-            last = []
-            for t in temp:
-                if type(t) in [ tuple ]:
-                    ret.append ( t[0] )
-                    last.append ( t[1] )
-                else:
-                    ret.append ( t )
-            for t in last:
-                ret.append ( t )
-            return ret
-        flattened = flatten ( axisInName )
-
-        import sympy
-        x,y,z,w = sympy.var('x y z w')
-        for k,v in caxes.items():
-            e1 = sympy.parse_expr ( str(v) )
-            e2 = sympy.parse_expr ( str(flattened[k]) )
-            if e1 != e2:
-                return False
-        return True
+        from smodels_utils.helper.exclusionLineStore import evalAxes
+        return convertedDict == evalAxes ( maxes )
 
-    for txn,co in content.items():
-        if txname != None and txn != txname:
+    for curve in store.select ( txname, expected, get_all ):
+        txn, name = curve.txname, curve.name
+        if maxes != None and not axesMatchV3 ( curve.axes, maxes ):
             continue
-        for name,line in co.items():
-            if not match ( name ):
-                continue
-            if not axisDescriptionsMatch ( name, caxes ):
-                continue
-            if "axisMap" in line and not axisMatch ( line["axisMap"] ):
-                continue
-            points = cutPoints ( line, ranges )
-            if not txn in ret:
-                ret[txn]=[]
-                if dicts:
-                    ret[txn]={}
+        if "axisMap" in curve.extras and not axisMatch ( curve.extras["axisMap"] ):
+            continue
+        points = curve.getPoints ( ranges )
+        if not txn in ret:
+            ret[txn]=[]
             if dicts:
-                ret[txn][name]= points
-            else:
-                ret[txn].append( { "points": points, "name": name } )
-        return ret
+                ret[txn]={}
+        if dicts:
+            ret[txn][name]= points
+        else:
+            ret[txn].append( { "points": points, "name": name } )
+    return ret
 
 def mergeExclusionLines ( lines : list ):
     """ given a list of lines, merge them correctly
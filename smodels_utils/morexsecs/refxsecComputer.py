@@ -34,6 +34,66 @@ except:
 
 hasComplained = {}
 
+class XSecTable ( dict ):
+    """
+    A reference cross section table, as a dictionary of masses as keys and
+    cross sections as values. Additionally holds the table as numpy arrays,
+    and the interpolator, which is built only once.
+    """
+    def __init__ ( self, xsecs : dict ):
+        super().__init__ ( xsecs )
+        self._arrays = None
+        self._interpolator = None
+
+    def arrays ( self ):
+        """ the masses and the cross sections, as numpy arrays
+        :returns: masses of shape (n,) or (n,dims), xsecs of shape (n,)
+        """
+        if self._arrays is None:
+            import numpy as np
+            masses = []
+            for k in self.keys():
+                if type(k) == tuple:
+                    masses.append ( tuple ( float(v) for v in k ) )
+                else:
+                    masses.append ( float(k) )
+            self._arrays = ( np.array ( masses ), np.array ( list ( self.values() ) ) )
+        return self._arrays
+
+    def interpolator ( self ):
+        """ the interpolator, interp1d for one dimension, linear
+        interpolation on the triangulation for non-degenerate grids,
+        i.e. the same as griddata, but built once """
+        if self._interpolator is None:
+            masses, xsecs = self.arrays()
+            if len(masses.shape)==1:
+                from scipy.interpolate import interp1d
+                self._interpolator = interp1d ( masses, xsecs )
+            else:
+                from scipy.interpolate import LinearNDInterpolator
+                self._interpolator = LinearNDInterpolator ( masses, xsecs )
+        return self._interpolator
+
+    def interpolateMany ( self, masses ):
+        """ interpolate for many masses at once
+
+        :param masses: array of shape (n,) or (n,dims)
+        :returns: array of cross sections, nan if outside of the table
+        """
+        import numpy as np
+        masses = np.asarray ( masses, dtype=float )
+        table, _ = self.arrays()
+        if len(table.shape)==1:
+            masses = masses.reshape ( len(masses) )
+            ret = np.full ( len(masses), np.nan )
+            inside = ( masses >= table.min() ) & ( masses <= table.max() )
+            ret[inside] = self.interpolator()( masses[inside] )
+            return ret
+        return self.interpolator()( masses )
+
+## the tables, read once per process, with path, pb and columns as keys
+_xsecTables = {}
+
 class RefXSecComputer:
     """
     The xsec computer that simply looks up reference cross sections,
@@ -576,14 +636,64 @@ class RefXSecComputer:
         if self.outOfBounds ( mass, xsecks ):
             return None
         if type(mass)==float:
+            if isinstance ( xsecs, XSecTable ):
+                return xsecs.interpolator()( mass )
             from scipy.interpolate import interp1d
             return interp1d ( xsecks, list(xsecs.values()) )( mass )
+        if isinstance ( xsecs, XSecTable ):
+            return xsecs.interpolator()( mass )
         from scipy.interpolate import griddata
         ret = griddata ( xsecks, list(xsecs.values()), mass )
         return ret
 
+    def interpolateMany ( self, masses, xsecs ):
+        """ interpolate between masses, for many mass points at once
+
+        :param masses: array of masses, of shape (n,) or (n,dims)
+        :param xsecs: the table, as returned by getXSecsFrom
+        :returns: array of xsecs, nan for mass points outside of the table
+        """
+        if not isinstance ( xsecs, XSecTable ):
+            xsecs = XSecTable ( xsecs )
+        return xsecs.interpolateMany ( masses )
+
+    def computeMany ( self, sqrts, pid1, pid2, masses, ewk = "wino" ):
+        """ the reference cross sections of one production channel, for many
+        mass points at once, e.g. for a whole grid of slha files.
+
+        :param pid1, pid2: pids of the channel. pid2 is None for s-channel
+        :param masses: array of the masses of the two particles, of shape
+                       (n,2), or of shape (n,) if both masses are the same
+        :returns: array of cross sections in pb, nan where there is none
+        """
+        import numpy as np
+        masses = np.asarray ( masses, dtype=float )
+        if len(masses.shape)==1:
+            masses = np.stack ( [ masses, masses ], axis=1 )
+        ret = np.full ( len(masses), np.nan )
+        ## which table to use may depend on the masses, e.g. for
+        ## non-degenerate ewkinos, so we first group the points by tables
+        groups = {}
+        for i,mass in enumerate ( masses ):
+            m = ( float(mass[0]), float(mass[1]) if pid2 is not None else None )
+            xsecs,_,_ = self.getXSecsFor ( pid1, pid2, sqrts, ewk, m )
+            if xsecs in [ None, {} ]:
+                continue
+            table = xsecs.arrays()[0]
+            ndims = 1 if len(table.shape)==1 else table.shape[1]
+            key = ( id(xsecs), ndims )
+            if not key in groups:
+                groups[key] = ( xsecs, [] )
+            groups[key][1].append ( i )
+        for (_,ndims),(xsecs,indices) in groups.items():
+            indices = np.array ( indices )
+            points = masses[indices,0] if ndims == 1 else masses[indices][:,:ndims]
+            ret[indices] = xsecs.interpolateMany ( points )
+        return ret
+
     def getXSecsFrom ( self, path, pb = True, columns={"mass":0,"xsec":1 } ):
-        """ retrieve xsecs from filename
+        """ retrieve xsecs from filename. every table is read only once
+        per process, do not modify the returned table.
         :param pb: xsecs given in pb
         :param indices: the indices of the columns in the table, for mass and xsec
         """
@@ -591,6 +701,10 @@ class RefXSecComputer:
         if not os.path.exists ( path ):
             logger.info ( f"could not find {path}" )
             return ret
+        key = ( os.path.abspath ( path ), os.stat ( path ).st_mtime, pb,
+                str(columns) )
+        if key in _xsecTables:
+            return _xsecTables[key]
         logger.info ( f"getting xsecs from {path}" )
         f = open ( path, "rt" )
         lines=f.readlines()
@@ -619,6 +733,8 @@ class RefXSecComputer:
             if not pb:
                 xsec = xsec / 1000.
             ret[ mass ] = xsec
+        ret = XSecTable ( ret )
+        _xsecTables[key] = ret
         return ret
 
     def getXSecsFor ( self, pid1, pid2, sqrts, ewk, masses ):
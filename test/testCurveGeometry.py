@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testCurveGeometry
+   :synopsis: Tests the completion of the official exclusion curves, and
+              which points end up inside them, against hand-checked points.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys
+import numpy as np
+sys.path.insert(0, os.path.join ( os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "validation" ) )
+from curveGeometry import completeVertices, PreparedCurve
+
+class CurveGeometryTest(unittest.TestCase):
+    def curve ( self, x, y ):
+        return { "points": { "x": x, "y": y } }
+
+    def testVertical ( self ):
+        """ a curve that starts and ends steep gets closed via the x-axis """
+        curve = self.curve ( [ 600, 650, 800, 1200, 1600, 1900, 1800, 1500 ],
+                             [ 0, 100, 300, 600, 800, 800, 1100, 1400 ] )
+        polygon = PreparedCurve ( curve )
+        self.assertEqual ( polygon.vertices[:2].tolist(), [ [ 600., 0. ], [ 600., 0. ] ] )
+        self.assertEqual ( polygon.vertices[-3:].tolist(),
+                           [ [ 1500., 1400. ], [ 1500., 0. ], [ 0., 0. ] ] )
+        ## below the curve: inside, only with the completed tail
+        inside = [ [ 1300., 500. ], [ 1000., 200. ], [ 1700., 900. ] ]
+        ## above the curve, and beyond it
+        outside = [ [ 700., 500. ], [ 1400., 1350. ], [ 2000., 500. ], [ 300., 300. ] ]
+        self.assertEqual ( polygon.contains ( inside ).tolist(), [ True ] * 3 )
+        self.assertEqual ( polygon.contains ( outside ).tolist(), [ False ] * 4 )
+        uncompleted = PreparedCurve ( curve, complete = False )
+        self.assertEqual ( uncompleted.contains ( inside ).tolist(), [ False, False, True ] )
+
+    def testHorizontal ( self ):
+        """ a flat curve gets closed via the y-axis, at both ends """
+        xy = np.array ( [ [ 100., 500. ], [ 200., 520. ], [ 300., 540. ],
+                          [ 400., 560. ], [ 500., 580. ] ] )
+        vertices = completeVertices ( xy )
+        self.assertEqual ( vertices.tolist(), [ [ 0., 500. ] ] + xy.tolist() + \
+                           [ [ 0., 580. ], [ 0., 0. ] ] )
+
+    def testFalling ( self ):
+        """ a flat but falling tail gets closed via the x-axis """
+        xy = np.array ( [ [ 0., 800. ], [ 200., 790. ], [ 400., 780. ],
+                          [ 600., 700. ], [ 800., 650. ] ] )
+        vertices = completeVertices ( xy )
+        self.assertEqual ( vertices[-2:].tolist(), [ [ 800., 0. ], [ 0., 0. ] ] )
+
+    def testClosed ( self ):
+        """ curves that are closed already, and short ones, stay as they are """
+        xy = np.array ( [ [ 0., 0. ], [ 100., 0. ], [ 100., 100. ], [ 0., 100. ], [ 1., 1. ] ] )
+        self.assertEqual ( completeVertices ( xy ).tolist(), xy.tolist() )
+        self.assertEqual ( completeVertices ( xy[:3] ).tolist(), xy[:3].tolist() )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testExclusionLineStore
+   :synopsis: Tests the exclusion line store, in particular that cutting
+              the points at ranges gives what cutPoints gives.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys, copy, json, tempfile, shutil
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smodels_utils.helper.exclusionLineStore import ExclusionLine, getStore
+from smodels_utils.helper.various import cutPoints
+
+class ExclusionLineStoreTest(unittest.TestCase):
+    def lines ( self, columns, nlines = 3 ):
+        """ random exclusion lines, in the format of exclusion_lines.json """
+        rng = np.random.default_rng ( 7 )
+        ret = []
+        for i in range(nlines):
+            pts = rng.uniform ( 0., 1000., ( 20, len(columns) ) ).round ( 1 )
+            ret.append ( [ dict ( zip ( columns, map ( float, pt ) ) ) for pt in pts ] )
+        return ret
+
+    def ranges ( self ):
+        return [ None, { "x": [ 200., 700. ] }, { "y": [ 100., 300. ] },
+                 { "x": [ 200., 700. ], "y": [ 100., 300. ] },
+                 { "x": [ 2000., 3000. ] } ]
+
+    def compare ( self, content ):
+        curve = ExclusionLine ( "T1", "obsExclusion_[[x,y],[x,y]]", content, 0 )
+        self.assertIsNone ( curve.raw )
+        for ranges in self.ranges():
+            expected = cutPoints ( copy.deepcopy ( content ), copy.deepcopy ( ranges ) )
+            self.assertEqual ( curve.getPoints ( copy.deepcopy ( ranges ) ), expected,
+                               f"ranges {ranges}" )
+
+    def testLines ( self ):
+        self.compare ( self.lines ( [ "x", "y" ] ) )
+
+    def testLines1D ( self ):
+        self.compare ( self.lines ( [ "x" ] ) )
+
+    def testOldFormat ( self ):
+        rng = np.random.default_rng ( 8 )
+        content = { "x": rng.uniform ( 0., 1000., 30 ).round(1).tolist(),
+                    "y": rng.uniform ( 0., 1000., 30 ).round(1).tolist() }
+        self.compare ( content )
+
+    def testIrregularPoints ( self ):
+        """ points with extra keys are kept as they are, and cut by cutPoints """
+        content = [ [ { "x": 100., "y": 50., "comment": "a" }, { "x": 500., "y": 50. } ] ]
+        curve = ExclusionLine ( "T1", "obsExclusion_[[x,y],[x,y]]", content, 0 )
+        self.assertIsNotNone ( curve.raw )
+        self.assertEqual ( curve.getPoints ( { "x": [ 0., 200. ] } ),
+                           cutPoints ( copy.deepcopy ( content ), { "x": [ 0., 200. ] } ) )
+
+    def testFreshObjects ( self ):
+        content = self.lines ( [ "x", "y" ] )
+        curve = ExclusionLine ( "T1", "obsExclusion_[[x,y],[x,y]]", content, 0 )
+        points = curve.getPoints()
+        points[0][0]["x"] = -1.
+        self.assertEqual ( curve.getPoints(), content )
+
+    def testStore ( self ):
+        directory = tempfile.mkdtemp()
+        try:
+            jsonfile = os.path.join ( directory, "exclusion_lines.json" )
+            content = { "schema_version": "2.0", "T1": {
+                "obsExclusion_[[x,y],[x,y]]": self.lines ( [ "x", "y" ], 1 ),
+                "obsExclusionP1_[[x,y],[x,y]]": self.lines ( [ "x", "y" ], 1 ),
+                "expExclusion_[[x,y],[x,y]]": self.lines ( [ "x", "y" ], 1 ) } }
+            with open ( jsonfile, "wt" ) as f:
+                json.dump ( content, f )
+            store = getStore ( jsonfile )
+            self.assertIs ( getStore ( jsonfile ), store ) # read only once
+            self.assertEqual ( store.txnames(), [ "T1" ] )
+            names = [ c.name for c in store.select ( "T1" ) ]
+            self.assertEqual ( names, [ "obsExclusion_[[x,y],[x,y]]" ] )
+            names = [ c.name for c in store.select ( "T1", get_all = True ) ]
+            self.assertEqual ( names, [ "obsExclusion_[[x,y],[x,y]]",
+                                        "obsExclusionP1_[[x,y],[x,y]]" ] )
+            names = [ c.name for c in store.select ( "T1", expected = True ) ]
+            self.assertEqual ( names, [ "expExclusion_[[x,y],[x,y]]" ] )
+        finally:
+            shutil.rmtree ( directory )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testFormatGrid
+   :synopsis: Tests formatGrid, the numpy writer of the data grids of the
+              txname.txt files, against round_list, removeRepeated and str.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys, copy
+from unittest import mock
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smodels.base.physicsUnits import GeV, TeV, fb, pb
+from smodels_utils.dataPreparation import databaseCreation
+from smodels_utils.dataPreparation.databaseCreation import formatGrid
+
+class FormatGridTest(unittest.TestCase):
+    def fallback ( self, grid, dataType ):
+        """ write the grid with round_list, removeRepeated and str """
+        with mock.patch.object ( databaseCreation, "formatGrid", return_value = None ):
+            return databaseCreation.databaseCreator._formatData ( grid, 5, dataType )
+
+    def compare ( self, grid, dataType = "upperLimits" ):
+        vStr = formatGrid ( copy.deepcopy ( grid ), 5, dataType )
+        self.assertIsNotNone ( vStr )
+        self.assertEqual ( vStr, self.fallback ( copy.deepcopy ( grid ), dataType ) )
+        return vStr
+
+    def randomGrid ( self, valueUnit, seed ):
+        """ random grid, with repeated masses and values with many digits """
+        rng = np.random.default_rng ( seed )
+        ret = []
+        for i in range(300):
+            m1, m2 = rng.integers ( 10, 20 ) * 75.5555, rng.integers ( 0, 10 ) * 12.34567
+            value = float ( rng.choice ( [ 75.5555, 0., rng.uniform ( 1e-4, 1e4 ) ] ) )
+            value = value * valueUnit if valueUnit is not None else value / 1e4
+            ret.append ( [ [ [ m1*GeV, m2*GeV ], [ m1*GeV, m2*GeV ] ], value ] )
+        return ret
+
+    def testHalfwayDigits ( self ):
+        grid = [ [ [ [ 500.*GeV, 75.5555*GeV ], [ 500.*GeV, 75.5555*GeV ] ], 75.5555*fb ] ]
+        vStr = self.compare ( grid )
+        self.assertEqual ( vStr, "[[[[5.0000E+02*GeV,7.5555E+01*GeV],"
+                                 "[5.0000E+02*GeV,7.5555E+01*GeV]],7.5555E+01*fb]]" )
+
+    def testUpperLimits ( self ):
+        self.compare ( self.randomGrid ( fb, 1 ) )
+
+    def testPicobarn ( self ):
+        self.compare ( self.randomGrid ( pb, 2 ) )
+
+    def testEfficiencies ( self ):
+        self.compare ( self.randomGrid ( None, 3 ), "efficiencyMap" )
+
+    def testMixedUnits ( self ):
+        grid = [ [ [ [ 1.23456789*TeV, 100.*GeV ], [ 1.23456789*TeV, 100.*GeV ] ], -1.5*fb ],
+                 [ [ [ 2.*TeV, 100.*GeV ], [ 2.*TeV, 100.*GeV ] ], 0.*fb ] ]
+        self.compare ( grid )
+
+if __name__ == "__main__":
+    unittest.main()
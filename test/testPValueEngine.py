@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testPValueEngine
+   :synopsis: Tests the p-value engine of the conservatism estimates,
+              toys against the numerical convolution.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys
+import numpy as np
+sys.path.insert(0, os.path.join ( os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "conservatism" ) )
+from chelpers import PValueEngine
+
+class PValueEngineTest(unittest.TestCase):
+    def setUp ( self ):
+        rng = np.random.default_rng ( 3 )
+        self.bg = rng.uniform ( 4., 100., 40 )
+        self.bgerr = self.bg * rng.uniform ( .05, .4, 40 )
+        self.obs = rng.poisson ( self.bg ).astype ( float )
+
+    def compare ( self, typ : str ):
+        ntoys = 40000
+        exact = PValueEngine ( self.obs, self.bg, self.bgerr, typ = typ )
+        toys = PValueEngine ( self.obs, self.bg, self.bgerr, typ = typ,
+                              method = "toys", ntoys = ntoys )
+        for fudge in [ 0., .5, 1. ]:
+            pe, pt = exact.pValues ( fudge ), toys.pValues ( fudge )
+            self.assertTrue ( np.all ( ( pe >= 0. ) & ( pe <= 1. ) ) )
+            ## the toys average the poisson tail exactly, so their error is
+            ## well below that of a binomial with ntoys draws
+            self.assertLess ( np.abs ( pe - pt ).max(), 5. / np.sqrt ( ntoys ) )
+
+    def testGauss ( self ):
+        self.compare ( "gauss" )
+
+    def testLognorm ( self ):
+        self.compare ( "lognorm" )
+
+    def testNoUncertainty ( self ):
+        """ without background error, the p-value is the poisson tail """
+        from scipy.stats import poisson
+        engine = PValueEngine ( [ 10. ], [ 10. ], [ 3. ], tieWeight = .5 )
+        expected = poisson.sf ( 10, 10. ) + .5 * poisson.pmf ( 10, 10. )
+        self.assertAlmostEqual ( engine.pValues ( 0. )[0], expected, places = 10 )
+
+    def testScanShape ( self ):
+        engine = PValueEngine ( self.obs, self.bg, self.bgerr )
+        scan = engine.scan ( [ 0., .5, 1. ] )
+        self.assertEqual ( scan.shape, ( 3, len(self.bg) ) )
+        self.assertTrue ( np.allclose ( scan[1], engine.pValues ( .5 ) ) )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testSModelSService
+   :synopsis: Tests the round trip of many points through the unix socket
+              of the SModelS service, with a stub instead of SModelS.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys, tempfile, shutil, threading
+import multiprocessing
+from unittest import mock
+sys.path.insert(0, os.path.join ( os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gambit" ) )
+import smodels_service
+from smodels_service import Client
+
+def stubSModelS ( slha, dbpath ):
+    """ a stub for run_smodels, with an answer as long as the question """
+    if slha.startswith ( "fail" ):
+        raise ValueError ( "cannot read slha" )
+    return { "dbpath": dbpath, "echo": slha }
+
+def serve ( path, nprocesses ):
+    with mock.patch.object ( smodels_service, "run_smodels", stubSModelS ), \
+         mock.patch.object ( smodels_service, "setup" ):
+        smodels_service.start ( "stub", nprocesses )
+        smodels_service.serveSocket ( path )
+
+class SModelSServiceTest(unittest.TestCase):
+    def setUp ( self ):
+        self.directory = tempfile.mkdtemp ( prefix = "service" )
+        self.path = os.path.join ( self.directory, "smodels.sock" )
+
+    def tearDown ( self ):
+        shutil.rmtree ( self.directory, ignore_errors = True )
+
+    def roundTrip ( self, nprocesses, npoints = 200 ):
+        ctx = multiprocessing.get_context ( "fork" )
+        server = ctx.Process ( target = serve, args = ( self.path, nprocesses ) )
+        server.start()
+        try:
+            ## large enough for the answers to fill the socket buffers
+            ## long before all requests are sent
+            slhas = [ f"point {i}\n" + "x" * 20000 for i in range(npoints) ]
+            slhas[7] = "fail"
+            while not os.path.exists ( self.path ):
+                self.assertTrue ( server.is_alive() )
+                server.join ( .01 )
+            result = {}
+            def evaluate():
+                result["answers"] = Client ( self.path ).evaluate ( slhas )
+            client = threading.Thread ( target = evaluate, daemon = True )
+            client.start()
+            client.join ( 60 )
+            self.assertFalse ( client.is_alive(), "client and service deadlocked" )
+        finally:
+            server.terminate()
+            server.join()
+        answers = result["answers"]
+        self.assertEqual ( [ a["id"] for a in answers ], list ( range ( npoints ) ) )
+        self.assertEqual ( answers[7]["error"], "ValueError: cannot read slha" )
+        for i,answer in enumerate ( answers ):
+            if i != 7:
+                self.assertEqual ( answer["results"], { "dbpath": "stub", "echo": slhas[i] } )
+
+    def testSerial ( self ):
+        self.roundTrip ( 1 )
+
+    def testPool ( self ):
+        self.roundTrip ( 2 )
+
+if __name__ == "__main__":
+    unittest.main()
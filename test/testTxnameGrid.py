@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testTxnameGrid
+   :synopsis: Tests the reader of the data grids of txname.txt files,
+              against simply evaluating the grids.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys, tempfile, shutil
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smodels_utils.helper.txnameGrid import parseGrid, getGrid, readGridString
+
+## the units, for evaluating the grids, masses in GeV and values in fb
+units = { "GeV": 1., "TeV": 1e3, "fb": 1., "pb": 1e3 }
+
+class TxnameGridTest(unittest.TestCase):
+    def compare ( self, string : str, valueFactor : float = 1. ):
+        """ parse string, and compare with evaluating it """
+        grid = parseGrid ( string, "upperLimits" )
+        expected = eval ( string, units )
+        self.assertEqual ( len(grid), len(expected) )
+        for i,( masses, value ) in enumerate ( expected ):
+            self.assertEqual ( grid.nested ( i ), masses )
+            self.assertAlmostEqual ( grid.value ( i ) * valueFactor, value )
+        return grid
+
+    def testUniform ( self ):
+        string = "[[[[500.*GeV,100.*GeV],[500.*GeV,100.*GeV]],1.2*fb], " \
+                 "[[[600.*GeV,1.5E+02*GeV],[600.*GeV,1.5E+02*GeV]],3.4e-1*fb]]"
+        grid = self.compare ( string )
+        self.assertEqual ( grid.valueUnit, "fb" )
+        self.assertEqual ( grid.layout, "[[#,#],[#,#]]" )
+        self.assertEqual ( grid.masses.shape, ( 2, 4 ) )
+
+    def testWidths ( self ):
+        string = "[[[[(500.*GeV,1e-15*GeV),100.*GeV],[(500.*GeV,1e-15*GeV),100.*GeV]],.5*pb]," \
+                 "[[[(700.*GeV,2e-16*GeV),100.*GeV],[(700.*GeV,2e-16*GeV),100.*GeV]],.2*pb]]"
+        grid = self.compare ( string, units["pb"] )
+        self.assertEqual ( grid.widthColumns, [ 1, 4 ] )
+        self.assertEqual ( grid.point ( 1 ), [ [ [ ( 700., 2e-16 ), 100. ],
+                           [ ( 700., 2e-16 ), 100. ] ], .2 ] )
+
+    def testEfficiencies ( self ):
+        string = "[[[[500*GeV,100*GeV],[500*GeV,100*GeV]],0.01]," \
+                 " [[[600*GeV,100*GeV],[600*GeV,100*GeV]],0.]]"
+        grid = self.compare ( string )
+        self.assertIsNone ( grid.valueUnit )
+
+    def testMixedUnits ( self ):
+        string = "[[[[1.*TeV,100.*GeV],[1.*TeV,100.*GeV]],1.*pb]," \
+                 "[[[1100.*GeV,100.*GeV],[1100.*GeV,100.*GeV]],20.*fb]]"
+        grid = self.compare ( string )
+        self.assertEqual ( grid.valueUnit, "fb" )
+        self.assertEqual ( grid.masses[0,0], 1000. )
+
+    def testInconsistentLayout ( self ):
+        string = "[[[[500*GeV,100*GeV],[500*GeV,100*GeV]],1.*fb]," \
+                 "[[[600*GeV,100*GeV],[600*GeV]],1.*fb]]"
+        with self.assertRaises ( ValueError ):
+            parseGrid ( string )
+        with self.assertRaises ( ValueError ):
+            parseGrid ( "None" )
+
+    def testUnique ( self ):
+        string = "[[[[600*GeV,100*GeV],[600*GeV,100*GeV]],1.*fb]," \
+                 "[[[500*GeV,100*GeV],[500*GeV,100*GeV]],2.*fb]," \
+                 "[[[600*GeV,100*GeV],[600*GeV,100*GeV]],3.*fb]]"
+        grid = parseGrid ( string ).unique()
+        self.assertEqual ( grid.masses[::,0].tolist(), [ 500., 600. ] )
+        self.assertEqual ( grid.values.tolist(), [ 2., 3. ] )
+        grid = parseGrid ( string ).unique ( keepLargest = False )
+        self.assertEqual ( grid.values.tolist(), [ 2., 1. ] )
+
+    def testFile ( self ):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join ( directory, "T1.txt" )
+            with open ( path, "wt" ) as f:
+                f.write ( "txName: T1\n" )
+                f.write ( "upperLimits: [[[[500*GeV,100*GeV],[500*GeV,100*GeV]],1.*fb],\n" )
+                f.write ( "    [[[600*GeV,100*GeV],[600*GeV,100*GeV]],2.*fb]] # comment\n" )
+                f.write ( "expectedUpperLimits: [[[[500*GeV,100*GeV],[500*GeV,100*GeV]],.9*fb]]\n" )
+            self.assertIsNone ( readGridString ( path, "efficiencyMap" ) )
+            grid = getGrid ( path )
+            self.assertEqual ( grid.values.tolist(), [ 1., 2. ] )
+            self.assertIs ( getGrid ( path ), grid ) # read only once
+            self.assertEqual ( getGrid ( path, "expectedUpperLimits" ).values.tolist(), [ .9 ] )
+        finally:
+            shutil.rmtree ( directory )
+
+if __name__ == "__main__":
+    unittest.main()
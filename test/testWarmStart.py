@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testWarmStart
+   :synopsis: Tests the warm started mu scans of the simplified likelihoods,
+              against scans that start every fit from scratch.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smodels.statistics.simplifiedLikelihoods import SLData, SLUpperLimitComputer
+from smodels.statistics.statsTools import StatsComputer
+from covariances.cov_helpers import WarmStart, scanLikelihoods, getMuGrid
+
+class Dataset:
+    def getType ( self ):
+        return "efficiencyMap"
+
+class Prediction:
+    """ the parts of a theory prediction that the scans use, for a
+    simplified likelihood given without a database """
+    def __init__ ( self, seed = 5, nbins = 8 ):
+        rng = np.random.default_rng ( seed )
+        bg = rng.uniform ( 5., 50., nbins )
+        err = bg * rng.uniform ( .1, .3, nbins )
+        corr = .3 + .7 * np.eye ( nbins )
+        cov = corr * np.outer ( err, err )
+        obs = rng.poisson ( bg ).astype ( float )
+        nsig = rng.uniform ( 1., 5., nbins )
+        data = SLData ( obs, bg, cov, nsignal = nsig )
+        self.statsComputer = StatsComputer ( [ SLUpperLimitComputer ( data ) ] )
+        self.dataset = Dataset()
+
+    def likelihood ( self, mu, evaluationType ):
+        return self.statsComputer.likelihood ( mu, evaluationType, return_nll = False )
+
+def countIterations ( tpred ):
+    """ count the evaluations of the nll of the nuisances """
+    computer = tpred.statsComputer.getMostSensitiveModel().likelihoodComputer
+    original, counter = computer.nllOfTheta, [ 0 ]
+    def nllOfTheta ( theta ):
+        counter[0] += 1
+        return original ( theta )
+    computer.nllOfTheta = nllOfTheta
+    return counter
+
+class WarmStartTest(unittest.TestCase):
+    def testFindsComputer ( self ):
+        tpred = Prediction()
+        computer = tpred.statsComputer.subComputers[0].likelihoodComputer
+        self.assertIs ( WarmStart ( tpred ).computer, computer )
+        self.assertIsNone ( WarmStart ( None ).computer )
+
+    def testWarmAgainstCold ( self ):
+        mus = getMuGrid ( -1., 4., 40 )
+        for expected in [ False, True ]:
+            cold, warm = Prediction(), Prediction()
+            ncold, nwarm = countIterations ( cold ), countIterations ( warm )
+            llhdsCold = scanLikelihoods ( cold, mus, expected, warmStart = False )
+            llhdsWarm = scanLikelihoods ( warm, mus, expected )
+            self.assertTrue ( np.all ( np.isfinite ( llhdsCold ) ) )
+            self.assertTrue ( np.allclose ( llhdsWarm, llhdsCold, rtol = 1e-5 ) )
+            self.assertLess ( nwarm[0], ncold[0] )
+            ## the computer is left as it was
+            computer = warm.statsComputer.subComputers[0].likelihoodComputer
+            self.assertNotIn ( "getThetaHat", computer.__dict__ )
+            self.assertFalse ( computer.debug_mode )
+
+if __name__ == "__main__":
+    unittest.main()
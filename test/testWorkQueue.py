@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: testWorkQueue
+   :synopsis: Tests the claim file work queue of the validation,
+              in particular taking over expired claims by competing processes.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+import unittest, os, sys, time, tempfile, shutil
+import multiprocessing
+sys.path.insert(0, os.path.join ( os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "validation" ) )
+import workQueue
+from workQueue import ClaimFileQueue, removeIfStale
+
+def compete ( directory, owner, items, start, results ):
+    """ claim all items as soon as start is set, report what we hold
+    after a heartbeat """
+    queue = ClaimFileQueue ( directory, lease = 60. )
+    queue.owner = owner
+    start.wait()
+    queue.claim ( items )
+    queue.renew()
+    results.put ( ( owner, sorted ( queue.held ) ) )
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp ( self ):
+        self.directory = tempfile.mkdtemp ( prefix = "claims" )
+
+    def tearDown ( self ):
+        shutil.rmtree ( self.directory, ignore_errors = True )
+
+    def expire ( self, queue, items ):
+        """ plant claims of a dead process, older than the lease """
+        old = time.time() - 2 * queue.lease
+        for item in items:
+            with open ( queue.claimFile ( item ), "wt" ) as f:
+                f.write ( "deadhost:1\n" )
+            os.utime ( queue.claimFile ( item ), ( old, old ) )
+
+    def owners ( self, queue, items ):
+        ret = {}
+        for item in items:
+            with open ( queue.claimFile ( item ) ) as f:
+                ret[item] = f.read().strip()
+        return ret
+
+    def testClaimAndRelease ( self ):
+        a = ClaimFileQueue ( self.directory )
+        b = ClaimFileQueue ( self.directory )
+        b.owner = "otherhost:2"
+        self.assertEqual ( a.claim ( [ "p1", "p2" ] ), [ "p1", "p2" ] )
+        self.assertEqual ( b.claim ( [ "p1", "p2", "p3" ] ), [ "p3" ] )
+        b.release ( [ "p1" ] ) # not ours, must not remove a's claim
+        self.assertTrue ( os.path.exists ( a.claimFile ( "p1" ) ) )
+        a.release ( [ "p1" ] )
+        self.assertEqual ( b.claim ( [ "p1" ] ), [ "p1" ] )
+
+    def testTakeOverExpired ( self ):
+        a = ClaimFileQueue ( self.directory, lease = 60. )
+        self.expire ( a, [ "p1" ] )
+        self.assertEqual ( a.claim ( [ "p1" ] ), [ "p1" ] )
+        self.assertEqual ( self.owners ( a, [ "p1" ] )["p1"], a.owner )
+
+    def testFreshClaimSurvivesLateRename ( self ):
+        """ a stats the expired claim, b takes it over before a renames it:
+        a must not move b's fresh claim aside """
+        a = ClaimFileQueue ( self.directory, lease = 60. )
+        b = ClaimFileQueue ( self.directory, lease = 60. )
+        b.owner = "otherhost:2"
+        self.expire ( a, [ "p1" ] )
+        claim = a.claimFile ( "p1" )
+        rename = os.rename
+        def interleaved ( src, dst ):
+            workQueue.os.rename = rename
+            self.assertTrue ( b._takeOverExpired ( claim ) )
+            b.held.add ( "p1" )
+            rename ( src, dst )
+        workQueue.os.rename = interleaved
+        try:
+            self.assertEqual ( a.claim ( [ "p1" ] ), [] )
+        finally:
+            workQueue.os.rename = rename
+        self.assertEqual ( self.owners ( a, [ "p1" ] )["p1"], b.owner )
+        b.renew()
+        self.assertEqual ( b.held, { "p1" } )
+        self.assertEqual ( os.listdir ( self.directory ),
+                [ os.path.basename ( a.claimFile ( "p1" ) ) ] ) # no tombstones left
+
+    def testRemoveIfStale ( self ):
+        path = os.path.join ( self.directory, "lock" )
+        open ( path, "wt" ).close()
+        self.assertFalse ( removeIfStale ( path, 60. ) )
+        old = time.time() - 120.
+        os.utime ( path, ( old, old ) )
+        self.assertTrue ( removeIfStale ( path, 60. ) )
+        self.assertFalse ( os.path.exists ( path ) )
+        self.assertFalse ( removeIfStale ( path, 60. ) )
+
+    def testCompetingProcesses ( self ):
+        """ several processes fight over expired claims, every item must
+        end up with exactly one owner """
+        items = [ f"p{i}" for i in range(200) ]
+        self.expire ( ClaimFileQueue ( self.directory, lease = 60. ), items )
+        ctx = multiprocessing.get_context ( "fork" )
+        start, results = ctx.Event(), ctx.Queue()
+        procs = [ ctx.Process ( target = compete, args = ( self.directory,
+                  f"host:{i}", items, start, results ) ) for i in range(4) ]
+        for p in procs:
+            p.start()
+        start.set()
+        held = dict ( [ results.get ( timeout = 60 ) for p in procs ] )
+        for p in procs:
+            p.join()
+        allHeld = [ item for h in held.values() for item in h ]
+        self.assertEqual ( sorted ( allHeld ), sorted ( items ) )
+        owners = self.owners ( ClaimFileQueue ( self.directory ), items )
+        for owner, h in held.items():
+            for item in h:
+                self.assertEqual ( owners[item], owner )
+
+if __name__ == "__main__":
+    unittest.main()
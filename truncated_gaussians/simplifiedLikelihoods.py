@@ -245,14 +245,19 @@ class LikelihoodComputer:
 
     debug_mode = False
 
-    def __init__(self, data, ntoys = 30000 ):
+    def __init__(self, data, ntoys = 30000, chunksize = 10000 ):
         """
         :param data: a Data object.
         :param ntoys: number of toys when marginalizing
+        :param chunksize: maximum number of toys evaluated in one array
+                          operation when marginalizing. None means all at once.
         """
 
         self.model = data
         self.ntoys = ntoys
+        self.chunksize = chunksize
+        self._thetas = None
+        self._factored = False
 
     def dLdMu(self, mu, signal_rel, theta_hat):
         """
@@ -517,14 +522,12 @@ class LikelihoodComputer:
                         return thetamax
             return thetamax
 
-    def findThetaHat(self, nsig):
-            """ Compute nuisance parameter theta that maximizes our likelihood
-                (poisson*gauss).
-            """
-
-            ## first step is to disregard the covariances and solve the
-            ## quadratic equations
-            ini = self.getThetaHat ( self.model.observed, self.model.backgrounds, nsig, self.model.covariance, 0 )
+    def factorCovariance(self):
+            """ invert the covariance matrix and compute the normalization
+            of the gaussian. the covariance does not depend on nsig, so this
+            is done only once per computer. """
+            if self._factored:
+                return
             self.cov_tot = self.model.V
             #if self.model.n == 1:
             #    self.cov_tot = self.model.totalCovariance ( nsig )
@@ -544,6 +547,17 @@ class LikelihoodComputer:
             if type ( self.model.observed) in [ list, ndarray ]:
                 self.ones = NP.ones ( len (self.model.observed) )
             self.gammaln = special.gammaln(self.model.observed + 1)
+            self._factored = True
+
+    def findThetaHat(self, nsig):
+            """ Compute nuisance parameter theta that maximizes our likelihood
+                (poisson*gauss).
+            """
+
+            ## first step is to disregard the covariances and solve the
+            ## quadratic equations
+            ini = self.getThetaHat ( self.model.observed, self.model.backgrounds, nsig, self.model.covariance, 0 )
+            self.factorCovariance()
             try:
                 ret_c = optimize.fmin_ncg ( self.nll, ini, fprime=self.nllprime,
                                        fhess=self.nllHess, full_output=True, disp=0 )
@@ -654,39 +668,52 @@ class LikelihoodComputer:
 
             return like[0][0]
 
-    def marginalizedLikelihood(self, nsig, nll ):
-            """ compute the marginalized likelihood of observing nsig signal event"""
-            if self.model.isLinear() and self.model.n == 1: ## 1-dimensional non-skewed llhds we can integrate analytically
-                return self.marginalizedLLHD1D ( nsig, nll )
+    def getToys(self):
+            """ the nuisance toys used for marginalizing. they only depend
+            on the covariance of the model, so we draw them once per computer
+            and reuse them for every nsig, e.g. across the brentq steps of
+            the upper limit computation.
 
-            vals=[]
-            self.gammaln = special.gammaln(self.model.observed + 1)
+            :returns: array of shape (ntoys, n)
+            """
+            if self._thetas is not None and len(self._thetas)==self.ntoys:
+                return self._thetas
             thetas = stats.multivariate_normal.rvs(mean=[0.]*self.model.n,
                           # cov=(self.model.totalCovariance(nsig)),
                           cov=self.model.V,
                           size=self.ntoys ) ## get ntoys values
-            for theta in thetas :
+            self._thetas = NP.reshape ( thetas, ( self.ntoys, self.model.n ) )
+            return self._thetas
+
+    def marginalizedLikelihood(self, nsig, nll ):
+            """ compute the marginalized likelihood of observing nsig signal event.
+            all toys are evaluated as array operations, in chunks of
+            self.chunksize toys to cap the memory. """
+            if self.model.isLinear() and self.model.n == 1: ## 1-dimensional non-skewed llhds we can integrate analytically
+                return self.marginalizedLLHD1D ( nsig, nll )
+
+            self.gammaln = special.gammaln(self.model.observed + 1)
+            thetas = self.getToys()
+            chunksize = self.chunksize
+            if chunksize in [ None, 0 ]:
+                chunksize = len(thetas)
+            total = 0.
+            for start in range ( 0, len(thetas), chunksize ):
+                theta = thetas[start:start+chunksize]
                 if self.model.isLinear():
                     lmbda = nsig + self.model.backgrounds + theta
                 else:
                     lmbda = nsig + self.model.A + theta + self.model.C*theta**2/self.model.B**2
-                if self.model.isScalar( lmbda ):
-                    lmbda = array([lmbda])
-                for ctr,v in enumerate( lmbda ):
-                    if v<=0.: lmbda[ctr]=1e-30
-#                    print ( "lmbda=",lmbda )
+                lmbda[lmbda<=0.] = 1e-30
                 poisson = self.model.observed*NP.log(lmbda) - lmbda - self.gammaln
-                # poisson = NP.exp(self.model.observed*NP.log(lmbda) - lmbda - self.model.backgrounds - self.gammaln)
-                vals.append( NP.exp ( sum(poisson) ) )
-                #vals.append ( reduce(lambda x, y: x*y, poisson) )
-            mean = NP.mean( vals )
+                total += NP.sum ( NP.exp ( NP.sum ( poisson, axis=1 ) ) )
+            mean = total / len(thetas)
             if nll:
                 if mean == 0.:
                     mean = 1e-100
                 mean = - log ( mean )
             return mean
 
-
     def profileLikelihood( self, nsig, nll ):
         """ compute the profiled likelihood for nsig.
             Warning: not normalized.
@@ -792,6 +819,53 @@ class UpperLimitComputer:
             return None
         if toys==None:
             toys=self.ntoys
+        model, computer, compA = self._prepareComputers ( model, toys, expected )
+        return self._ulSigmaFor ( model, computer, compA, marginalize, toys,
+                                  expected, trylasttime )
+
+    def ulSigmas( self, model, nsignals, marginalize=False, toys=None,
+                  expected=False ):
+        """ upper limits for many signal hypotheses on the same background
+            model. The covariance is factored once, and the Asimov model and
+            theta_hat(mu=0) are shared among all signal hypotheses, the roots
+            are then found per signal hypothesis.
+
+        :params model: the Data object that defines observed, backgrounds and
+                       covariance. its nsignal is ignored.
+        :params nsignals: matrix of signal yields, one row per signal hypothesis
+        :params marginalize: if true, marginalize nuisances, else profile them
+        :params toys: specify number of toys. Use default is none
+        :params expected: compute the expected values, not the observed.
+        :returns: array of upper limits on yields, nan for hypotheses with only
+                  zero signals
+        """
+        if toys==None:
+            toys=self.ntoys
+        nsignals = NP.atleast_2d ( NP.array ( nsignals, dtype=float ) )
+        if nsignals.shape[1] != model.n:
+            raise Exception(f"signal hypotheses have {nsignals.shape[1]} entries, model has {model.n} datasets")
+        bgmodel, computer, compA = self._prepareComputers ( model, toys, expected )
+        ret = NP.full ( len(nsignals), NP.nan )
+        for i,nsig in enumerate ( nsignals ):
+            if not NP.any ( nsig > 0. ):
+                continue
+            ## a shallow copy suffices, we only replace the signals
+            smodel = copy.copy ( bgmodel )
+            smodel.nsignal = nsig
+            smodel.signal_rel = nsig / nsig.sum()
+            ul = self._ulSigmaFor ( smodel, computer, compA, marginalize, toys,
+                                    expected, False )
+            if ul is not None:
+                ret[i] = ul
+        return ret
+
+    def _prepareComputers ( self, model, toys, expected ):
+        """ create the likelihood computers for the model and its Asimov model.
+            Everything here is independent of the signal hypothesis.
+
+        :returns: model (with observed replaced by backgrounds if expected),
+                  computer, Asimov computer
+        """
         oldmodel = model
         if expected:
             model = copy.deepcopy(oldmodel)
@@ -801,25 +875,24 @@ class UpperLimitComputer:
                 model.observed[i]=int(NP.round(d))
                 # model.observed[i]=float(d)
         computer = LikelihoodComputer(model, toys)
-        mu_hat = computer.findMuHat(model.signal_rel)
-        theta_hat0,_ = computer.findThetaHat(0*model.signal_rel)
-        sigma_mu = computer.getSigmaMu(model.signal_rel)
+        theta_hat0,_ = computer.findThetaHat(NP.zeros(model.n))
 
         aModel = copy.deepcopy(model)
         aModel.observed = array([NP.round(x+y) for x,y in zip(model.backgrounds,theta_hat0)])
-        """
-        if marginalize == False and expected == True:
-            model.observed = array([NP.round(x+y) for x,y in zip(model.backgrounds,theta_hat0)])
-            mu_hat = computer.findMuHat(model.signal_rel)
-            theta_hat0,_ = computer.findThetaHat(0*model.signal_rel)
-            sigma_mu = computer.getSigmaMu(model.signal_rel)
-        """
         #print ( "aModeldata=", aModel.observed )
         #aModel.observed = array ( [ round(x) for x in model.backgrounds ] )
         aModel.name = f"{aModel.name}A"
         compA = LikelihoodComputer(aModel, toys)
+        return model, computer, compA
+
+    def _ulSigmaFor ( self, model, computer, compA, marginalize, toys,
+                      expected, trylasttime ):
+        """ the upper limit for the signal hypothesis of model, given the
+            prepared likelihood computers. see ulSigma. """
+        mu_hat = computer.findMuHat(model.signal_rel)
+        sigma_mu = computer.getSigmaMu(model.signal_rel)
         ## compute
-        mu_hatA = compA.findMuHat(aModel.signal_rel)
+        mu_hatA = compA.findMuHat(model.signal_rel)
         if mu_hat < 0.:
             mu_hat = 0.
         nll0 = computer.likelihood(model.signals(mu_hat),
@@ -836,7 +909,7 @@ class UpperLimitComputer:
                 marginalize=False
             else:
                 logger.warning("marginalization worked.")
-        nll0A = compA.likelihood(aModel.signals(mu_hatA),
+        nll0A = compA.likelihood(model.signals(mu_hatA),
                                    marginalize=marginalize,
                                    nll=True)
 
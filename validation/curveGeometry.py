@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: curveGeometry
+   :synopsis: ROOT-free geometry for the agreement factors: official
+              exclusion curves as prepared polygons, that test many points
+              in one call, and the areas of the Voronoi cells of the
+              validation points, taken directly from vor.point_region.
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import numpy as np
+from typing import Tuple
+try:
+    from smodels.theory.auxiliaryFunctions import rescaleWidth
+except ImportError as e:
+    from backwardCompatibility import rescaleWidth
+
+def curveVertices ( curve ) -> np.ndarray:
+    """ the vertices of an exclusion curve, as they would end up in
+    the TGraph of rootTools.exclusionCurveToTGraph
+
+    :param curve: dictionary with "points", or a ROOT.TGraph
+    :returns: array of shape (n,2)
+    """
+    if hasattr ( curve, "GetN" ): # a TGraph
+        n = curve.GetN()
+        return np.array ( [ [ curve.GetPointX(i), curve.GetPointY(i) ] \
+                            for i in range(n) ], dtype=float ).reshape(n,2)
+    points = curve["points"]
+    if not "y" in points: # a 1d curve, make a vertical line per x value
+        xs = np.repeat ( np.asarray ( points["x"], dtype=float ), 3 )
+        ys = np.tile ( [ 0., 1., 2. ], len(points["x"]) )
+        return np.column_stack ( [ xs, ys ] )
+    return np.column_stack ( [ np.asarray ( points["x"], dtype=float ),
+                               np.asarray ( points["y"], dtype=float ) ] )
+
+def completeVertices ( xy : np.ndarray ) -> np.ndarray:
+    """ complete the curve at both ends so it crosses the axes, and close
+    it at the origin, like rootTools.completeROOTGraph
+
+    :param xy: array of shape (n,2)
+    :returns: the completed array
+    """
+    if len(xy) <= 3:
+        return xy
+    ( x1, y1 ), ( x2, y2 ), ( xl, yl ) = xy[0], xy[2], xy[-1]
+    if ( x1 - xl )**2 + ( y1 - yl )**2 < 50.:
+        ## need not completion
+        return xy
+    logY = False
+    ay1, ay2 = y1, y2
+    if max ( abs(ay2), abs(ay1) ) < 1e-6:
+        logY = True
+        ay1, ay2 = rescaleWidth ( ay1 ), rescaleWidth ( ay2 )
+    if x2 == x1:
+        x2 = x1 + 1e-16
+    dx = x2 - x1
+    if dx == 0.:
+        dx = 1e-6
+    k = ( ay2 - ay1 ) / dx
+    if abs(k) > 1:
+        ## the curve is more vertical -- close with the x-axis (y=0)
+        front = [ x1, 0. ]
+    else:
+        ## the curve is more horizontal -- close with the y-axis (x=0)
+        front = [ 0., y1 ]
+    xy = np.vstack ( [ front, xy ] )
+
+    ( x1, y1 ), ( x2, y2 ) = xy[-3], xy[-1]
+    if logY:
+        y1, y2 = rescaleWidth ( y1 ), rescaleWidth ( y2 )
+    if x2 == x1:
+        x2 = x1 + 1e-16
+    k = 99999.
+    if x2 != x1:
+        k = ( y2 - y1 ) / ( x2 - x1 )
+    if k > 1 or k < -1:
+        ## the curve is more vertical -- close with the x-axis (y=0)
+        back = [ x2, 0. ]
+    elif k < 0:
+        ## the curve is more horizontal, but falling -- also the x-axis
+        back = [ x2, 0. ]
+    else:
+        ## the curve is more horizontal -- close with the y-axis (x=0)
+        back = [ 0., y2 ]
+    return np.vstack ( [ xy, back, [ 0., 0. ] ] )
+
+class PreparedCurve:
+    """ an official exclusion curve, converted once into a closed polygon.
+    points are tested with the crossing number rule, as TGraph::IsInside
+    does, for all points at once. """
+
+    def __init__ ( self, curve, complete : bool = True ):
+        """
+        :param curve: dictionary with "points", or a ROOT.TGraph
+        :param complete: complete the curve so it crosses the axes
+        """
+        xy = curveVertices ( curve )
+        if complete:
+            xy = completeVertices ( xy )
+        self.vertices = xy
+        ## the edges, including the closing one
+        self.x1, self.y1 = xy[::,0], xy[::,1]
+        self.x2, self.y2 = np.roll ( self.x1, 1 ), np.roll ( self.y1, 1 )
+
+    def contains ( self, points, chunksize : int = 4096 ) -> np.ndarray:
+        """ which of the points are inside the curve
+
+        :param points: array-like of shape (n,2)
+        :param chunksize: number of points to test per array operation
+        :returns: boolean array of length n
+        """
+        points = np.asarray ( points, dtype=float ).reshape(-1,2)
+        ret = np.zeros ( len(points), dtype=bool )
+        if len(self.vertices) < 3:
+            return ret
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        dy = np.where ( y2 == y1, 1., y2 - y1 )
+        for start in range ( 0, len(points), chunksize ):
+            px = points[start:start+chunksize,0,None]
+            py = points[start:start+chunksize,1,None]
+            straddles = ( y1 < py ) != ( y2 < py )
+            xcross = x1 + ( py - y1 ) / dy * ( x2 - x1 )
+            crossings = ( straddles & ( px < xcross ) ).sum ( axis=1 )
+            ret[start:start+chunksize] = crossings % 2 == 1
+        return ret
+
+def voronoiAreas ( points ) -> Tuple[np.ndarray,float]:
+    """ the areas of the Voronoi cells of the points. points in open
+    cells get the average area of the closed cells.
+
+    :param points: array-like of shape (n,2). if all y values are tiny,
+                   they are taken to be widths and rescaled.
+    :returns: array with the areas of the cells of the points, average area
+    """
+    from scipy.spatial import Voronoi, ConvexHull
+    xy = np.array ( points, dtype=float ).reshape(-1,2)
+    if len(xy)>0 and max ( xy[::,1] ) < 1e-6:
+        xy[::,1] = [ rescaleWidth ( y ) for y in xy[::,1] ]
+    try:
+        vor = Voronoi ( xy )
+    except Exception as e: # too few or degenerate points
+        return np.ones ( len(xy) ), 1.
+    regionAreas = {}
+    for r,indices in enumerate ( vor.regions ):
+        if len(indices)<3 or -1 in indices: # some regions are open
+            continue
+        regionAreas[r] = ConvexHull ( vor.vertices[indices] ).volume
+    areas = np.array ( [ regionAreas.get ( r, np.nan ) for r in vor.point_region ] )
+    closed = np.isfinite ( areas )
+    average = float ( np.mean ( areas[closed] ) ) if closed.any() else 1.
+    areas[~closed] = average
+    return areas, average
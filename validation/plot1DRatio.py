@@ -89,10 +89,12 @@ def draw ( args : dict ):
     """ draw, with arguments given as a dictionary """
     ipath1 = getValidationDataPathName ( args["dbpath"], args["analysis1"], 
             args["valfile1"], args["folder1"] )
-    content1 = getValidationFileContent ( ipath1 )
+    content1 = getValidationFileContent ( ipath1,
+            keys = [ "axes", "slhafile", "UL", "eUL", "signal" ] )
     ipath2 = getValidationDataPathName ( args["dbpath"], args["analysis2"], 
             args["valfile2"], args["folder2"] )
-    content2 = getValidationFileContent ( ipath2 )
+    content2 = getValidationFileContent ( ipath2,
+            keys = [ "axes", "slhafile", "UL", "eUL", "signal" ] )
     data1 = content1["data"]
     data2 = content2["data"]
     points1 = retrievePoints ( data1 )
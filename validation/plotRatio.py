@@ -33,6 +33,10 @@ from validationHelpers import getAxisType, axisV2ToV3
 
 logger = logging.getLogger(__name__)
 
+## the keys of the validation points that the ratio plots need
+ratioKeys = [ "axes", "slhafile", "UL", "eUL", "signal", "efficiency",
+              "leadingDSes", "error", "StatModel" ]
+
 
 def hasDebPkg():
     """ do we have the package installed """
@@ -176,7 +180,7 @@ def draw ( options : dict ):
     axis1, axi2 = None, None
     for valfile in valfile1.split(","):
         ipath1 = getValidationDataPathName ( dbpath, analysis1, valfile, options["folder1"] )
-        content = getValidationFileContent ( ipath1 )
+        content = getValidationFileContent ( ipath1, keys = ratioKeys )
         axis1 = '[[x, y], [x, y]]'
         if not "meta" in content or content["meta"] is None:
             print ( f"[plotRatio] meta info is missing in {ipath1}. Perhaps rerun validation?" )
@@ -198,7 +202,7 @@ def draw ( options : dict ):
     contents = []
     for valfile in valfile2.split(","):
         ipath2 = getValidationDataPathName ( dbpath, analysis2, valfile, options["folder2"] )
-        content = getValidationFileContent ( ipath2 )
+        content = getValidationFileContent ( ipath2, keys = ratioKeys )
         if not "meta" in content or content["meta"] is None:
             print ( f"[plotRatio] meta info is missing in {ipath2}. Perhaps rerun validation?" )
         axis2 = axis1
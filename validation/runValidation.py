@@ -431,13 +431,29 @@ def checkForBestSRPlots ( expRes, txname : str, ax, db, combine, opts, datafile,
     plot( dbpath, ana, valfile, max_x, max_y, output, defcolors, rank, nmax,
           options["show"], validationPlot )
 
+def getTxNamesToValidate ( expRes ) -> list:
+    """ the txnames of expRes that we validate: each txname only once,
+    and not the ones with unassigned constraints """
+    txnamesStr = []
+    txnames = []
+    for tx in expRes.getTxNames():
+        if 'assigned' in tx.constraint:
+            continue  #Skip not assigned constraints
+        if tx.txName in txnamesStr:
+            continue #Do not include a txname twice (if it appears in more than one dataset)
+        txnames.append(tx)
+        txnamesStr.append(tx.txName)
+    return txnames
+
 def runForOneResult ( expRes, options : dict,
-                      keep : bool, db ) -> None:
+                      keep : bool, db,
+                      onlyTxnames : Optional[list] = None ) -> None:
     """
     Run for one experimental result
     :param options: all flags in the "options" part of the ini file
     :param keep: keep temporary directories
     :param db: database, so we can check if ratio plots are desirable
+    :param onlyTxnames: if not None, validate only these txnames
     """
     expt0 = time.time()
     logger.info( f"--- {GREEN} validating {expRes.globalInfo.id} {RESET}" )
@@ -446,15 +462,7 @@ def runForOneResult ( expRes, options : dict,
         sqrts = int(sqrts)
     rundir = f"{sqrts}TeV" # dirname of this run
     #Loop over pre-selected txnames:
-    txnamesStr = []
-    txnames = []
-    for tx in expRes.getTxNames():
-        if 'assigned' in tx.constraint:
-            continue  #Skip not assigned constraints
-        if tx.txName in txnamesStr:
-            continue #Do not include a txname twice (if it appears in more than one dataset)
-        txnames.append(tx)
-        txnamesStr.append(tx.txName)
+    txnames = getTxNamesToValidate ( expRes )
 
     if not txnames:
         logger.warning( f"No valid txnames found for {expRes} (not assigned constraints?)" )
@@ -469,6 +477,8 @@ def runForOneResult ( expRes, options : dict,
         prettyorugly = [ True, False ]
     for itx,txname in enumerate(txnames):
         txnameStr = txname.txName
+        if onlyTxnames is not None and not txnameStr in onlyTxnames:
+            continue
         txt0 = time.time()
         stype=""
         if combine:
@@ -697,6 +707,90 @@ def runForOneResult ( expRes, options : dict,
     id = expRes.globalInfo.id
     print( f"{RED}finished {id} validated in {dt:.1f} min {RESET}" )
 
+## what the workers of the local scheduler inherit from the parent, via fork
+_shared = {}
+
+def runTask ( task : tuple ) -> dict:
+    """ run one (analysis, txname) task, in a worker process of the
+    local scheduler.
+
+    :param task: tuple of index of the result in expResList, and txname
+    :returns: dictionary with analysis, txname, time spent, and error (or None)
+    """
+    ires, txnameStr = task
+    expRes = _shared["expResList"][ires]
+    ret = { "analysis": expRes.globalInfo.id, "txname": txnameStr,
+            "error": None }
+    t0 = time.time()
+    try:
+        runForOneResult ( expRes, _shared["options"], _shared["keep"],
+                          _shared["db"], onlyTxnames = [ txnameStr ] )
+    except Exception as e:
+        import traceback
+        logger.error ( f"task {ret['analysis']}:{txnameStr} failed: {traceback.format_exc()}" )
+        ret["error"] = f"{type(e).__name__}: {e}"
+    ret["dt"] = time.time() - t0
+    return ret
+
+def runLocalScheduler ( expResList : list, options : dict,
+          keep : bool, db ) -> list:
+    """
+    Validate on a bounded pool of local worker processes, one
+    (analysis, txname) task at a time per worker. The axes of one txname
+    stay in one task, as they share the unpacked tarball. The workers are
+    forked, so they share the database that is already loaded. The cpus are
+    split among the workers, every worker runs its points with
+    ncpus/nworkers processes.
+
+    :param options: all flags in the "options" part of the ini file
+    :param keep: keep temporary directories
+    :param db: the loaded database
+    :returns: list of task results, see runTask
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import multiprocessing
+    tasks = []
+    for ires,expRes in enumerate(expResList):
+        for tx in getTxNamesToValidate ( expRes ):
+            tasks.append ( ( ires, tx.txName ) )
+    if len(tasks)==0:
+        return []
+    nworkers = min ( options["nworkers"], len(tasks) )
+    localopts = copy.deepcopy ( options )
+    localopts["ncpus"] = max ( 1, options["ncpus"] // nworkers )
+    if not options["continue"]:
+        ## clean up here, the workers must not remove each other's claims
+        from workQueue import getWorkQueue
+        for expRes in expResList:
+            getWorkQueue ( f"run_{expRes.globalInfo.id}",
+                           backend = options["workQueue"] ).clear()
+        localopts["continue"] = True
+    _shared.update ( { "expResList": expResList, "options": localopts,
+                       "keep": keep, "db": db } )
+    logger.info ( f"running {len(tasks)} tasks on {nworkers} local workers with {localopts['ncpus']} cpus each" )
+    results = []
+    ctx = multiprocessing.get_context ( "fork" )
+    with ProcessPoolExecutor ( max_workers = nworkers, mp_context = ctx ) as executor:
+        futures = { executor.submit ( runTask, task ) : task for task in tasks }
+        for future in as_completed ( futures ):
+            ires, txnameStr = futures[future]
+            try:
+                ret = future.result()
+            except Exception as e: # e.g. the worker died
+                ret = { "analysis": expResList[ires].globalInfo.id,
+                        "txname": txnameStr, "error": f"{type(e).__name__}: {e}",
+                        "dt": 0. }
+            results.append ( ret )
+            status = f"{GREEN}done{RESET}"
+            if ret["error"] is not None:
+                status = f"{RED}failed: {ret['error']}{RESET}"
+            logger.info ( f"[{len(results)}/{len(tasks)}] {ret['analysis']}:{ret['txname']} {status} in {ret['dt']/60.:.1f} min" )
+    nfailed = len ( [ r for r in results if r["error"] is not None ] )
+    logger.info ( f"local scheduler finished {len(results)} tasks, {nfailed} failed" )
+    for r in sorted ( results, key = lambda r: r["dt"], reverse = True ):
+        logger.info ( f"   {r['analysis']}:{r['txname']}: {r['dt']/60.:.1f} min" )
+    return results
+
 def run ( expResList : list, options : dict,
           keep : bool, db ) -> None:
     """
@@ -725,7 +819,10 @@ def run ( expResList : list, options : dict,
                     expRes.globalInfo.statModels.pop ( setName )
                 else:
                     expRes.globalInfo.statModels[setName] = newModels
-        runForOneResult ( expRes, options, keep, db )
+        if options["nworkers"] <= 1:
+            runForOneResult ( expRes, options, keep, db )
+    if options["nworkers"] > 1:
+        runLocalScheduler ( expResList, options, keep, db )
 
 def main(analysisIDs,datasetIDs,txnames,dataTypes,kfactorDict,slhadir,databasePath,
          options : dict, tarfiles=None,verbosity : str ='error',
@@ -980,12 +1077,16 @@ if __name__ == "__main__":
                 "useFullJsonLikelihoods": False, # if 'jsonFiles_FullLikelihood' is given, use this entry instead of 'jsonFiles'
                 "forceOneD": False, # force the plot to be interpreted as 1d
                 "tempdir": None, ## specify the name of the tempdir, if you wish
+                "slhaTempdir": None, ## where to unpack the slha tarballs, e.g. a node-local /dev/shm instead of the (shared) working directory
                 "timeOut": 5000, # change the timeout per point, in seconds
                 "pngPlots": True, ## also png plots?
                 "recordPlotCreation": False, ## record the plot creation?
                 "pdfPlots": True, ## also pdf plots?
                 "significances": False, ## significance plot instead of ul plot?
                 "continue": False, ## continue old productions
+                "nworkers": 1, ## number of local worker processes, each validates one (analysis, txname) at a time. >1 turns on the local scheduler
+                "workQueue": "files", ## how points are claimed among concurrent jobs: "files" (claim files, also on shared filesystems) or "sqlite" (local disks only)
+                "binaryStore": False, ## also write the data to a binary, columnar store (see validationDataStore.py)
                 "ratio_comment": None, ## comment in ratio plot
                 "expectationType": "aposteriori",
                 "spey": False, ## use spey statistics
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: validationDataStore
+    :synopsis: a binary, columnar store for validation data, as an
+               alternative to the validationData = [...] python files.
+               For a validation file T1_2EqMassAx_EqMassBy.py, the store is
+               the folder T1_2EqMassAx_EqMassBy.vdata/, with:
+
+               - meta.json: the meta dictionary, and the column descriptions
+               - <column>.npy: one numpy array per column, nested dictionaries
+                 such as "axes" are flattened to "axes.x", "axes.y"
+               - <column>.has.npy: mask of the points that have the column,
+                 written only if some points dont have it
+               - extra.jsonl: per point, everything that is neither a float
+                 nor a string (lists, ints, None, deeper dictionaries)
+               - journal.jsonl: points appended after the last full write,
+                 folded into the columns by compact()
+               - hashes.npy: a hash of every point of the last full write,
+                 so that sync() can tell which points changed
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import os, json, glob, time, hashlib
+import numpy as np
+from typing import Union, List, Dict
+
+storeVersion = 1
+
+def storePathFor ( datafile : str ) -> str:
+    """ the path of the store that belongs to a validation file,
+    e.g. T1_2EqMassAx_EqMassBy.py -> T1_2EqMassAx_EqMassBy.vdata """
+    if datafile.endswith ( ".vdata" ):
+        return datafile
+    if datafile.endswith ( ".py" ):
+        datafile = datafile[:-3]
+    return f"{datafile}.vdata"
+
+def pointHash ( point : Dict ) -> str:
+    """ a hash of the content of a validation point """
+    return hashlib.sha1 ( json.dumps ( point, sort_keys = True,
+                          default = str ).encode() ).hexdigest()
+
+def isFloat ( value ) -> bool:
+    """ is value a (non-bool) floating point number? """
+    return type(value) in [ float, np.float64, np.float32 ]
+
+class ValidationDataStore:
+    """ binary, columnar, incrementally appendable store of the
+    validation data of one txname and axes """
+
+    def __init__ ( self, datafile : str ):
+        """
+        :param datafile: the name of the validation file, e.g.
+                         T1_2EqMassAx_EqMassBy.py, or of the store itself
+        """
+        self.path = storePathFor ( datafile )
+        self.metafile = os.path.join ( self.path, "meta.json" )
+        self.extrafile = os.path.join ( self.path, "extra.jsonl" )
+        self.journalfile = os.path.join ( self.path, "journal.jsonl" )
+        self.hashfile = os.path.join ( self.path, "hashes.npy" )
+
+    def exists ( self ) -> bool:
+        """ has the store been written? """
+        return os.path.exists ( self.metafile )
+
+    def mtime ( self ) -> float:
+        """ time of the last modification of the store """
+        times = [ os.stat ( self.metafile ).st_mtime ]
+        if os.path.exists ( self.journalfile ):
+            times.append ( os.stat ( self.journalfile ).st_mtime )
+        return max ( times )
+
+    def columnFile ( self, column : str, suffix : str = "npy" ) -> str:
+        return os.path.join ( self.path, f"{column.replace('/','_')}.{suffix}" )
+
+    def flatten ( self, point : dict ):
+        """ split a validation point into its columnar part and its extras.
+        empty dictionaries have no columns, so they go to the extras.
+
+        :returns: dictionary of flat columns, dictionary of extras
+        """
+        columns, extra = {}, {}
+        for key,value in point.items():
+            if type(value) == dict and len(value)>0 and all ( [ isFloat(v) \
+                    or type(v)==str for v in value.values() ] ):
+                for k,v in value.items():
+                    columns[f"{key}.{k}"]=v
+                continue
+            if isFloat ( value ) or type(value) == str:
+                columns[key]=value
+                continue
+            extra[key]=value
+        return columns, extra
+
+    def write ( self, data : List[Dict], meta : Union[None,Dict] = None ):
+        """ write the whole store, replacing any earlier content
+
+        :param data: list of validation points
+        :param meta: the meta dictionary
+        """
+        if not os.path.exists ( self.path ):
+            os.makedirs ( self.path )
+        flat = [ self.flatten ( d ) for d in data ]
+        ## a column is a float or string column, if all points have that type
+        kinds = {}
+        for columns,_ in flat:
+            for k,v in columns.items():
+                kind = "U" if type(v)==str else "f8"
+                if kinds.get(k,kind)!=kind:
+                    kind = "mixed"
+                kinds[k]=kind
+        for k,kind in list(kinds.items()):
+            if kind == "mixed":
+                ## move to extras
+                for columns,extra in flat:
+                    if k in columns:
+                        extra[k]=columns.pop(k)
+                kinds.pop(k)
+        descriptions = {}
+        for k,kind in kinds.items():
+            has = np.array ( [ k in columns for columns,_ in flat ], dtype=bool )
+            if kind == "f8":
+                values = np.array ( [ columns.get(k,np.nan) for columns,_ in flat ],
+                                    dtype=float )
+            else:
+                values = np.array ( [ columns.get(k,"") for columns,_ in flat ],
+                                    dtype=str )
+            np.save ( self.columnFile ( k ), values, allow_pickle=False )
+            hasfile = self.columnFile ( k, "has.npy" )
+            complete = bool ( np.all ( has ) )
+            if complete:
+                if os.path.exists ( hasfile ):
+                    os.unlink ( hasfile )
+            else:
+                np.save ( hasfile, has, allow_pickle=False )
+            descriptions[k] = { "dtype": kind, "complete": complete }
+        ## remove columns of earlier writes
+        for f in glob.glob ( os.path.join ( self.path, "*.npy" ) ):
+            if f == self.hashfile:
+                continue
+            column = os.path.basename ( f ).replace(".has.npy","").replace(".npy","")
+            if not column in [ k.replace("/","_") for k in descriptions ]:
+                os.unlink ( f )
+        with open ( self.extrafile, "wt" ) as f:
+            for _,extra in flat:
+                f.write ( json.dumps ( extra ) + "\n" )
+        np.save ( self.hashfile, np.array ( [ pointHash ( d ) for d in data ],
+                  dtype=str ), allow_pickle=False )
+        if os.path.exists ( self.journalfile ):
+            os.unlink ( self.journalfile )
+        self.writeMeta ( meta, npoints = len(data), columns = descriptions )
+
+    def writeMeta ( self, meta : Union[None,Dict], npoints : Union[None,int] = None,
+                    columns : Union[None,Dict] = None ):
+        """ (re-)write meta.json. npoints and columns are kept from
+        the previous meta.json if not given """
+        if not os.path.exists ( self.path ):
+            os.makedirs ( self.path )
+        old = self.readStoreInfo() if self.exists() else { "npoints": 0, "columns": {} }
+        if npoints is None:
+            npoints = old["npoints"]
+        if columns is None:
+            columns = old["columns"]
+        info = { "version": storeVersion, "npoints": npoints,
+                 "columns": columns, "meta": meta, "timestamp": time.asctime() }
+        tmpfile = f"{self.metafile}.tmp"
+        with open ( tmpfile, "wt" ) as f:
+            json.dump ( info, f, indent = 1 )
+        os.replace ( tmpfile, self.metafile )
+
+    def append ( self, points : List[Dict] ):
+        """ append points to the journal, without rewriting the columns """
+        if not self.exists():
+            self.write ( points )
+            return
+        with open ( self.journalfile, "at" ) as f:
+            for point in points:
+                f.write ( json.dumps ( point ) + "\n" )
+
+    def readStoreInfo ( self ) -> Dict:
+        """ the content of meta.json """
+        with open ( self.metafile, "rt" ) as f:
+            return json.load ( f )
+
+    def readMeta ( self ) -> Dict:
+        """ the meta dictionary of the validation data """
+        return self.readStoreInfo()["meta"]
+
+    def readJournal ( self ) -> List[Dict]:
+        """ the points appended since the last full write """
+        if not os.path.exists ( self.journalfile ):
+            return []
+        ret = []
+        with open ( self.journalfile, "rt" ) as f:
+            for line in f:
+                if line.strip() != "":
+                    ret.append ( json.loads ( line ) )
+        return ret
+
+    def pointHashes ( self ) -> Union[None,List[str]]:
+        """ the hashes of all points in the store, None if unknown
+        (stores written before there were hashes) """
+        if not os.path.exists ( self.hashfile ):
+            return None
+        ret = np.load ( self.hashfile, allow_pickle=False ).tolist()
+        return ret + [ pointHash ( p ) for p in self.readJournal() ]
+
+    def columns ( self ) -> List:
+        """ the names of the columns in the store """
+        return list ( self.readStoreInfo()["columns"].keys() )
+
+    def load ( self, columns : Union[None,List] = None, mmap : bool = True ) -> Dict:
+        """ load only the given columns, e.g. [ "axes.x", "axes.y", "UL", "signal" ]
+        missing floats are nan, missing strings are "". Points in the journal
+        are appended, in this case the arrays are in memory, not memory-mapped.
+
+        :param columns: the column names, all if None
+        :param mmap: if True, memory-map the arrays
+        :returns: dictionary with columns as keys and numpy arrays as values
+        """
+        info = self.readStoreInfo()
+        if columns is None:
+            columns = list ( info["columns"].keys() )
+        journal = [ self.flatten ( p )[0] for p in self.readJournal() ]
+        mode = "r" if mmap and len(journal)==0 else None
+        ret = {}
+        for column in columns:
+            description = info["columns"].get ( column, None )
+            values = None
+            if description is not None:
+                values = np.load ( self.columnFile ( column ), mmap_mode=mode,
+                                   allow_pickle=False )
+                isString = description["dtype"]=="U"
+            else:
+                isString = any ( [ type(p.get(column,None))==str for p in journal ] )
+                values = np.full ( info["npoints"], "" if isString else np.nan )
+            if len(journal)>0:
+                default = "" if isString else np.nan
+                add = np.array ( [ p.get(column,default) for p in journal ] )
+                values = np.concatenate ( [ values, add ] )
+            ret[column] = values
+        return ret
+
+    def content ( self, keys : Union[None,List] = None ) -> Dict:
+        """ all points, as the list of dictionaries that
+        getValidationFileContent returns
+
+        :param keys: if given, build the points only from these keys,
+                     e.g. [ "axes", "UL", "signal" ]; the other columns
+                     are not even loaded
+        :returns: dictionary with "data" and "meta"
+        """
+        info = self.readStoreInfo()
+        npoints = info["npoints"]
+        data = [ {} for _ in range(npoints) ]
+        for column,description in info["columns"].items():
+            key, subkey = column, None
+            if "." in column:
+                key, subkey = column.split(".",1)
+            if keys is not None and not key in keys:
+                continue
+            values = np.load ( self.columnFile ( column ), allow_pickle=False )
+            has = None
+            if not description["complete"]:
+                has = np.load ( self.columnFile ( column, "has.npy" ),
+                                allow_pickle=False )
+            convert = str if description["dtype"]=="U" else float
+            for i,value in enumerate ( values.tolist() ):
+                if has is not None and not has[i]:
+                    continue
+                if subkey is None:
+                    data[i][key]=convert(value)
+                else:
+                    if not key in data[i]:
+                        data[i][key]={}
+                    data[i][key][subkey]=convert(value)
+        if os.path.exists ( self.extrafile ):
+            with open ( self.extrafile, "rt" ) as f:
+                for i,line in enumerate ( f ):
+                    if i >= npoints or ( keys is not None and line.startswith ( "{}" ) ):
+                        continue
+                    extra = json.loads ( line )
+                    if keys is not None:
+                        extra = { k:v for k,v in extra.items() if k in keys }
+                    data[i].update ( extra )
+        journal = self.readJournal()
+        if keys is not None:
+            journal = [ { k:v for k,v in p.items() if k in keys } for p in journal ]
+        data += journal
+        return { "data": data, "meta": info["meta"] }
+
+    def compact ( self ):
+        """ fold the journal into the columns """
+        if not os.path.exists ( self.journalfile ):
+            return
+        content = self.content()
+        self.write ( content["data"], content["meta"] )
+
+    def sync ( self, data : List[Dict], meta : Union[None,Dict] = None ) -> int:
+        """ bring the store in sync with data: new points get appended, and
+        the meta gets rewritten. If points of the store have changed or
+        are gone from data, the whole store is rewritten.
+
+        :returns: number of appended (or, if rewritten, all) points
+        """
+        if not self.exists():
+            self.write ( data, meta )
+            return len(data)
+        stored = self.pointHashes()
+        hashes = [ pointHash ( d ) for d in data ]
+        if stored is None or not set ( stored ).issubset ( hashes ):
+            self.write ( data, meta )
+            return len(data)
+        stored = set ( stored )
+        new = [ d for d,h in zip ( data, hashes ) if not h in stored ]
+        if len(new)>0:
+            self.append ( new )
+        info = self.readStoreInfo()
+        self.writeMeta ( meta, npoints = info["npoints"], columns = info["columns"] )
+        return len(new)
+
+def convertValidationFile ( validationfile : str, force : bool = False ) -> bool:
+    """ convert a validationData = [...] python file into a binary store
+
+    :param force: if False, skip files whose store is newer than the file
+    :returns: true, if converted
+    """
+    store = ValidationDataStore ( validationfile )
+    if not force and store.exists() and \
+            store.mtime() >= os.stat ( validationfile ).st_mtime:
+        return False
+    try:
+        from validationHelpers import getValidationFileContent
+    except ImportError as e:
+        from validation.validationHelpers import getValidationFileContent
+    content = getValidationFileContent ( validationfile, useStore = False )
+    store.write ( content["data"], content["meta"] )
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="convert validation files to, and inspect, binary validation data stores" )
+    ap.add_argument('files', nargs='+',
+            help='validation .py files, stores, or folders with validation files' )
+    ap.add_argument('-i', '--info', help='show info about the stores, dont convert',
+            action="store_true" )
+    ap.add_argument('-c', '--compact', help='fold the journals into the columns',
+            action="store_true" )
+    ap.add_argument('-f', '--force', help='convert also if store is up to date',
+            action="store_true" )
+    args = ap.parse_args()
+    files = []
+    for f in args.files:
+        if os.path.isdir ( f ) and not f.endswith ( ".vdata" ):
+            files += sorted ( glob.glob ( os.path.join ( f, "*.py" ) ) )
+        else:
+            files.append ( f )
+    for f in files:
+        store = ValidationDataStore ( f )
+        if args.info:
+            if not store.exists():
+                print ( f"[validationDataStore] {f}: no store" )
+                continue
+            info = store.readStoreInfo()
+            print ( f"[validationDataStore] {store.path}: {info['npoints']} points, {len(store.readJournal())} in journal, columns {', '.join(info['columns'])}" )
+            continue
+        if args.compact:
+            store.compact()
+            continue
+        if convertValidationFile ( f, force = args.force ):
+            print ( f"[validationDataStore] converted {f} -> {store.path}" )
@@ -243,11 +243,10 @@ def retrieveValidationFile ( filename, tarballname = None ):
     tarball = f"{installDirectory()}/slha/{tarballname}"
     tarball = tarball.replace("//","/")
     # print ( "filename", filename, os.path.exists ( tarball ), tarball, os.getcwd() )
-    if os.path.exists ( tarball ):
-        import tarfile
-        f= tarfile.open ( tarball )
-        f.extract ( filename )
-        f.close()
+    from smodels_utils.helper.tarballIndex import getIndexedTarball
+    tar = getIndexedTarball ( tarball )
+    if tar is not None and filename in tar:
+        tar.extract ( filename )
         if os.path.exists ( filename ):
             return True
     return False
@@ -264,14 +263,34 @@ def findLineNrOfMeta ( lines : list ) -> int:
             return i
     return len(lines)
 
-def getValidationFileContent ( validationfile : str ):
+def getValidationStore ( validationfile : str ):
+    """ the binary validation data store of a validation file,
+    see validationDataStore.py """
+    try:
+        from validationDataStore import ValidationDataStore
+    except ImportError as e:
+        from validation.validationDataStore import ValidationDataStore
+    return ValidationDataStore ( validationfile )
+
+def getValidationFileContent ( validationfile : str, useStore : bool = True,
+                               keys : Union[None,list] = None ):
     """ get the content of the validation file, as a dictionary of
         'data' and 'meta'
     :param validation file: filename
+    :param useStore: if True, read from the binary store of the file, if it
+                     exists and is not older than the file itself
+    :param keys: if given, the points need to have only these keys, e.g.
+                 [ "axes", "UL", "signal" ]. from the binary store, only
+                 these columns get read. the python files are read as a whole
     :returns: dictionary with content of validation file
     """
     if validationfile in [ "", None ]:
         return { "data": {}, "meta": {} }
+    if useStore:
+        store = getValidationStore ( validationfile )
+        if store.exists() and ( not os.path.exists ( validationfile ) or \
+                store.mtime() >= os.stat ( validationfile ).st_mtime ):
+            return store.content ( keys )
     try:
         #Save data to file
         f = open( validationfile, 'r' )
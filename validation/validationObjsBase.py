@@ -19,10 +19,10 @@ from smodels.statistics.basicStats import CLsfromNLL
 
 #import logging
 import os, time, sys, copy, tarfile, tempfile, random, glob, shutil
+import numpy as np
 from validationHelpers import getDefaultModel, showPlot, \
          streamlineValidationData, equal_dicts
 from smodels.matching import modelTester
-from validationHelpers import point_in_hull
 from plottingFuncs import getExclusionCurvesFor
 from smodels_utils.helper.terminalcolors import *
 from smodels.base.smodelsLogging import logger
@@ -150,19 +150,12 @@ class ValidationObjsBase():
         self.db = db
         self.ct_nooutput = 0
         self.keep = keep
-        self.runningDictFile = f"run_{anaID}.dict"
-        self.runningDictLockFile = f"run_{anaID}.lock"
+        from workQueue import getWorkQueue
+        self.workQueue = getWorkQueue ( f"run_{anaID}",
+                backend = options.get ( "workQueue", "files" ) )
+        self.heartbeat = None
         if not options["continue"]:
-            if os.path.exists ( self.runningDictFile ):
-                try:
-                    os.unlink ( self.runningDictFile )
-                except FileNotFoundError as e:
-                    pass
-            if os.path.exists ( self.runningDictLockFile ):
-                try:
-                    os.unlink ( self.runningDictLockFile )
-                except FileNotFoundError as e:
-                    pass
+            self.workQueue.clear()
         self.t0 = time.time()
         self.options = options
         self.limitPoints = self.options["limitPoints"]
@@ -174,6 +167,8 @@ class ValidationObjsBase():
         self.currentSLHADir = None
         self.outputDir = None # define an output directory
         self.data = []
+        self._slhaIndex, self._nIndexed, self._indexedData = set(), 0, None
+        self._resultsListing = None # ( resultsdir, set of result files )
         self.validationType = "unknown"
         drawExpected = self.options["drawExpected"]
         self.officialCurves = self.getOfficialCurves( get_all = True,
@@ -370,6 +365,7 @@ class ValidationObjsBase():
         if self.data != None:
             ndata = len ( self.data )
         self.meta["npoints"] = ndata
+        self.indexData ( rebuild = True )
         return addedpoints
 
 
@@ -476,42 +472,39 @@ class ValidationObjsBase():
             return self.slhaDir
         elif os.path.isfile(self.slhaDir):
             try:
-                tar = tarfile.open(self.slhaDir,'r:gz')
-                nfiles = 0
+                ## the index lets us write only the files that are missing,
+                ## without decompressing the whole tarball every time
+                from smodels_utils.helper.tarballIndex import getIndexedTarball
+                tar = getIndexedTarball ( self.slhaDir )
                 tempdir = "?"
+                basedir = os.getcwd()
+                if "slhaTempdir" in self.options and self.options["slhaTempdir"]!=None:
+                    ## e.g. a node-local or memory-backed disk, like /dev/shm
+                    basedir = self.options["slhaTempdir"]
                 if "tempdir" in self.options and self.options["tempdir"]!=None:
                     tdir =  self.options["tempdir"]
                     if "/" in tdir or "." in tdir:
                         logger.warning ( f"you supplied {tdir} as a tempdir, I have been expecting a name without a '/' or a '.', you have been warned" )
-                    tempdir = os.path.join ( os.getcwd(), tdir )
-                    nfiles = len(glob.glob(f"{tempdir}/T*slha")) + 2
+                    tempdir = os.path.join ( basedir, tdir )
+                    os.makedirs ( tempdir, exist_ok = True )
                 else:
-                    tempdir = tempfile.mkdtemp(dir=os.getcwd())
+                    tempdir = tempfile.mkdtemp(dir=basedir)
                 p1 = tempdir.rfind("/")
                 stempdir = tempdir[p1+1:]
                 logger.info ( f"tempdir: {GREEN}{stempdir}{RESET}" )
-                members=tar.getmembers()
-                nmembers = len(members)
-                # logger.debug ( f"nfiles {nfiles} nmembers {nmembers}" )
-                if nfiles >= nmembers:
-                    logger.debug ( f"the slha files seem to already be there, returning {tempdir}" )
-                    self.currentSLHADir = tempdir
-                    self.pointsInTarFile = nmembers-2
-                    return tempdir
-                if nfiles > 3:
-                    logger.warning ( f"we have {nfiles} files, should have {nmembers}. Lets explode the tarball!" )
+                names = tar.names()
                 countm = 0
-                for m in members:
-                    if m.name.endswith ( ".slha" ):
+                for name in names:
+                    if name.endswith ( ".slha" ):
                         countm += 1
                 self.pointsInTarFile = countm
-                random.shuffle ( members )
-                #if self.limitPoints != None and self.limitPoints > 0:
-                #    members=members[:self.limitPoints]
-                tar.extractall(path=tempdir,members=members)
-                tar.close()
-                logger.debug(f"SLHA files extracted to {tempdir}" )
                 self.currentSLHADir = tempdir
+                random.shuffle ( names )
+                nextracted = tar.extractMany ( names, tempdir, skipExisting = True )
+                if nextracted == 0:
+                    logger.debug ( f"the slha files seem to already be there, returning {tempdir}" )
+                    return tempdir
+                logger.debug(f"{nextracted} SLHA files extracted to {tempdir}" )
                 commentfile = f"{tempdir}/comment"
                 with open ( commentfile, "wt" ) as f:
                     d = { "npoints": countm }
@@ -668,9 +661,26 @@ class ValidationObjsBase():
         import subprocess
         o = subprocess.getoutput ( command )
 
+    def listExistingResults ( self ) -> set:
+        """ list the results folder once, so that resultExistsAlready
+        needs no stat call per point.
+
+        :returns: set of the names of the result files
+        """
+        resultsdir = f"{self.currentSLHADir}/results"
+        listing = set()
+        if os.path.isdir ( resultsdir ):
+            listing = set ( os.listdir ( resultsdir ) )
+        self._resultsListing = ( resultsdir, listing )
+        return listing
+
     def resultExistsAlready(self,slhafilename : str ) -> bool:
         """ does a result exist already for the given slha file """
-        resultfile = f"{self.currentSLHADir}/results/{slhafilename}.py"
+        resultsdir = f"{self.currentSLHADir}/results"
+        listing = getattr ( self, "_resultsListing", None )
+        if listing is not None and listing[0] == resultsdir:
+            return f"{slhafilename}.py" in listing[1]
+        resultfile = f"{resultsdir}/{slhafilename}.py"
         if os.path.exists ( resultfile ):
             return True
         return False
@@ -726,6 +736,7 @@ class ValidationObjsBase():
 
         if self.options["generateData"]==None:
             self.loadData()
+            self.listExistingResults()
             tmp = []
             countSkipped = 0
             countSLHAFileInData = 0
@@ -852,13 +863,27 @@ class ValidationObjsBase():
                 ret.append ( m )
         return ret
 
+    def indexData ( self, rebuild : bool = False ):
+        """ keep the index of the slha file names in self.data in sync.
+        points appended to self.data get indexed incrementally, if self.data
+        got replaced or shrunk, the index is rebuilt.
+
+        :param rebuild: if True, rebuild the index from scratch
+        """
+        if rebuild or getattr ( self, "_indexedData", None ) is not self.data \
+                or self._nIndexed > len(self.data):
+            self._slhaIndex, self._nIndexed = set(), 0
+            self._indexedData = self.data
+        for d in self.data[self._nIndexed:]:
+            if "slhafile" in d:
+                self._slhaIndex.add ( d["slhafile"] )
+        self._nIndexed = len(self.data)
+
     def slhafileInData ( self, slhafile : str ) -> bool:
         """ is slhafile already in the data? """
-        for d in self.data:
-            slhashort = os.path.basename ( slhafile )
-            if d["slhafile"] in [ slhafile, slhashort ]:
-                return True
-        return False
+        self.indexData()
+        slhashort = os.path.basename ( slhafile )
+        return slhafile in self._slhaIndex or slhashort in self._slhaIndex
 
     def getMassesFromSLHAFileName ( self, filename : str ) -> List:
         """ try to guess the mass vector from the SLHA file name """
@@ -998,95 +1023,61 @@ class ValidationObjsBase():
         return None
 
     def removeFromListOfRunningFiles ( self ):
-        """ remove files listed in fileList to list of running  files """
-        fileList = self.willRun
-        current = {}
-        if os.path.exists ( self.runningDictFile ):
-            with open ( self.runningDictFile, "rt" ) as f:
-                try:
-                    current = eval ( f.read() )
-                except Exception as e:
-                    logger.info ( f"exception {e}" )
-            f.close()
-        for f in fileList:
-            if f.endswith ( ".tar.gz" ):
-                continue
-            if f in [ "results", "coordinates", "comment" ]:
-                continue
-            try:
-                current.pop ( f )
-            except KeyError as e: # it's not in, so nothing to take out
-                # we can ignore
-                pass
-        self.lockFile()
-        with open ( self.runningDictFile, "wt" ) as f:
-            from smodels_utils.helper.various import py_dumps
-            d = py_dumps(current)
-            f.write ( f"{d}\n" )
-            f.close()
-        self.unlockFile()
+        """ release the claims on the points we ran over """
+        if self.heartbeat is not None:
+            self.heartbeat.stop()
+            self.heartbeat = None
+        self.workQueue.release ( list ( self.willRun ) )
         self.willRun = []
         return
 
-
     def addToListOfRunningFiles ( self, fileList : List ) -> List:
-        """ add files listed in fileList to list of running  files
+        """ claim the points in fileList in the work queue, and keep
+        renewing the claims with a heartbeat, until
+        removeFromListOfRunningFiles gets called.
+
         :returns: list you should actually run
         """
-        current = {}
-        shouldRun = set()
-        if os.path.exists ( self.runningDictFile ):
-            with open ( self.runningDictFile, "rt" ) as f:
-                try:
-                    current = eval ( f.read() )
-                except Exception as e:
-                    logger.info ( f"exception {e}" )
-            f.close()
-        cleanedcurrent = {}
-        for f,t in current.items():
-            dt = ( time.time() - t ) / 60. # minutes
-            ## FIXME we should actually only take out once
-            ## we run out of "good" points
-            if dt < 15.: # after 15 minutes we take it out!
-                cleanedcurrent[f]=t
-        current = cleanedcurrent
+        candidates = []
         for f in fileList:
             if f.endswith ( ".tar.gz" ):
                 continue
             if f in [ "results", "coordinates", "comment" ]:
                 continue
-            if not f in current:
-                if self.limitPoints in [-1, None] or len(shouldRun)<self.limitPoints:
-                    current[f]=time.time()
-                    shouldRun.add ( f )
-        self.lockFile()
-        with open ( self.runningDictFile, "wt" ) as f:
-            from smodels_utils.helper.various import py_dumps
-            d = py_dumps(current)
-            f.write ( f"{d}\n" )
-            f.close()
-        self.unlockFile()
+            candidates.append ( f )
+        limit = None
+        if self.limitPoints not in [-1, None]:
+            limit = self.limitPoints
+        shouldRun = self.workQueue.claim ( candidates, limit = limit )
+        from workQueue import Heartbeat
+        self.heartbeat = Heartbeat ( self.workQueue ).start()
         return shouldRun
 
+    def lockFile ( self, lockfile : str, timeout : float = 600. ):
+        """ a locking mechanism, the lock file is created atomically.
+        locks older than a minute are considered stale and get broken.
 
-    def lockFile ( self, lockfile : Union [ None, str ] = None ):
-        """ a locking mechanism """
-        if lockfile is None:
-            lockfile = self.runningDictLockFile
-        ctr = 0
-        while os.path.exists ( lockfile ):
-            ctr+=1
-            time.sleep ( .1 * ctr )
-            if ctr > 10: # we dont wait forever
-                self.unlockFile( lockfile )
+        :param timeout: give up after that many seconds
+        :raises TimeoutError: if we could not get the lock in time
+        """
+        from workQueue import removeIfStale
+        ctr, t0 = 0, time.time()
+        while True:
+            try:
+                fd = os.open ( lockfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY )
+                os.close ( fd )
                 return
-        from pathlib import Path
-        Path ( lockfile ).touch()
+            except FileExistsError as e:
+                pass
+            if removeIfStale ( lockfile, 60. ):
+                continue
+            if time.time() - t0 > timeout:
+                raise TimeoutError ( f"could not get lock {lockfile} in {timeout}s" )
+            ctr+=1
+            time.sleep ( min ( .1 * ctr, 2. ) )
 
-    def unlockFile( self, lockfile : Union [ None, str ] = None ):
+    def unlockFile( self, lockfile : str ):
         """ a locking mechanism """
-        if lockfile is None:
-            lockfile = self.runningDictLockFile
         if os.path.exists ( lockfile ):
             try:
                 os.unlink ( lockfile )
@@ -1240,7 +1231,16 @@ class ValidationObjsBase():
         ds = py_dumps ( meta, indent=4, double_quotes = True, comments = comments )
         f.write( f"meta = {ds}\n" )
         f.close()
+        if self.options.get ( "binaryStore", False ):
+            from validationHelpers import getValidationStore
+            store = getValidationStore ( datafile )
+            if self.options["generateData"] in [ None, "ondemand" ]:
+                ## only append the new points
+                store.sync ( self.data, meta )
+            else:
+                store.write ( self.data, meta )
         self.unlockFile ( lockfile )
+        self.indexData ( rebuild = True )
 
         return True
 
@@ -1265,17 +1265,6 @@ class ValidationObjsBase():
             return getNiceAxes ( axisV2ToV3 ( axesStr ) )
         return self.massPlane.getNiceAxes ( axesStr )
 
-    def computeWeight ( self, point ) -> float:
-        """ compute the weight of a point by computing the area of its
-        voronoi cell """
-        if 0.<point[1]<1e-6:
-            point[1]=rescaleWidth( point[1] )
-        for i,hull in enumerate(self.hulls):
-            if point_in_hull ( point, hull ):
-                return self.volumes[i]
-        return self.average_area
-
-
     def computeAgreementFactor ( self, looseness : float =1.2,
             signal_factor : float =1.0, weighted : bool = False ) -> float:
         """ computes how much the plot agrees with the official exclusion curve
@@ -1290,7 +1279,6 @@ class ValidationObjsBase():
 
         :returns: agreement factor
         """
-        #import ROOT
         curve = self.getOfficialCurves( get_all = False, expected = False )
         if curve == []:
             logger.error( f"could not get official tgraph curve for {self.expRes.globalInfo.id} {self.txName} {self.axes}" )
@@ -1303,14 +1291,10 @@ class ValidationObjsBase():
                     curve = c
                     break
 
-        from smodels_utils.helper.rootTools import completeROOTGraph
-        completeROOTGraph ( curve )
-
-        pts= { "total": 0, "excluded_inside": 0, "excluded_outside": 0,
-               "not_excluded_inside": 0, "not_excluded_outside": 0, "wrong" : 0 }
-
-        self.computeHulls()
+        from curveGeometry import PreparedCurve
+        polygon = PreparedCurve ( curve ) # also completes the curve
 
+        coords, ULs, signals = [], [], []
         for point in self.data:
             if "error" in point.keys():
                 continue
@@ -1326,77 +1310,42 @@ class ValidationObjsBase():
                 pass
             if x == None or y == None:
                 continue
-            w = 1.
-            if weighted:
-                w = self.computeWeight ( [x,y] )
-            if y==0: y=1.5 ## to avoid points sitting on the line
-            if point["UL"]==None:
-                continue
-            excluded = point["UL"] < point["signal"]
-            really_excluded = looseness * point["UL"] < point["signal"] * signal_factor
-            really_not_excluded = point["UL"] > looseness * point["signal"] * signal_factor
-            from smodels_utils.helper.rootTools import exclusionCurveToTGraph
-            rcurve = exclusionCurveToTGraph ( curve )
-            inside = rcurve.IsInside ( x, y )
-            pts["total"]+=w
-            s=""
-            if excluded:
-                s="excluded"
-            else:
-                s="not_excluded"
-            if inside:
-                s+="_inside"
-            else:
-                s+="_outside"
-            pts[s]+=w
-            if really_excluded and not inside:
-                pts["wrong"]+=w
-            if really_not_excluded and inside:
-                pts["wrong"]+=w
-        if pts["total"]==0:
+            coords.append ( [ x, y ] )
+            UL = point["UL"]
+            ULs.append ( np.nan if UL is None else UL )
+            signals.append ( point["signal"] )
+        if len(coords)==0:
             return float("nan")
-        return 1.0 - float(pts["wrong"]) / float(pts["total"])
+        coords = np.array ( coords, dtype=float )
+        ws = np.ones ( len(coords) )
+        if weighted:
+            ws = self.computeWeights ( coords )
+        ULs = np.array ( ULs, dtype=float )
+        signals = np.array ( signals, dtype=float )
+        hasUL = np.isfinite ( ULs )
+        xy = coords.copy()
+        xy[xy[::,1]==0,1] = 1.5 ## to avoid points sitting on the line
+        inside = polygon.contains ( xy[hasUL] )
+        ws, ULs, signals = ws[hasUL], ULs[hasUL], signals[hasUL]
+        really_excluded = looseness * ULs < signals * signal_factor
+        really_not_excluded = ULs > looseness * signals * signal_factor
+        total = ws.sum()
+        wrong = ws[really_excluded & ~inside].sum() + \
+                ws[really_not_excluded & inside].sum()
+        if total==0:
+            return float("nan")
+        return 1.0 - float(wrong) / float(total)
 
-    def computeHulls ( self ):
-        """ compute the convex hulls from the Voronoi
-            partition, so we can later weight points with the areas of the
-            Voronoi cell """
-        if not self.options["weightedAgreementFactor"]: #  self.weightedAF:
-            return
-        # we could weight the point with the area of its voronoi partition
-        points = []
-        for point in self.data:
-            try: ## we seem to have two different ways of writing the x,y values
-                x,y=point["axes"]['x'],point["axes"]['y']
-            except Exception as e:
-                x,y=point["axes"][0],point["axes"][1]
-            points.append ( [x,y] )
-        xy=numpy.array ( points )
-        logY=False
-        if max ( xy[::,1] ) < 1e-6:
-            logY=True
-            points = [ [ x,rescaleWidth(y) ] for x,y in points ]
-
-        from scipy.spatial import Voronoi, ConvexHull
-        vor = Voronoi ( points )
-        ## FIXME now get the bounding box of a point, then
-        ## get the area of the bounding box. weight the points with that area.
-        # now check for [ 1700. -15. ]
-        self.hulls = []
-        self.volumes = []
-        totalarea = 0.
-        n_points = 0
-        for i, reg_num in enumerate(vor.point_region):
-            indices = vor.regions[reg_num]
-            if not (-1 in indices): # s me regions can be opened
-                hull = ConvexHull(vor.vertices[indices])
-                n_points += 1
-                self.hulls.append ( hull )
-                vol = hull.volume
-                self.volumes.append ( vol )
-                totalarea += vol
-        self.average_area = totalarea / n_points
+    def computeWeights ( self, coords ) -> np.ndarray:
+        """ compute the weights of the points, as the areas of their
+        Voronoi cells. points with open cells get the average area.
 
+        :param coords: array of the x,y values of the points
+        :returns: array of weights
+        """
+        from curveGeometry import voronoiAreas
+        areas, self.average_area = voronoiAreas ( coords )
+        return areas
 
     def getDataFile(self,validationDir : str,fformat : str ='pdf') -> str:
         """
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+"""
+.. module:: workQueue
+    :synopsis: claiming of validation points among many concurrent
+               validation jobs. A claim is a lease that expires, unless the
+               owner renews it with a heartbeat, so that points of crashed
+               jobs get picked up again.
+               Two backends: ClaimFileQueue, one claim file per point, created
+               atomically with O_EXCL (works on shared filesystems), and
+               SQLiteQueue, a local sqlite database (use on local disks only,
+               sqlite locking is unreliable on NFS).
+
+.. moduleauthor:: Wolfgang Waltenberger <wolfgang.waltenberger@gmail.com>
+
+"""
+
+import os, time, socket, threading
+from typing import Union, List
+
+def removeIfStale ( path : str, maxAge : float ) -> bool:
+    """ remove path, but only if it has not been touched for maxAge seconds.
+    safe against concurrent processes doing the same: the file is renamed
+    away, and only if it is still the stale file that we looked at, it is
+    removed. if in the meantime someone replaced it with a fresh one, the
+    fresh one is put back.
+
+    :returns: true, if we removed the stale file
+    """
+    try:
+        before = os.stat ( path )
+    except FileNotFoundError as e:
+        return False
+    if time.time() - before.st_mtime < maxAge:
+        return False
+    tombstone = f"{path}.stale.{socket.gethostname()}_{os.getpid()}_{threading.get_ident()}"
+    try:
+        os.rename ( path, tombstone )
+    except FileNotFoundError as e: # someone else was faster
+        return False
+    after = os.stat ( tombstone )
+    if after.st_ino == before.st_ino and time.time() - after.st_mtime >= maxAge:
+        os.unlink ( tombstone )
+        return True
+    ## we got hold of a fresh file, put it back. link does not overwrite,
+    ## if someone created yet another file in the meantime, that one stays
+    try:
+        os.link ( tombstone, path )
+    except FileExistsError as e:
+        pass
+    os.unlink ( tombstone )
+    return False
+
+class ClaimFileQueue:
+    """ work queue with one claim file per point. creating a claim with
+    O_EXCL is atomic, expired claims are removed with removeIfStale, then
+    created anew. The modification time of the claim file is the time of
+    the last heartbeat, its inode tells whether it is still our claim. """
+
+    def __init__ ( self, directory : str, lease : float = 900. ):
+        """
+        :param directory: the folder with the claim files
+        :param lease: claims without heartbeat for lease seconds are expired
+        """
+        self.directory = directory
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.held = set()
+        self.inodes = {} ## the inodes of our claim files
+        os.makedirs ( self.directory, exist_ok = True )
+
+    def claimFile ( self, item : str ) -> str:
+        return os.path.join ( self.directory, os.path.basename ( item ) )
+
+    def _create ( self, claim : str ) -> bool:
+        """ atomically create claim file, false if it exists already """
+        try:
+            fd = os.open ( claim, os.O_CREAT | os.O_EXCL | os.O_WRONLY )
+        except FileExistsError as e:
+            return False
+        os.write ( fd, f"{self.owner}\n".encode() )
+        self.inodes[claim] = os.fstat ( fd ).st_ino
+        os.close ( fd )
+        return True
+
+    def _isOurs ( self, claim : str ) -> bool:
+        """ is the claim file still the one we created? """
+        try:
+            return os.stat ( claim ).st_ino == self.inodes.get ( claim, None )
+        except FileNotFoundError as e:
+            return False
+
+    def _takeOverExpired ( self, claim : str ) -> bool:
+        """ if claim has expired (or was released), take it over """
+        if not os.path.exists ( claim ) or removeIfStale ( claim, self.lease ):
+            return self._create ( claim )
+        return False
+
+    def claim ( self, items : List[str], limit : Union[None,int] = None ) -> List[str]:
+        """ claim as many of items as possible, at most limit
+
+        :returns: list of claimed items
+        """
+        ret = []
+        for item in items:
+            if limit is not None and len(ret)>=limit:
+                break
+            claim = self.claimFile ( item )
+            if self._create ( claim ) or self._takeOverExpired ( claim ):
+                ret.append ( item )
+                self.held.add ( item )
+        return ret
+
+    def renew ( self ):
+        """ heartbeat: renew the leases of all held claims """
+        for item in list ( self.held ):
+            claim = self.claimFile ( item )
+            if not self._isOurs ( claim ):
+                if os.path.exists ( claim ): # someone took it over
+                    self.held.discard ( item )
+                continue # or it is being put back right now
+            try:
+                os.utime ( claim )
+            except FileNotFoundError as e:
+                pass
+
+    def release ( self, items : List[str] ):
+        """ release our claims on items """
+        for item in items:
+            self.held.discard ( item )
+            claim = self.claimFile ( item )
+            if not self._isOurs ( claim ):
+                continue
+            self.inodes.pop ( claim, None )
+            try:
+                os.unlink ( claim )
+            except FileNotFoundError as e:
+                pass
+
+    def clear ( self ):
+        """ remove all claims, of all owners """
+        import shutil
+        shutil.rmtree ( self.directory, ignore_errors = True )
+        os.makedirs ( self.directory, exist_ok = True )
+        self.held = set()
+        self.inodes = {}
+
+class SQLiteQueue:
+    """ work queue in a local sqlite database, one row per claimed point.
+    all claims of one batch are made in a single transaction. """
+
+    def __init__ ( self, dbfile : str, lease : float = 900. ):
+        """
+        :param dbfile: the sqlite file
+        :param lease: claims without heartbeat for lease seconds are expired
+        """
+        import sqlite3
+        self.dbfile = dbfile
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.held = set()
+        self.connection = sqlite3.connect ( dbfile, timeout = 60.,
+                isolation_level = None, check_same_thread = False )
+        self.lock = threading.Lock()
+        self.connection.execute ( "create table if not exists claims ( item text primary key, owner text, expires real )" )
+
+    def claim ( self, items : List[str], limit : Union[None,int] = None ) -> List[str]:
+        """ claim as many of items as possible, at most limit
+
+        :returns: list of claimed items
+        """
+        ret = []
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute ( "begin immediate" )
+            try:
+                now = time.time()
+                for item in items:
+                    if limit is not None and len(ret)>=limit:
+                        break
+                    cursor.execute ( "insert into claims values (?,?,?) on conflict(item) do update set owner=excluded.owner, expires=excluded.expires where claims.expires < ?",
+                            ( item, self.owner, now + self.lease, now ) )
+                    if cursor.rowcount > 0:
+                        ret.append ( item )
+                cursor.execute ( "commit" )
+            except Exception as e:
+                cursor.execute ( "rollback" )
+                raise e
+        self.held.update ( ret )
+        return ret
+
+    def renew ( self ):
+        """ heartbeat: renew the leases of all held claims """
+        with self.lock:
+            self.connection.execute ( "update claims set expires = ? where owner = ?",
+                    ( time.time() + self.lease, self.owner ) )
+
+    def release ( self, items : List[str] ):
+        """ release the claims on items """
+        with self.lock:
+            self.connection.executemany ( "delete from claims where item = ? and owner = ?",
+                    [ ( item, self.owner ) for item in items ] )
+        self.held.difference_update ( items )
+
+    def clear ( self ):
+        """ remove all claims, of all owners """
+        with self.lock:
+            self.connection.execute ( "delete from claims" )
+        self.held = set()
+
+class Heartbeat:
+    """ a thread that renews the leases of a queue every lease/3 seconds """
+
+    def __init__ ( self, queue ):
+        self.queue = queue
+        self.stopped = threading.Event()
+        self.thread = threading.Thread ( target = self.run, daemon = True )
+
+    def run ( self ):
+        while not self.stopped.wait ( self.queue.lease / 3. ):
+            self.queue.renew()
+
+    def start ( self ):
+        self.thread.start()
+        return self
+
+    def stop ( self ):
+        self.stopped.set()
+
+def getWorkQueue ( name : str, backend : str = "files",
+                   lease : float = 900. ):
+    """ factory for the work queues
+
+    :param name: basename of the queue, e.g. run_CMS-SUS-16-050
+    :param backend: "files" (ClaimFileQueue) or "sqlite" (SQLiteQueue)
+    """
+    if backend == "sqlite":
+        return SQLiteQueue ( f"{name}.sqlite", lease )
+    if backend == "files":
+        return ClaimFileQueue ( f"{name}.claims", lease )
+    raise ValueError ( f"unknown work queue backend {backend}" )